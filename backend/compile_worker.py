@@ -0,0 +1,304 @@
+"""Compile worker processes for the backend.
+
+Each worker is a separate process holding its own warm typst compilers,
+driven by the API process over a pipe. A document that loops forever or
+blows up in memory only takes down its worker: the API process enforces a
+wall-clock timeout and a resident memory limit per job, the kernel
+enforces a CPU-time limit per job, and the pool replaces workers that
+crashed, were killed, grew too large or have served enough jobs.
+
+This module must stay importable without the rest of the backend, since
+worker processes are spawned fresh and import only this file. As with any
+use of the spawn start method, scripts that import the backend need an
+`if __name__ == "__main__":` guard.
+"""
+import math
+import multiprocessing
+import os
+import signal
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+
+import typst
+
+try:
+    import resource
+except ImportError:  # Windows: only the wall-clock and memory limits apply
+    resource = None
+
+# How often the API process samples a busy worker's resident memory
+RSS_POLL_SECONDS = 0.05
+
+
+class CompileWorkerError(Exception):
+    """A compile job was stopped because its worker died or hit a limit"""
+
+    def __init__(self, message: str, reason: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class CompileWorkerTimeout(CompileWorkerError):
+    """A compile job ran past the wall-clock timeout and its worker was killed"""
+
+
+def _set_cpu_limit(seconds: float) -> None:
+    """Allow the next job `seconds` of CPU time on top of what was used so far"""
+    if resource is None or not seconds:
+        return
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    soft = math.ceil(usage.ru_utime + usage.ru_stime + seconds)
+    _, hard = resource.getrlimit(resource.RLIMIT_CPU)
+    if hard != resource.RLIM_INFINITY:
+        soft = min(soft, hard)
+    resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+
+
+def _worker_main(conn, compiler_options: dict, cpu_seconds: float, max_sessions: int, session_idle_seconds: float):
+    """Serve compile requests from the API process until the pipe closes"""
+    # Shutdown is driven by the API process; ignore the terminal's Ctrl+C
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # One font book per process (it cannot be sent over the pipe), shared by every compiler
+    font_paths = compiler_options.get('font_paths')
+    fonts = typst.Fonts(font_paths=font_paths) if font_paths else typst.Fonts()
+    compiler_options = {**compiler_options, 'font_paths': fonts}
+
+    shared = typst.Compiler(**compiler_options)
+    sessions: "OrderedDict[str, tuple[typst.Compiler, float]]" = OrderedDict()
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == 'stop':
+            return
+        if message[0] == 'discard':
+            sessions.pop(message[1], None)
+            continue
+
+        _, source, format, ppi, session_id, with_warnings = message
+        now = time.monotonic()
+        for sid in [sid for sid, (_, used) in sessions.items() if now - used > session_idle_seconds]:
+            del sessions[sid]
+
+        compiler = shared
+        if session_id:
+            entry = sessions.pop(session_id, None)
+            compiler = entry[0] if entry else typst.Compiler(**compiler_options)
+            sessions[session_id] = (compiler, now)
+            while len(sessions) > max_sessions:
+                sessions.popitem(last=False)
+
+        options = {'input': source, 'format': format}
+        if ppi is not None:
+            options['ppi'] = ppi
+        _set_cpu_limit(cpu_seconds)
+        try:
+            if with_warnings:
+                output, warnings = compiler.compile_with_warnings(**options)
+                reply = ('ok', (output, [w.message for w in warnings]))
+            else:
+                reply = ('ok', compiler.compile(**options))
+        except typst.TypstError as e:
+            reply = ('typst_error', str(e), getattr(e, 'diagnostic', None))
+        except Exception as e:
+            reply = ('error', f"{type(e).__name__}: {e}")
+        conn.send(reply)
+
+
+def _resident_bytes(pid: int) -> Optional[int]:
+    """Current resident set size of a process, where /proc is available"""
+    try:
+        with open(f'/proc/{pid}/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class CompileWorker:
+    """Handle on one worker process, used by one thread at a time"""
+
+    def __init__(self, context, options: tuple):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, *options), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.jobs = 0
+        self.peak_rss = 0
+
+    def run(self, message: tuple, timeout: float, max_rss: int):
+        """Send one job and wait for its reply, killing the worker if it breaks a limit"""
+        self.conn.send(message)
+        deadline = time.monotonic() + timeout
+        while not self.conn.poll(RSS_POLL_SECONDS):
+            rss = _resident_bytes(self.process.pid)
+            if rss is not None:
+                self.peak_rss = max(self.peak_rss, rss)
+                if max_rss and rss > max_rss:
+                    self.kill()
+                    raise CompileWorkerError(
+                        f"Compilation stopped: it used more than {max_rss // (1024 * 1024)} MB of memory", 'memory_limit'
+                    )
+            if time.monotonic() > deadline:
+                self.kill()
+                raise CompileWorkerTimeout("Compilation timed out", 'timeout')
+        try:
+            reply = self.conn.recv()
+        except (EOFError, OSError):
+            self.process.join(1)
+            self.conn.close()
+            if hasattr(signal, 'SIGXCPU') and self.process.exitcode == -signal.SIGXCPU:
+                raise CompileWorkerError("Compilation stopped: it used too much CPU time", 'cpu_limit')
+            raise CompileWorkerError(
+                f"Compile worker crashed (exit code {self.process.exitcode})", 'crash'
+            )
+        self.jobs += 1
+        self.peak_rss = max(self.peak_rss, _resident_bytes(self.process.pid) or 0)
+        return reply
+
+    def send(self, message: tuple) -> None:
+        try:
+            self.conn.send(message)
+        except (OSError, ValueError):
+            pass
+
+    def alive(self) -> bool:
+        return self.process.is_alive()
+
+    def kill(self) -> None:
+        self.process.kill()
+        self.process.join(5)
+        self.conn.close()
+
+    def stop(self) -> None:
+        self.send(('stop',))
+        self.process.join(2)
+        if self.process.is_alive():
+            self.process.kill()
+        self.conn.close()
+
+
+class CompileWorkerPool:
+    """A fixed number of compile worker processes, started on first use.
+
+    Jobs of the same session prefer the same worker so its warm compiler is
+    reused, but take any idle worker rather than wait. Workers are replaced
+    after max_jobs jobs, after their resident memory reaches max_rss_bytes,
+    and after they crash or are killed for breaking a limit.
+    """
+
+    def __init__(self, size: int, compiler_options: dict, timeout: float, cpu_seconds: float,
+                 max_rss_bytes: int, max_jobs: int, max_sessions: int, session_idle_seconds: float):
+        self.size = size
+        self.timeout = timeout
+        self.max_rss_bytes = max_rss_bytes
+        self.max_jobs = max_jobs
+        self._options = (compiler_options, cpu_seconds, max(1, max_sessions // size), session_idle_seconds)
+        self._context = multiprocessing.get_context('spawn')
+        self._workers: list[Optional[CompileWorker]] = [None] * size
+        self._idle = set(range(size))
+        self._cond = threading.Condition()
+        self._closed = False
+        self.started = 0
+        self.recycled: dict[str, int] = {}
+
+    def _checkout(self, preferred: Optional[int]) -> int:
+        with self._cond:
+            while not self._idle:
+                self._cond.wait()
+            slot = preferred if preferred in self._idle else min(self._idle)
+            self._idle.discard(slot)
+            return slot
+
+    def _checkin(self, slot: int) -> None:
+        with self._cond:
+            self._idle.add(slot)
+            self._cond.notify()
+
+    def _retire(self, slot: int, reason: str, stop: bool = True) -> None:
+        worker = self._workers[slot]
+        self._workers[slot] = None
+        if worker is not None and stop:
+            worker.stop()
+        with self._cond:
+            self.recycled[reason] = self.recycled.get(reason, 0) + 1
+
+    def compile(self, source: bytes, format: str, ppi: Optional[float] = None, session_id: Optional[str] = None,
+                with_warnings: bool = False):
+        """Compile on a worker process; raises typst.TypstError or CompileWorkerError.
+
+        With with_warnings, returns (output, warning messages).
+        """
+        if self._closed:
+            raise CompileWorkerError("Compile workers are shut down", 'shutdown')
+        preferred = zlib.crc32(session_id.encode('utf-8')) % self.size if session_id else None
+        slot = self._checkout(preferred)
+        try:
+            worker = self._workers[slot]
+            if worker is not None and not worker.alive():
+                self._retire(slot, 'crash', stop=False)
+                worker = None
+            if worker is None:
+                worker = self._workers[slot] = CompileWorker(self._context, self._options)
+                with self._cond:
+                    self.started += 1
+
+            try:
+                message = ('compile', source, format, ppi, session_id, with_warnings)
+                reply = worker.run(message, self.timeout, self.max_rss_bytes)
+            except CompileWorkerError as e:
+                self._retire(slot, e.reason, stop=False)
+                raise
+
+            if worker.jobs >= self.max_jobs:
+                self._retire(slot, 'max_jobs')
+            elif self.max_rss_bytes and worker.peak_rss > self.max_rss_bytes * 0.8:
+                # Close to the limit already: start the next job with a fresh process
+                self._retire(slot, 'memory')
+        finally:
+            self._checkin(slot)
+
+        if reply[0] == 'ok':
+            return reply[1]
+        if reply[0] == 'typst_error':
+            error = typst.TypstError(reply[1])
+            error.diagnostic = reply[2]
+            raise error
+        raise RuntimeError(reply[1])
+
+    def discard_session(self, session_id: str) -> None:
+        """Drop a session's warm compiler from the worker that usually serves it"""
+        slot = zlib.crc32(session_id.encode('utf-8')) % self.size
+        with self._cond:
+            if slot not in self._idle or self._workers[slot] is None:
+                return  # busy or not started; the worker's idle expiry will drop it
+            self._idle.discard(slot)
+        try:
+            self._workers[slot].send(('discard', session_id))
+        finally:
+            self._checkin(slot)
+
+    def stats(self) -> dict:
+        with self._cond:
+            workers = [w for w in self._workers if w is not None]
+            return {
+                "size": self.size,
+                "running": sum(1 for w in workers if w.alive()),
+                "busy": self.size - len(self._idle),
+                "started": self.started,
+                "recycled": dict(self.recycled),
+                "jobs_per_worker": [w.jobs for w in workers],
+                "peak_rss_bytes": [w.peak_rss for w in workers],
+            }
+
+    def shutdown(self) -> None:
+        self._closed = True
+        for slot, worker in enumerate(self._workers):
+            if worker is not None:
+                self._workers[slot] = None
+                worker.stop()
@@ -0,0 +1,551 @@
+"""Structural DOCX export from Typst's HTML output.
+
+Typst's HTML target keeps the document's structure: headings, paragraphs,
+lists, tables, figures with captions, code and footnotes come out as the
+matching HTML elements. This module walks that HTML and writes the same
+structure with python-docx, so headings become Word headings, lists become
+Word lists and tables become Word tables.
+
+The HTML target ignores layout elements (align, grid, rect, ...) together
+with their content, so HTML_PRELUDE rewrites them first: containers are
+unwrapped, grids become borderless tables and stacks sequential blocks.
+Math and what is left that HTML cannot express (placed, transformed or
+drawn content) are rendered by Typst as inline SVG frames. Word cannot show
+those, so the caller passes a `render_frames` function that rasterizes them;
+they are embedded as pictures at the frame's size. Page headers and footers
+are read after the document (HTML_SUFFIX) and become the Word section's.
+
+If the HTML compile still reports dropped content (see lost_elements), the
+caller falls back to pages_to_docx: one picture per page.
+"""
+import base64
+import io
+import re
+from html.parser import HTMLParser
+from typing import Callable, Optional, Union
+
+from docx import Document
+from docx.enum.text import WD_ALIGN_PARAGRAPH, WD_BREAK
+from docx.image.image import Image as DocxImage
+from docx.opc.constants import RELATIONSHIP_TYPE
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from docx.section import _Footer, _Header
+from docx.shared import Pt, RGBColor
+
+# Bump when the generated DOCX changes, so cached exports are rebuilt
+FORMAT_VERSION = 2
+GRID_CLASS = 'typst-grid'
+HEADER_TAG = 'typst-page-header'
+FOOTER_TAG = 'typst-page-footer'
+
+# Prepended to the source for the HTML compile, so elements that target
+# ignores keep their content: equations become SVG frames (inline ones stay
+# inline), aligned content a div with its text-align, grids a table, and
+# content that only makes sense laid out on a page an SVG frame
+HTML_PRELUDE = (
+    '#show math.equation: it => if it.block { html.frame(it) } else { box(html.frame(it)) }\n'
+    '#show align: it => if it.alignment.x in (center, right, end) {'
+    ' html.elem("div", attrs: (style: "text-align: " + if it.alignment.x == center { "center" } else { "right" }),'
+    ' it.body) } else { it.body }\n'
+    '#show selector.or(pad, columns): it => it.body\n'
+    f'#show grid: it => html.elem("div", attrs: (class: "{GRID_CLASS}"), table(columns: it.columns,'
+    ' ..it.children.map(c => if c.func() in (grid.header, grid.footer) { c.children } else { (c,) }).flatten()'
+    '.filter(c => c.func() == grid.cell)'
+    '.map(c => { let fields = c.fields(); let body = fields.remove("body"); table.cell(..fields, body) })))\n'
+    '#show stack: it => it.children.filter(c => type(c) == content).map(block).join()\n'
+    '#show selector.or(rect, square, ellipse, circle):'
+    ' it => if it.body == none { html.frame(it) } else { block(it.body) }\n'
+    '#show selector.or(polygon, curve, move, scale, rotate, skew): html.frame\n'
+    '#show place: it => html.frame(it.body)\n'
+)
+# Appended to the source: the page header and footer in effect at the end
+# (their counters show the values there)
+HTML_SUFFIX = (
+    '\n#context for (tag, body) in'
+    f' (("{HEADER_TAG}", page.header), ("{FOOTER_TAG}", page.footer)) {{'
+    ' if type(body) == content { html.elem(tag, body) } }\n'
+)
+IGNORED_RE = re.compile(r'^(.+) was ignored during HTML export')
+# Ignored elements that carry no text: spacing, breaks, rules, page setup and hidden content
+LAYOUT_ONLY_ELEMENTS = {'v', 'h', 'line', 'pagebreak', 'colbreak', 'page set rule', 'hide'}
+
+MONOSPACE_FONT = 'Consolas'
+LINK_COLOR = RGBColor(0x05, 0x63, 0xC1)
+FRAME_TAG = 'typst-frame'
+FRAME_BLOCK_TAG = 'typst-frame-block'  # display frame on its own line
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta', 'source', 'track', 'wbr'}
+BLOCK_TAGS = {
+    'address', 'article', 'aside', 'blockquote', 'dd', 'div', 'dl', 'dt', 'figcaption', 'figure', 'footer',
+    'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'header', 'hr', 'li', 'main', 'nav', 'ol', 'p', 'pre', 'section',
+    'table', 'ul', FRAME_BLOCK_TAG, HEADER_TAG, FOOTER_TAG,
+}
+SVG_OPEN_RE = re.compile(r'<svg\b')
+SVG_SIZE_RE = re.compile(r'\swidth="([\d.]+)pt"\s+height="([\d.]+)pt"')
+TEXT_ALIGN_RE = re.compile(r'text-align:\s*(\w+)')
+ALIGNMENTS = {'center': WD_ALIGN_PARAGRAPH.CENTER, 'right': WD_ALIGN_PARAGRAPH.RIGHT}
+MAX_LIST_DEPTH = 3  # the default template has List Bullet .. List Bullet 3
+
+
+class Node:
+    __slots__ = ('tag', 'attrs', 'children')
+
+    def __init__(self, tag: str, attrs: dict):
+        self.tag = tag
+        self.attrs = attrs
+        self.children: list[Union['Node', str]] = []
+
+
+class _TreeBuilder(HTMLParser):
+    """Parse (well-formed) HTML into a Node tree"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.root = Node('root', {})
+        self._stack = [self.root]
+
+    def handle_starttag(self, tag, attrs):
+        node = Node(tag, dict(attrs))
+        self._stack[-1].children.append(node)
+        if tag not in VOID_TAGS:
+            self._stack.append(node)
+
+    def handle_startendtag(self, tag, attrs):
+        self._stack[-1].children.append(Node(tag, dict(attrs)))
+
+    def handle_endtag(self, tag):
+        for i in range(len(self._stack) - 1, 0, -1):
+            if self._stack[i].tag == tag:
+                del self._stack[i:]
+                return
+
+    def handle_data(self, data):
+        self._stack[-1].children.append(data)
+
+
+def extract_frames(html: str) -> tuple[str, list[str]]:
+    """Replace each top-level inline <svg> with a placeholder element, returning the SVGs"""
+    frames = []
+    parts = []
+    pos = 0
+    while True:
+        match = SVG_OPEN_RE.search(html, pos)
+        if match is None:
+            break
+        depth, end = 0, match.start()
+        for tag in re.finditer(r'<svg\b|</svg\s*>', html[match.start():]):
+            depth += -1 if tag.group().startswith('</') else 1
+            if depth == 0:
+                end = match.start() + tag.end()
+                break
+        else:
+            break  # unterminated; leave the rest as is
+        parts.append(html[pos:match.start()])
+        parts.append(f'<{FRAME_TAG} data-index="{len(frames)}"></{FRAME_TAG}>')
+        frames.append(html[match.start():end])
+        pos = end
+    parts.append(html[pos:])
+    return ''.join(parts), frames
+
+
+def lost_elements(warnings: list[str]) -> list[str]:
+    """Elements the HTML compile ignored along with their content, from its warnings"""
+    lost = []
+    for message in warnings:
+        match = IGNORED_RE.match(message)
+        if match and match.group(1) not in LAYOUT_ONLY_ELEMENTS and match.group(1) not in lost:
+            lost.append(match.group(1))
+    return lost
+
+
+def frame_size(svg: str) -> Optional[tuple[float, float]]:
+    """Width and height in pt of a Typst SVG frame"""
+    match = SVG_SIZE_RE.search(svg[:1000])
+    return (float(match.group(1)), float(match.group(2))) if match else None
+
+
+def _text_of(node: Node) -> str:
+    if node.tag == 'br':
+        return '\n'
+    return ''.join(child if isinstance(child, str) else _text_of(child) for child in node.children)
+
+
+def _is_blank(child) -> bool:
+    return isinstance(child, str) and not child.strip()
+
+
+class DocxWriter:
+    """Walks the HTML tree and appends the matching python-docx structure"""
+
+    def __init__(self, frames: list[str], images: list[Optional[bytes]]):
+        self.doc = Document()
+        self.frames = frames
+        self.images = images
+        section = self.doc.sections[0]
+        self.max_width = section.page_width - section.left_margin - section.right_margin
+
+    # Blocks
+
+    def blocks(self, node: Node, container=None, list_depth: int = 0) -> None:
+        """Add the block content of node to container (the document or a table cell)"""
+        container = container if container is not None else self.doc
+        inline: list = []
+
+        def flush():
+            if any(not _is_blank(child) for child in inline):
+                paragraph = container.add_paragraph()
+                self.inlines(inline, paragraph)
+            inline.clear()
+
+        for child in node.children:
+            if isinstance(child, str) or child.tag not in BLOCK_TAGS:
+                inline.append(child)
+                continue
+            flush()
+            self.block(child, container, list_depth)
+        flush()
+
+    def block(self, node: Node, container, list_depth: int) -> None:
+        tag = node.tag
+        if tag in ('h1', 'h2', 'h3', 'h4', 'h5', 'h6'):
+            # Typst emits the document title as h1 and top-level headings as h2
+            level = int(tag[1]) - 1
+            if container is self.doc:
+                paragraph = self.doc.add_heading(level=min(level, 9))
+            else:
+                paragraph = container.add_paragraph()
+                paragraph.style = self.doc.styles['Title' if level == 0 else f'Heading {min(level, 9)}']
+            self.inlines(node.children, paragraph)
+        elif tag == 'p':
+            self.inlines(node.children, container.add_paragraph())
+        elif tag in ('ul', 'ol'):
+            self.list(node, container, list_depth + 1)
+        elif tag == 'pre':
+            paragraph = container.add_paragraph()
+            self.preformatted(node, paragraph)
+        elif tag == 'blockquote':
+            paragraph = container.add_paragraph(style='Quote')
+            self.inlines(node.children, paragraph)
+        elif tag == 'dl':
+            for child in node.children:
+                if isinstance(child, Node) and child.tag == 'dt':
+                    paragraph = container.add_paragraph()
+                    self.inlines(child.children, paragraph, bold=True)
+                elif isinstance(child, Node) and child.tag == 'dd':
+                    paragraph = container.add_paragraph()
+                    paragraph.paragraph_format.left_indent = Pt(24)
+                    self.inlines(child.children, paragraph)
+        elif tag == 'table':
+            self.table(node, container)
+            container.add_paragraph()  # keep a following table from merging into this one
+        elif tag == 'figure':
+            self.figure(node, container)
+        elif tag == 'figcaption':
+            paragraph = container.add_paragraph(style='Caption')
+            self.inlines(node.children, paragraph)
+        elif tag == 'hr':
+            container.add_paragraph().add_run().add_break(WD_BREAK.LINE)
+        elif tag in (HEADER_TAG, FOOTER_TAG):
+            section = self.doc.sections[0]
+            self.part(node, section.header if tag == HEADER_TAG else section.footer)
+        elif tag == 'div' and node.attrs.get('class') == GRID_CLASS:
+            # A Typst grid: a table without borders
+            for child in node.children:
+                if isinstance(child, Node) and child.tag == 'table':
+                    self.table(child, container, style='Normal Table')
+                    container.add_paragraph()
+        else:  # div, section and other containers
+            before = len(container.paragraphs)
+            self.blocks(node, container, list_depth)
+            match = TEXT_ALIGN_RE.search(node.attrs.get('style', ''))
+            if match and match.group(1) in ALIGNMENTS:
+                for paragraph in container.paragraphs[before:]:
+                    paragraph.alignment = ALIGNMENTS[match.group(1)]
+
+    def part(self, node: Node, part) -> None:
+        """Write node into a (so far empty) section header or footer"""
+        placeholder = part.paragraphs[0]
+        self.blocks(node, part)
+        if len(part.paragraphs) > 1 and not placeholder.text:
+            placeholder._p.getparent().remove(placeholder._p)
+
+    def list(self, node: Node, container, depth: int) -> None:
+        ordered = node.tag == 'ol'
+        if 'list-style-type: none' in node.attrs.get('style', ''):
+            # Footnotes: Typst writes the number itself
+            for item in node.children:
+                if isinstance(item, Node):
+                    self.blocks(item, container, depth - 1)
+            return
+
+        level = min(depth, MAX_LIST_DEPTH)
+        style = ('List Number' if ordered else 'List Bullet') + ('' if level == 1 else f' {level}')
+        num_id = self._restart_numbering(style, int(node.attrs.get('start') or 1)) if ordered else None
+        for item in node.children:
+            if not isinstance(item, Node) or item.tag != 'li':
+                continue
+            paragraph = container.add_paragraph(style=style)
+            if num_id is not None:
+                num_pr = paragraph._p.get_or_add_pPr().get_or_add_numPr()
+                num_pr.get_or_add_ilvl().val = 0
+                num_pr.get_or_add_numId().val = num_id
+
+            # The item's text, or its first paragraph, goes on the numbered line
+            children = [c for c in item.children if not _is_blank(c)]
+            if children and isinstance(children[0], Node) and children[0].tag == 'p':
+                self.inlines(children[0].children, paragraph)
+                children = children[1:]
+            inline = []
+            for child in children:
+                if isinstance(child, str) or child.tag not in BLOCK_TAGS:
+                    inline.append(child)
+                elif child.tag in ('ul', 'ol'):
+                    self.list(child, container, depth + 1)
+                else:
+                    continuation = container.add_paragraph(
+                        style='List Continue' + ('' if level == 1 else f' {level}')
+                    )
+                    self.inlines(child.children, continuation)
+            if inline:
+                self.inlines(inline, paragraph)
+
+    def _restart_numbering(self, style: str, start: int) -> int:
+        """A numbering instance for one list, so each ordered list counts from its own start"""
+        numbering = self.doc.part.numbering_part.element
+        style_num_id = self.doc.styles[style].element.pPr.numPr.numId.val
+        abstract_id = numbering.num_having_numId(style_num_id).abstractNumId.val
+        num = numbering.add_num(abstract_id)
+        num.add_lvlOverride(ilvl=0).add_startOverride(start)
+        return num.numId
+
+    def preformatted(self, node: Node, paragraph) -> None:
+        lines = _text_of(node).split('\n')
+        for i, line in enumerate(lines):
+            run = paragraph.add_run(line)
+            run.font.name = MONOSPACE_FONT
+            run.font.size = Pt(9)
+            if i < len(lines) - 1:
+                run.add_break(WD_BREAK.LINE)
+
+    def table(self, node: Node, container, style: str = 'Table Grid') -> None:
+        rows = []
+        for section in node.children:
+            if not isinstance(section, Node):
+                continue
+            if section.tag == 'tr':
+                rows.append(section)
+            elif section.tag in ('thead', 'tbody', 'tfoot'):
+                rows.extend(r for r in section.children if isinstance(r, Node) and r.tag == 'tr')
+        if not rows:
+            return
+
+        # Place cells on a grid, skipping slots covered by earlier row/col spans
+        placed = []
+        occupied = set()
+        columns = 0
+        for r, row in enumerate(rows):
+            c = 0
+            for cell in row.children:
+                if not isinstance(cell, Node) or cell.tag not in ('td', 'th'):
+                    continue
+                while (r, c) in occupied:
+                    c += 1
+                rowspan = max(1, int(cell.attrs.get('rowspan') or 1))
+                colspan = max(1, int(cell.attrs.get('colspan') or 1))
+                for dr in range(rowspan):
+                    for dc in range(colspan):
+                        occupied.add((r + dr, c + dc))
+                placed.append((r, c, rowspan, colspan, cell))
+                c += colspan
+            columns = max(columns, c)
+        row_count = max(r for r, _ in occupied) + 1
+
+        if isinstance(container, (_Header, _Footer)):
+            table = container.add_table(row_count, max(columns, 1), self.max_width)
+        else:
+            table = container.add_table(rows=row_count, cols=max(columns, 1))
+        table.style = self.doc.styles[style]
+        for r, c, rowspan, colspan, cell in placed:
+            target = table.cell(r, c)
+            if rowspan > 1 or colspan > 1:
+                target = target.merge(table.cell(min(r + rowspan, row_count) - 1, min(c + colspan, columns) - 1))
+            paragraph = target.paragraphs[0]
+            children = [child for child in cell.children if not _is_blank(child)]
+            if any(isinstance(child, Node) and child.tag in BLOCK_TAGS for child in children):
+                self.blocks(cell, target)
+                if not paragraph.text and len(target.paragraphs) > 1:
+                    paragraph._p.getparent().remove(paragraph._p)
+            else:
+                self.inlines(children, paragraph, bold=cell.tag == 'th')
+
+    def figure(self, node: Node, container) -> None:
+        for child in node.children:
+            if _is_blank(child):
+                continue
+            if isinstance(child, Node) and child.tag == 'table':
+                self.table(child, container)  # the caption follows directly
+            elif isinstance(child, Node) and child.tag in BLOCK_TAGS:
+                self.block(child, container, 0)
+            else:
+                paragraph = container.add_paragraph()
+                paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+                self.inlines([child], paragraph)
+
+    # Inlines
+
+    def inlines(self, children: list, paragraph, bold: bool = False, italic: bool = False,
+                code: bool = False, superscript: bool = False, subscript: bool = False, link=None) -> None:
+        for child in children:
+            if isinstance(child, str):
+                text = re.sub(r'\s+', ' ', child)
+                if not paragraph.text and link is None:
+                    text = text.lstrip()
+                if not text:
+                    continue
+                run = self._run(paragraph, text, link)
+                run.bold = bold or None
+                run.italic = italic or None
+                if code:
+                    run.font.name = MONOSPACE_FONT
+                if superscript:
+                    run.font.superscript = True
+                if subscript:
+                    run.font.subscript = True
+                continue
+
+            tag = child.tag
+            options = dict(bold=bold, italic=italic, code=code, superscript=superscript, subscript=subscript, link=link)
+            if tag in ('strong', 'b'):
+                options['bold'] = True
+            elif tag in ('em', 'i'):
+                options['italic'] = True
+            elif tag in ('code', 'kbd', 'samp'):
+                options['code'] = True
+            elif tag == 'sup':
+                options['superscript'] = True
+            elif tag == 'sub':
+                options['subscript'] = True
+            elif tag == 'br':
+                paragraph.add_run().add_break(WD_BREAK.LINE)
+                continue
+            elif tag == FRAME_TAG:
+                self.frame(int(child.attrs.get('data-index', -1)), paragraph)
+                continue
+            elif tag == 'img':
+                self.image(child.attrs.get('src', ''), paragraph)
+                continue
+            elif tag == 'a' and link is None and child.attrs.get('href', '').startswith(('http:', 'https:', 'mailto:')):
+                options['link'] = self._hyperlink(paragraph, child.attrs['href'])
+            elif tag in BLOCK_TAGS:
+                # Block content where only inline content fits: keep its text
+                pass
+            self.inlines(child.children, paragraph, **options)
+
+    def _run(self, paragraph, text: str, link):
+        if link is None:
+            return paragraph.add_run(text)
+        run = paragraph.add_run(text)
+        link.append(run._r)  # move the run into the hyperlink element
+        run.font.color.rgb = LINK_COLOR
+        run.font.underline = True
+        return run
+
+    def _hyperlink(self, paragraph, url: str):
+        rel_id = paragraph.part.relate_to(url, RELATIONSHIP_TYPE.HYPERLINK, is_external=True)
+        hyperlink = OxmlElement('w:hyperlink')
+        hyperlink.set(qn('r:id'), rel_id)
+        paragraph._p.append(hyperlink)
+        return hyperlink
+
+    def frame(self, index: int, paragraph) -> None:
+        if not 0 <= index < len(self.images) or self.images[index] is None:
+            return
+        size = frame_size(self.frames[index])
+        height = Pt(size[1]) if size else None
+        self._picture(paragraph, self.images[index], height=height)
+
+    def image(self, src: str, paragraph) -> None:
+        match = re.match(r'data:image/[\w.+-]+;base64,(.*)$', src, re.S)
+        if not match:
+            return
+        try:
+            self._picture(paragraph, base64.b64decode(match.group(1)))
+        except Exception:
+            paragraph.add_run('[image]')  # a format Word cannot embed
+
+    def _picture(self, paragraph, data: bytes, height=None) -> None:
+        width = None
+        if height is None:
+            natural = DocxImage.from_blob(data)
+            if natural.width > self.max_width:
+                width = self.max_width
+        elif height and DocxImage.from_blob(data).px_height:
+            image = DocxImage.from_blob(data)
+            width = int(height * image.px_width / image.px_height)
+            if width > self.max_width:
+                width, height = self.max_width, None
+        paragraph.add_run().add_picture(io.BytesIO(data), width=width, height=height)
+
+    def save(self) -> bytes:
+        buffer = io.BytesIO()
+        self.doc.save(buffer)
+        return buffer.getvalue()
+
+
+def html_to_docx(html: str, render_frames: Callable[[list[str]], list[Optional[bytes]]]) -> bytes:
+    """Convert Typst HTML output to DOCX bytes.
+
+    render_frames receives the SVG frames in document order and returns a
+    PNG (or None to leave it out) for each.
+    """
+    html, frames = extract_frames(html)
+    builder = _TreeBuilder()
+    builder.feed(html)
+    builder.close()
+
+    body = builder.root
+    for node in builder.root.children:
+        if isinstance(node, Node) and node.tag == 'html':
+            body = next((c for c in node.children if isinstance(c, Node) and c.tag == 'body'), node)
+
+    # Block-level frames (display math) get a centered paragraph of their own
+    for node in _walk(body):
+        for i, child in enumerate(node.children):
+            inline_parent = node.tag in ('span', 'p', 'li', 'td', 'th', FRAME_BLOCK_TAG)
+            if isinstance(child, Node) and child.tag == FRAME_TAG and not inline_parent:
+                wrapper = Node(FRAME_BLOCK_TAG, {})
+                wrapper.children.append(child)
+                node.children[i] = wrapper
+
+    writer = DocxWriter(frames, render_frames(frames) if frames else [])
+    writer.blocks(body)
+    for paragraph in writer.doc.paragraphs:
+        if any(r._r.xpath('.//w:drawing') for r in paragraph.runs) and not paragraph.text.strip():
+            paragraph.alignment = WD_ALIGN_PARAGRAPH.CENTER
+    return writer.save()
+
+
+def pages_to_docx(pages: list[bytes], ppi: float) -> bytes:
+    """A DOCX with one picture per page, sized like the pages rendered at ppi"""
+    writer = DocxWriter([], [])
+    section = writer.doc.sections[0]
+    first = DocxImage.from_blob(pages[0])
+    section.page_width = Pt(first.px_width * 72 / ppi)
+    section.page_height = Pt(first.px_height * 72 / ppi)
+    section.left_margin = section.right_margin = section.top_margin = section.bottom_margin = 0
+    for i, png in enumerate(pages):
+        paragraph = writer.doc.add_paragraph()
+        paragraph.paragraph_format.space_after = 0
+        paragraph.paragraph_format.page_break_before = i > 0
+        image = DocxImage.from_blob(png)
+        width, height = Pt(image.px_width * 72 / ppi), Pt(image.px_height * 72 / ppi)
+        scale = min(1.0, section.page_width / width, section.page_height / height)
+        paragraph.add_run().add_picture(io.BytesIO(png), width=int(width * scale), height=int(height * scale))
+    return writer.save()
+
+
+def _walk(node: Node):
+    yield node
+    for child in node.children:
+        if isinstance(child, Node):
+            yield from _walk(child)
@@ -0,0 +1,125 @@
+"""Size-optimized standalone HTML export from Typst's SVG pages.
+
+Typst writes every page as a self-contained SVG: each page carries its own
+copy of the glyph outlines, clip paths and gradients it uses, and embedded
+images are repeated wherever they are placed. Inlining those pages as-is
+makes an HTML export many times larger than the PDF.
+
+All of those definitions have content-derived ids, so the same glyph gets
+the same id on every page. build_html_document moves them into one shared,
+hidden SVG at the top of the document (each defined once), turns embedded
+images into shared definitions as well, and minifies the page markup:
+whitespace and default attributes are dropped and path data compacted.
+Coordinates are kept exact; rounding them visibly shifts glyph outlines.
+"""
+import hashlib
+import re
+from html import escape
+
+DEFS_RE = re.compile(r'<defs\b[^>]*>(.*?)</defs>', re.S)
+# Children of a <defs> block: <symbol id=...>..</symbol>, <clipPath ...>..</clipPath>, ...
+DEF_RE = re.compile(r'<(\w+)\b[^>]*?\bid="([^"]+)"[^>]*?(?:/>|>.*?</\1>)', re.S)
+IMAGE_RE = re.compile(r'<image\b([^>]*?)/>', re.S)
+IMAGE_TRANSFORM_RE = re.compile(r'\s*\btransform="([^"]*)"')
+SVG_OPEN_RE = re.compile(r'<svg\b[^>]*>')
+VIEWBOX_RE = re.compile(r'\bviewBox="([^"]*)"')
+PATH_DATA_RE = re.compile(r'\bd="([^"]*)"')
+DEFAULT_ATTRS_RE = re.compile(
+    r' (?:fill-rule="nonzero"|fill="#000000"|x="0"|y="0"|class="typst-(?:shape|group|text|image)")'
+)
+DUPLICATE_HREF_RE = re.compile(r'( href="([^"]*)") xlink:href="\2"')
+TRANSLATE_RE = re.compile(r'matrix\(1 0 0 1 ([-\d.e]+) ([-\d.e]+)\)')
+
+PAGE_STYLE = (
+    'body{margin:0;padding:20px;background:#f5f5f5}'
+    '.page{display:block;width:100%;max-width:800px;height:auto;margin:0 auto 20px;'
+    'background:#fff;box-shadow:0 2px 8px rgba(0,0,0,.1)}'
+)
+
+
+def _compact_path(match: re.Match) -> str:
+    data = match.group(1)
+    data = re.sub(r'\s*([A-Za-z])\s*', r'\1', data)  # no spaces around commands
+    data = re.sub(r'\s+', ' ', data).strip()
+    data = re.sub(r' (-)', r'\1', data)  # a minus sign separates numbers by itself
+    data = re.sub(r'(?<![\d.])0\.(\d)', r'.\1', data)  # 0.5 -> .5
+    return f'd="{data}"'
+
+
+def minify_svg(svg: str) -> str:
+    """Shrink Typst SVG markup without changing what it draws"""
+    svg = re.sub(r'>\s+<', '><', svg.strip())
+    svg = TRANSLATE_RE.sub(r'translate(\1 \2)', svg)
+    svg = DEFAULT_ATTRS_RE.sub('', svg)
+    svg = PATH_DATA_RE.sub(_compact_path, svg)
+    # SVG 2 href; every current browser supports it. Typst writes both on some references.
+    svg = DUPLICATE_HREF_RE.sub(r'\1', svg)
+    return svg.replace('xlink:href=', 'href=')
+
+
+class SharedDefs:
+    """Definitions collected across pages, each kept once"""
+
+    def __init__(self):
+        self.defs: dict[str, str] = {}
+
+    def take_defs(self, svg: str) -> str:
+        """Move a page's <defs> content into the shared set"""
+        def collect(block: re.Match) -> str:
+            if DEF_RE.sub('', block.group(1)).strip():
+                return block.group(0)  # something other than id'd definitions; leave it on the page
+            for definition in DEF_RE.finditer(block.group(1)):
+                self.defs.setdefault(definition.group(2), definition.group(0))
+            return ''
+        return DEFS_RE.sub(collect, svg)
+
+    def take_images(self, svg: str) -> str:
+        """Replace each embedded image with a reference to a shared definition"""
+        def share(image: re.Match) -> str:
+            attrs = image.group(1)
+            transform = IMAGE_TRANSFORM_RE.search(attrs)
+            attrs = IMAGE_TRANSFORM_RE.sub('', attrs)
+            image_id = 'i' + hashlib.sha1(attrs.encode('utf-8')).hexdigest()[:16]
+            self.defs.setdefault(image_id, f'<image id="{image_id}"{attrs}/>')
+            placed = f' transform="{transform.group(1)}"' if transform else ''
+            return f'<use xlink:href="#{image_id}"{placed}/>'
+        return IMAGE_RE.sub(share, svg)
+
+    def sprite(self) -> str:
+        # Hidden by size rather than display:none, which would stop
+        # browsers from rendering the gradients and clip paths it defines
+        return (
+            '<svg width="0" height="0" style="position:absolute" aria-hidden="true"><defs>'
+            + ''.join(self.defs.values())
+            + '</defs></svg>'
+        )
+
+
+def _page(svg: str) -> str:
+    """The page's root <svg> tag reduced to what inline SVG in HTML needs"""
+    root = SVG_OPEN_RE.search(svg)
+    if root is None:
+        return svg
+    viewbox = VIEWBOX_RE.search(root.group())
+    width_height = re.findall(r'\b(width|height)="([\d.]+pt)"', root.group())
+    attrs = ''.join(f' {name}="{value}"' for name, value in width_height)
+    if viewbox:
+        attrs = f' viewBox="{viewbox.group(1)}"' + attrs
+    return f'<svg class="page"{attrs}>' + svg[root.end():]
+
+
+def build_html_document(svgs: list[str], title: str = "Typst Document") -> str:
+    """A standalone HTML document showing the given SVG pages"""
+    shared = SharedDefs()
+    pages = []
+    for svg in svgs:
+        svg = shared.take_images(shared.take_defs(svg))
+        pages.append(minify_svg(_page(svg)))
+    sprite = minify_svg(shared.sprite())
+    return (
+        '<!DOCTYPE html><html lang="en"><head><meta charset="utf-8">'
+        '<meta name="viewport" content="width=device-width,initial-scale=1">'
+        f'<title>{escape(title)}</title><style>{PAGE_STYLE}</style></head><body>'
+        + sprite + ''.join(pages)
+        + '</body></html>'
+    )
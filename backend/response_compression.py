@@ -0,0 +1,170 @@
+"""Negotiated gzip / brotli compression of API responses.
+
+Starlette's GZipMiddleware only speaks gzip. Brotli makes the SVG and JSON
+a preview sends on every keystroke noticeably smaller at similar speed, so
+this middleware picks whichever of the two the client prefers (brotli on a
+tie, when the module is installed).
+
+Responses are left alone when they are already encoded, not a text-like
+media type, below the minimum size, or served by byte range: ranges refer
+to the uncompressed bytes. A compressed response gets Vary: Accept-Encoding
+and a weak ETag, since its bytes differ from the identity representation.
+Streamed responses are compressed chunk by chunk and flushed after each, so
+a client sees every chunk as soon as it is sent.
+"""
+import asyncio
+import importlib.util
+import re
+import zlib
+
+from starlette.datastructures import Headers, MutableHeaders
+
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+
+COMPRESSIBLE_MEDIA_TYPES = (
+    'text/', 'application/json', 'application/javascript', 'application/xml', 'image/svg+xml',
+)
+# Bodies at least this large are compressed on a worker thread, off the event loop
+THREAD_MIN_SIZE = 256 * 1024
+
+
+def parse_accept_encoding(header: str) -> dict[str, float]:
+    """Content codings of an Accept-Encoding header with their q-values"""
+    codings = {}
+    for item in header.split(','):
+        name, _, params = item.strip().partition(';')
+        if not name:
+            continue
+        quality = 1.0
+        match = re.search(r'\bq=([\d.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                quality = 0.0
+        codings[name.strip().lower()] = quality
+    return codings
+
+
+def choose_encoding(header: str, brotli: bool = BROTLI_AVAILABLE) -> str | None:
+    """The coding to compress with: the client's preference among br and gzip"""
+    codings = parse_accept_encoding(header)
+    wildcard = codings.get('*', 0.0)
+    candidates = (['br'] if brotli else []) + ['gzip']
+    best, best_quality = None, 0.0
+    for name in candidates:
+        quality = codings.get(name, wildcard)
+        if quality > best_quality:
+            best, best_quality = name, quality
+    return best
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31: gzip container
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        import brotli
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b'') -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """ASGI middleware compressing HTTP responses with the negotiated coding"""
+
+    def __init__(self, app, minimum_size: int = 1024, gzip_level: int = 6, brotli_quality: int = 4,
+                 media_types: tuple[str, ...] = ()):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.media_types = COMPRESSIBLE_MEDIA_TYPES + tuple(media_types)
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] == 'HEAD':
+            await self.app(scope, receive, send)
+            return
+        encoding = choose_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start = None  # held back until the first body chunk shows whether to compress
+        encoder = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start, encoder, passthrough
+            if message['type'] == 'http.response.start':
+                start = message
+                return
+            if passthrough or message['type'] != 'http.response.body':
+                if start is not None:
+                    await send(start)
+                    start = None
+                await send(message)
+                return
+
+            body, more_body = message.get('body', b''), message.get('more_body', False)
+            if encoder is None:
+                headers = MutableHeaders(raw=start['headers'])
+                if not self.compressible(start['status'], headers) or (not more_body and len(body) < self.minimum_size):
+                    passthrough = True
+                    await send(start)
+                    start = None
+                    await send(message)
+                    return
+                encoder = self.encoder(encoding)
+                headers['Content-Encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                etag = headers.get('etag')
+                if etag and not etag.startswith('W/'):
+                    headers['ETag'] = 'W/' + etag
+                if not more_body:
+                    if len(body) >= THREAD_MIN_SIZE:
+                        body = await asyncio.to_thread(encoder.finish, body)
+                    else:
+                        body = encoder.finish(body)
+                    headers['Content-Length'] = str(len(body))
+                    await send(start)
+                    start = None
+                    await send({'type': 'http.response.body', 'body': body})
+                    return
+                del headers['Content-Length']
+                await send(start)
+                start = None
+
+            data = encoder.chunk(body) if more_body else encoder.finish(body)
+            await send({'type': 'http.response.body', 'body': data, 'more_body': more_body})
+
+        await self.app(scope, receive, compressing_send)
+
+    def compressible(self, status: int, headers: Headers) -> bool:
+        if status < 200 or status in (204, 206, 304):
+            return False
+        if 'content-encoding' in headers or 'content-range' in headers:
+            return False
+        if headers.get('accept-ranges', '').lower() == 'bytes':
+            return False
+        if 'no-transform' in headers.get('cache-control', '').lower():
+            return False
+        media_type = headers.get('content-type', '').lower()
+        return media_type.startswith(self.media_types)
+
+    def encoder(self, encoding: str):
+        if encoding == 'br':
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Pre-seed the local typst package directory used by the backend.
+
+Compiles resolve `#import "@namespace/name:version"` from
+TYPST_PACKAGE_DIR/<namespace>/<name>/<version> before trying the network,
+so seeding it lets documents use packages on machines without internet
+access and avoids repeated resolution.
+
+    python seed_packages.py @preview/cetz:0.3.2 @preview/tablex:0.0.8
+    python seed_packages.py --from-cache
+    python seed_packages.py --archive cetz-0.3.2.tar.gz @preview/cetz:0.3.2
+"""
+import argparse
+import io
+import os
+import re
+import shutil
+import sys
+import tarfile
+import urllib.request
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent
+PACKAGE_DIR = Path(os.environ.get('TYPST_PACKAGE_DIR', str(ROOT_DIR / "packages")))
+REGISTRY_URL = "https://packages.typst.org"
+SPEC_RE = re.compile(r'^@([a-z0-9_-]+)/([a-zA-Z0-9_-]+):(\d+\.\d+\.\d+)$')
+
+
+def default_typst_cache() -> Path:
+    """Where the typst CLI caches downloaded packages on this platform"""
+    if sys.platform == 'win32':
+        base = Path(os.environ.get('LOCALAPPDATA', Path.home() / 'AppData' / 'Local'))
+    elif sys.platform == 'darwin':
+        base = Path.home() / 'Library' / 'Caches'
+    else:
+        base = Path(os.environ.get('XDG_CACHE_HOME', Path.home() / '.cache'))
+    return base / 'typst' / 'packages'
+
+
+def parse_spec(spec: str) -> tuple[str, str, str]:
+    match = SPEC_RE.match(spec)
+    if not match:
+        raise SystemExit(f"Invalid package spec {spec!r}, expected @namespace/name:version")
+    return match.groups()
+
+
+def extract_archive(data: bytes, target: Path) -> None:
+    """Unpack a package tarball into target, refusing paths that escape it"""
+    tmp = target.with_name(target.name + '.partial')
+    shutil.rmtree(tmp, ignore_errors=True)
+    tmp.mkdir(parents=True)
+    root = tmp.resolve()
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as archive:
+        for member in archive.getmembers():
+            if not (member.isfile() or member.isdir()):
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise SystemExit(f"Refusing to extract {member.name!r}: only files and directories are allowed")
+            if not (tmp / member.name).resolve().is_relative_to(root):
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise SystemExit(f"Refusing to extract {member.name!r} outside the package directory")
+        archive.extractall(tmp)
+    shutil.rmtree(target, ignore_errors=True)
+    tmp.rename(target)
+
+
+def seed_spec(spec: str, archive: Path = None) -> None:
+    namespace, name, version = parse_spec(spec)
+    target = PACKAGE_DIR / namespace / name / version
+    if target.is_dir() and archive is None:
+        print(f"{spec}: already seeded")
+        return
+
+    if archive is not None:
+        data = archive.read_bytes()
+    else:
+        if namespace != 'preview':
+            raise SystemExit(f"{spec}: only @preview packages can be downloaded; use --archive")
+        url = f"{REGISTRY_URL}/{namespace}/{name}-{version}.tar.gz"
+        with urllib.request.urlopen(url, timeout=60) as response:
+            data = response.read()
+
+    target.parent.mkdir(parents=True, exist_ok=True)
+    extract_archive(data, target)
+    print(f"{spec}: seeded into {target}")
+
+
+def seed_from_cache(cache_dir: Path) -> None:
+    """Copy every package version found in a typst package cache"""
+    if not cache_dir.is_dir():
+        raise SystemExit(f"No typst package cache at {cache_dir}")
+    copied = 0
+    for version_dir in sorted(cache_dir.glob('*/*/*')):
+        if not version_dir.is_dir():
+            continue
+        target = PACKAGE_DIR / version_dir.relative_to(cache_dir)
+        if target.is_dir():
+            continue
+        shutil.copytree(version_dir, target)
+        copied += 1
+    print(f"Copied {copied} package versions from {cache_dir}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('specs', nargs='*', help="packages to seed, e.g. @preview/cetz:0.3.2")
+    parser.add_argument('--from-cache', nargs='?', const=default_typst_cache(), type=Path, metavar='DIR',
+                        help="copy packages from a typst package cache (default: the typst CLI cache)")
+    parser.add_argument('--archive', type=Path, help="install a single spec from a local .tar.gz instead of downloading")
+    args = parser.parse_args()
+
+    if not args.specs and args.from_cache is None:
+        parser.error("give package specs or --from-cache")
+    if args.archive is not None and len(args.specs) != 1:
+        parser.error("--archive needs exactly one package spec")
+
+    PACKAGE_DIR.mkdir(parents=True, exist_ok=True)
+    if args.from_cache is not None:
+        seed_from_cache(args.from_cache)
+    for spec in args.specs:
+        seed_spec(spec, args.archive)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
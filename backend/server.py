@@ -1,20 +1,39 @@
-from fastapi import FastAPI, APIRouter, HTTPException
-from fastapi.responses import FileResponse, Response
+from fastapi import FastAPI, APIRouter, HTTPException, WebSocket, WebSocketDisconnect, Query, Request, Header
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, ReturnDocument, UpdateOne
+from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
 import os
 import logging
 import json
+import io
+import base64
 from pathlib import Path
-from pydantic import BaseModel, Field, ConfigDict
-from typing import List, Optional
+from pydantic import BaseModel, Field, ConfigDict, ValidationError
+from typing import List, Literal, Optional
 import uuid
 from datetime import datetime, timezone
 import tempfile
 import typst
 import subprocess
 import shutil
+import asyncio
+import threading
+import hashlib
+import gzip
+import importlib.util
+import re
+import zipfile
+from html import escape
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from compile_worker import CompileWorkerPool, CompileWorkerError
+from html_export import build_html_document
+from response_compression import CompressionMiddleware
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -34,8 +53,170 @@ api_router = APIRouter(prefix="/api")
 TEMP_DIR = Path(tempfile.gettempdir()) / "typst_editor"
 TEMP_DIR.mkdir(exist_ok=True)
 
+# Temp directory janitor: reap by age, then enforce a total size quota
+TEMP_MAX_AGE_SECONDS = float(os.environ.get('TEMP_MAX_AGE_SECONDS', '3600'))
+TEMP_DIR_QUOTA_MB = float(os.environ.get('TEMP_DIR_QUOTA_MB', '512'))
+TEMP_JANITOR_INTERVAL_SECONDS = float(os.environ.get('TEMP_JANITOR_INTERVAL_SECONDS', '300'))
+
 # Templates directory
 TEMPLATES_DIR = ROOT_DIR / "templates"
+# How often to check templates for changes (0 disables reloading) and how long clients may cache them
+TEMPLATE_RELOAD_SECONDS = float(os.environ.get('TEMPLATE_RELOAD_SECONDS', '5'))
+TEMPLATE_CACHE_MAX_AGE = int(os.environ.get('TEMPLATE_CACHE_MAX_AGE', '300'))
+# Gallery thumbnails are the first page rendered to PNG at this density
+TEMPLATE_THUMBNAIL_PPI = float(os.environ.get('TEMPLATE_THUMBNAIL_PPI', '36'))
+
+# Math and other frames are embedded in DOCX exports as images at this density
+DOCX_FRAME_PPI = float(os.environ.get('DOCX_FRAME_PPI', '300'))
+# Density of the page images a DOCX export falls back to when HTML would drop content
+DOCX_PAGE_PPI = float(os.environ.get('DOCX_PAGE_PPI', '150'))
+
+# Raster previews: default and maximum density, the SVG size above which
+# "auto" previews send a page as an image, and WebP quality. Re-encoding
+# needs Pillow; without it raster previews are typst's own PNG.
+PREVIEW_RASTER_PPI = float(os.environ.get('PREVIEW_RASTER_PPI', '96'))
+PREVIEW_RASTER_MAX_PPI = float(os.environ.get('PREVIEW_RASTER_MAX_PPI', '300'))
+PREVIEW_RASTER_SVG_BYTES = int(os.environ.get('PREVIEW_RASTER_SVG_BYTES', str(1024 * 1024)))
+PREVIEW_WEBP_QUALITY = int(os.environ.get('PREVIEW_WEBP_QUALITY', '80'))
+WEBP_AVAILABLE = importlib.util.find_spec('PIL') is not None
+
+# HTML exports can be downloaded precompressed for static hosting
+BROTLI_AVAILABLE = importlib.util.find_spec('brotli') is not None
+
+# API responses of at least RESPONSE_COMPRESSION_MIN_BYTES are compressed
+# with brotli or gzip, whichever the client prefers. Previews are compressed
+# on every keystroke, so the levels favour speed over ratio.
+RESPONSE_COMPRESSION_MIN_BYTES = int(os.environ.get('RESPONSE_COMPRESSION_MIN_BYTES', '1024'))
+RESPONSE_GZIP_LEVEL = int(os.environ.get('RESPONSE_GZIP_LEVEL', '6'))
+RESPONSE_BROTLI_QUALITY = int(os.environ.get('RESPONSE_BROTLI_QUALITY', '4'))
+
+# Fonts and packages shared by every compile. Packages found under
+# TYPST_PACKAGE_DIR/<namespace>/<name>/<version> are used without any network
+# access; any other @preview package is still downloaded into typst's own cache.
+TYPST_FONT_PATHS = [p for p in os.environ.get('TYPST_FONT_PATHS', '').split(os.pathsep) if p]
+TYPST_PACKAGE_DIR = Path(os.environ.get('TYPST_PACKAGE_DIR', str(ROOT_DIR / "packages")))
+TYPST_PACKAGE_DIR.mkdir(parents=True, exist_ok=True)
+
+# Warm compiler sessions kept per editor (LRU cap + idle timeout)
+COMPILER_SESSION_MAX = int(os.environ.get('COMPILER_SESSION_MAX', '200'))
+COMPILER_SESSION_IDLE_SECONDS = float(os.environ.get('COMPILER_SESSION_IDLE_SECONDS', '600'))
+
+# Compile worker pool: compiles never run on the event loop
+COMPILE_WORKERS = int(os.environ.get('COMPILE_WORKERS', str(os.cpu_count() or 2)))
+COMPILE_QUEUE_LIMIT = int(os.environ.get('COMPILE_QUEUE_LIMIT', '32'))
+COMPILE_TIMEOUT_SECONDS = float(os.environ.get('COMPILE_TIMEOUT_SECONDS', '30'))
+
+# Compiles run in COMPILE_WORKERS separate processes so a runaway document
+# cannot hang or exhaust the API process; 'thread' compiles in-process instead.
+# Each job gets a CPU-time and resident memory limit, and workers are
+# replaced after COMPILE_WORKER_MAX_JOBS jobs or when they die.
+COMPILE_ISOLATION = os.environ.get('COMPILE_ISOLATION', 'process')
+COMPILE_WORKER_CPU_SECONDS = float(os.environ.get('COMPILE_WORKER_CPU_SECONDS', str(COMPILE_TIMEOUT_SECONDS)))
+COMPILE_WORKER_MEMORY_MB = float(os.environ.get('COMPILE_WORKER_MEMORY_MB', '1024'))
+COMPILE_WORKER_MAX_JOBS = int(os.environ.get('COMPILE_WORKER_MAX_JOBS', '500'))
+
+# Batch exports compile stored documents into a ZIP under EXPORT_DIR. Each
+# job uses at most BATCH_EXPORT_CONCURRENCY compile slots, so interactive
+# previews keep the rest of the pool; finished archives are kept for
+# BATCH_EXPORT_RETENTION_SECONDS.
+EXPORT_DIR = Path(os.environ.get('EXPORT_DIR', str(TEMP_DIR / "exports")))
+EXPORT_DIR.mkdir(parents=True, exist_ok=True)
+BATCH_EXPORT_CONCURRENCY = int(os.environ.get('BATCH_EXPORT_CONCURRENCY', str(max(1, COMPILE_WORKERS // 2))))
+BATCH_EXPORT_MAX_JOBS = int(os.environ.get('BATCH_EXPORT_MAX_JOBS', '4'))
+BATCH_EXPORT_MAX_DOCUMENTS = int(os.environ.get('BATCH_EXPORT_MAX_DOCUMENTS', '5000'))
+BATCH_EXPORT_RETENTION_SECONDS = float(os.environ.get('BATCH_EXPORT_RETENTION_SECONDS', '3600'))
+
+# Background exports store their output under EXPORT_DIR/artifacts, keyed
+# by a hash of format and source, so exporting the same revision again is
+# served from disk. Least recently used artifacts go first once the store
+# is over quota; unused ones are dropped after the max age.
+EXPORT_ARTIFACT_DIR = EXPORT_DIR / "artifacts"
+EXPORT_ARTIFACT_DIR.mkdir(exist_ok=True)
+EXPORT_ARTIFACT_QUOTA_MB = float(os.environ.get('EXPORT_ARTIFACT_QUOTA_MB', '1024'))
+EXPORT_ARTIFACT_MAX_AGE_SECONDS = float(os.environ.get('EXPORT_ARTIFACT_MAX_AGE_SECONDS', str(7 * 24 * 3600)))
+# At most EXPORT_JOB_CONCURRENCY background exports compile at once, so
+# interactive previews keep the rest of the pool; beyond EXPORT_JOB_MAX_RUNNING
+# running or waiting jobs, new exports are refused with 429.
+EXPORT_JOB_CONCURRENCY = int(os.environ.get('EXPORT_JOB_CONCURRENCY', str(max(1, COMPILE_WORKERS // 2))))
+EXPORT_JOB_MAX_RUNNING = int(os.environ.get('EXPORT_JOB_MAX_RUNNING', '16'))
+
+# Content-addressed compile output cache (disk tier is off unless a directory is set)
+COMPILE_CACHE_MEMORY_MB = float(os.environ.get('COMPILE_CACHE_MEMORY_MB', '64'))
+COMPILE_CACHE_DIR = os.environ.get('COMPILE_CACHE_DIR')
+COMPILE_CACHE_DISK_MB = float(os.environ.get('COMPILE_CACHE_DISK_MB', '512'))
+
+# Configure logging
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Compiles slower than this are logged with the size of their source
+COMPILE_SLOW_SECONDS = float(os.environ.get('COMPILE_SLOW_SECONDS', '2'))
+
+# Prometheus metrics, served at /api/metrics
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+COMPILE_STAGE_SECONDS = Histogram(
+    'rapidtypst_compile_stage_seconds', 'Time spent in each compile stage', ['stage'], buckets=LATENCY_BUCKETS
+)
+COMPILE_SECONDS = Histogram(
+    'rapidtypst_compile_seconds', 'Compile time for cache misses', ['format', 'outcome'], buckets=LATENCY_BUCKETS
+)
+COMPILE_PAGES = Histogram(
+    'rapidtypst_compile_pages', 'Pages per successful compile', buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500)
+)
+COMPILE_OUTPUT_BYTES = Histogram(
+    'rapidtypst_compile_output_bytes', 'Size of compile output', ['format'],
+    buckets=(1e3, 1e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7, 1e8)
+)
+COMPILE_ERRORS = Counter('rapidtypst_compile_errors_total', 'Compiles that failed', ['format'])
+COMPILE_QUEUE_WAIT_SECONDS = Histogram(
+    'rapidtypst_compile_queue_wait_seconds', 'Time compile jobs wait for a worker', buckets=LATENCY_BUCKETS
+)
+COMPILE_COALESCED = Counter(
+    'rapidtypst_compile_coalesced_total', 'Compile jobs that joined an identical job already in flight'
+)
+COMPILE_REJECTED = Counter(
+    'rapidtypst_compile_rejected_total', 'Compile jobs refused (queue_full) or abandoned (timeout)', ['reason']
+)
+BATCH_EXPORT_DOCUMENTS = Counter(
+    'rapidtypst_batch_export_documents_total', 'Documents processed by batch exports', ['format', 'outcome']
+)
+DB_OPERATION_SECONDS = Histogram(
+    'rapidtypst_db_operation_seconds', 'MongoDB call latency', ['operation'], buckets=LATENCY_BUCKETS
+)
+
+
+def observe_stage(stage: str):
+    """Context manager timing one compile stage"""
+    return COMPILE_STAGE_SECONDS.labels(stage).time()
+
+
+def observe_db(operation: str):
+    """Context manager timing one MongoDB call (works around an await)"""
+    return DB_OPERATION_SECONDS.labels(operation).time()
+
+
+def record_compile(format: str, content: str, started: float, error: Optional[str] = None,
+                   pages: Optional[int] = None, output_bytes: Optional[int] = None) -> None:
+    """Record a finished (uncached) compile and log it if it was slow"""
+    elapsed = time.perf_counter() - started
+    COMPILE_SECONDS.labels(format, 'error' if error else 'success').observe(elapsed)
+    if error:
+        COMPILE_ERRORS.labels(format).inc()
+    else:
+        if pages is not None:
+            COMPILE_PAGES.observe(pages)
+        if output_bytes is not None:
+            COMPILE_OUTPUT_BYTES.labels(format).observe(output_bytes)
+    if elapsed >= COMPILE_SLOW_SECONDS:
+        logger.warning(
+            "Slow %s compile: %.2fs, source %d bytes / %d lines, %s pages, %s output bytes%s",
+            format, elapsed, len(content.encode('utf-8')), content.count('\n') + 1,
+            pages if pages is not None else '?', output_bytes if output_bytes is not None else '?',
+            ' (failed)' if error else ''
+        )
 
 
 # Define Models
@@ -47,6 +228,10 @@ class DocumentCreate(BaseModel):
 class DocumentUpdate(BaseModel):
     title: Optional[str] = None
     content: Optional[str] = None
+    # Optimistic concurrency: the update is rejected with 409 unless the
+    # stored document still has this version / updated_at
+    base_version: Optional[int] = None
+    base_updated_at: Optional[datetime] = None
 
 
 class Document(BaseModel):
@@ -57,21 +242,126 @@ class Document(BaseModel):
     content: str
     created_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    version: int = 1
+
+
+class DocumentSummary(BaseModel):
+    """Sidebar listing entry: everything but the content"""
+    model_config = ConfigDict(extra="ignore")
+    
+    id: str
+    title: str
+    created_at: datetime
+    updated_at: datetime
+    size: int = 0  # content size in bytes
+    version: int = 1
 
 
 class CompileRequest(BaseModel):
     content: str
+    session_id: Optional[str] = None  # reuse a warm compiler across edits
+    # 1-based, inclusive. Giving either switches the response to page
+    # metadata plus SVG for the pages in range only.
+    first_page: Optional[int] = Field(None, ge=1)
+    last_page: Optional[int] = Field(None, ge=1)
+    # How pages are sent in page responses: vector, as images, or as images
+    # only when their SVG is heavy
+    preview_format: Literal['svg', 'png', 'webp', 'auto'] = 'svg'
+    ppi: Optional[float] = Field(None, ge=18, le=PREVIEW_RASTER_MAX_PPI)  # raster density
+
+    @property
+    def page_range_requested(self) -> bool:
+        return self.first_page is not None or self.last_page is not None
+
+
+class PreviewPage(BaseModel):
+    hash: str
+    width: Optional[float] = None  # page size in pt
+    height: Optional[float] = None
+    svg: Optional[str] = None  # omitted when out of range, already held by the client, or raster
+    format: str = 'svg'
+    image: Optional[str] = None  # URL of the page image for raster pages
 
 
 class CompileResponse(BaseModel):
     success: bool
     html: Optional[str] = None
     error: Optional[str] = None
+    page_count: Optional[int] = None  # only for page range requests
+    pages: List[PreviewPage] = []
+
+
+class PagedCompileRequest(CompileRequest):
+    known_hashes: List[str] = []  # page hashes the client already has rendered
+
+
+class PagedCompileResponse(BaseModel):
+    success: bool
+    pages: List[PreviewPage] = []
+    html: Optional[str] = None  # placeholder or error message when there are no pages
+    error: Optional[str] = None
+
+
+class TextChange(BaseModel):
+    """Replace [from, to) of the base text with insert (UTF-16 offsets, as in the editor)"""
+    model_config = ConfigDict(populate_by_name=True)
+
+    start: int = Field(alias='from', ge=0)
+    end: int = Field(alias='to', ge=0)
+    insert: str = ''
+
+
+class DocumentPatch(BaseModel):
+    """Text changes against the stored content at base_version"""
+    base_version: int
+    changes: List[TextChange]
 
 
 class ExportRequest(BaseModel):
     content: str
     format: str  # 'pdf', 'html', 'docx'
+    # Return a job to poll instead of waiting for the file
+    background: bool = False
+    # HTML only: download a precompressed .html.gz / .html.br
+    compression: Optional[Literal['gzip', 'br']] = None
+
+
+class ExportJobStatus(BaseModel):
+    id: str  # derived from format and content: the same export always gets the same id
+    format: str
+    compression: Optional[str] = None
+    status: str  # 'running', 'done' or 'failed'
+    size: Optional[int] = None  # artifact size in bytes, once done
+    error: Optional[str] = None
+    download_url: Optional[str] = None
+
+
+class BatchExportRequest(BaseModel):
+    """Documents to export: the given ids, or every document matching the filters"""
+    format: Literal['pdf', 'html', 'docx'] = 'pdf'
+    document_ids: Optional[List[str]] = Field(None, min_length=1, max_length=BATCH_EXPORT_MAX_DOCUMENTS)
+    title_contains: Optional[str] = None
+    updated_after: Optional[datetime] = None
+    updated_before: Optional[datetime] = None
+
+
+class BatchExportError(BaseModel):
+    id: str
+    title: Optional[str] = None
+    error: str
+
+
+class BatchExportStatus(BaseModel):
+    id: str
+    status: str  # 'running', 'done', 'failed' or 'cancelled'
+    format: str
+    total: int
+    completed: int = 0
+    failed: int = 0
+    created_at: datetime
+    finished_at: Optional[datetime] = None
+    errors: List[BatchExportError] = []  # the first few failures; all are listed in manifest.json
+    download_url: Optional[str] = None
 
 
 class TemplateMetadata(BaseModel):
@@ -92,133 +382,1193 @@ class TemplateContent(BaseModel):
     content: str
 
 
+# Shared fonts and packages
+PACKAGE_IMPORT_RE = re.compile(r'@([a-z0-9_-]+)/([a-zA-Z0-9_-]+):(\d+\.\d+\.\d+)')
+
+
+class SharedCompilers:
+    """Process-wide font and package configuration for typst compiles.
+
+    Creating a compiler builds its font book, so each compile worker thread
+    keeps one warm compiler for stateless compiles instead of paying that
+    on every call. When worker processes are attached, compiles are sent
+    to them instead. All compilers, and the CLI fallback, resolve packages
+    from the same local package directory.
+    """
+
+    def __init__(self, root: Path, font_paths: list[str], package_dir: Path):
+        self.root = root
+        self.font_paths = font_paths
+        self.package_dir = package_dir
+        self.workers: Optional[CompileWorkerPool] = None
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self.compilers_created = 0
+        self.compiler_create_seconds = 0.0
+        self.declared_imports_local = 0
+        self.declared_imports_missing = 0
+
+        # One font book, scanned once and shared by every in-process compiler
+        started = time.perf_counter()
+        self.fonts = typst.Fonts(font_paths=font_paths) if font_paths else typst.Fonts()
+        self.font_load_seconds = time.perf_counter() - started
+        self.font_count = len(self.fonts.fonts())
+        self.font_families = len(self.fonts.families())
+        logger.info("Loaded %d fonts (%d families) in %.3fs", self.font_count, self.font_families, self.font_load_seconds)
+
+    def compiler_options(self) -> dict:
+        """Picklable compiler options; worker processes load their own font book from font_paths"""
+        options = {'root': str(self.root), 'package_path': str(self.package_dir)}
+        if self.font_paths:
+            options['font_paths'] = self.font_paths
+        return options
+
+    def cli_options(self) -> list[str]:
+        options = ['--root', str(self.root), '--package-path', str(self.package_dir)]
+        for font_path in self.font_paths:
+            options += ['--font-path', font_path]
+        return options
+
+    def new_compiler(self) -> "typst.Compiler":
+        started = time.perf_counter()
+        compiler = typst.Compiler(**{**self.compiler_options(), 'font_paths': self.fonts})
+        with self._lock:
+            self.compilers_created += 1
+            self.compiler_create_seconds += time.perf_counter() - started
+        return compiler
+
+    def compile(self, content: str, format: str, ppi: Optional[float] = None, session_id: Optional[str] = None,
+                with_warnings: bool = False):
+        """Compile on a worker process, or else on the calling thread's warm compiler.
+
+        session_id is only honoured by worker processes; in-process session
+        compiles go through CompilerSession. With with_warnings, returns
+        (output, warning messages).
+        """
+        self.note_package_imports(content)
+        if self.workers is not None:
+            return self.workers.compile(content.encode('utf-8'), format, ppi, session_id, with_warnings)
+        compiler = getattr(self._local, 'compiler', None)
+        if compiler is None:
+            compiler = self._local.compiler = self.new_compiler()
+        options = {'input': content.encode('utf-8'), 'format': format}
+        if ppi is not None:
+            options['ppi'] = ppi
+        if with_warnings:
+            output, warnings = compiler.compile_with_warnings(**options)
+            return output, [w.message for w in warnings]
+        return compiler.compile(**options)
+
+    def note_package_imports(self, content: str) -> None:
+        """Estimate how many declared package imports the local package directory covers.
+
+        This counts "@namespace/name:version" specs in the source text, so
+        specs in comments or strings are included and imports made by the
+        packages themselves are not; it is not what the compiler resolved.
+        """
+        if '@' not in content:
+            return
+        hits = misses = 0
+        for namespace, name, version in set(PACKAGE_IMPORT_RE.findall(content)):
+            if (self.package_dir / namespace / name / version).is_dir():
+                hits += 1
+            else:
+                misses += 1
+        if hits or misses:
+            with self._lock:
+                self.declared_imports_local += hits
+                self.declared_imports_missing += misses
+
+    def stats(self) -> dict:
+        return {
+            "font_count": self.font_count,
+            "font_families": self.font_families,
+            "font_load_seconds": self.font_load_seconds,
+            "font_paths": self.font_paths,
+            "compilers_created": self.compilers_created,
+            "compiler_create_seconds": self.compiler_create_seconds,
+            "package_dir": str(self.package_dir),
+            "packages_cached": sum(1 for _ in self.package_dir.glob('*/*/*')),
+            # Estimates from the source text, see note_package_imports; missing ones are downloaded
+            "declared_imports_local": self.declared_imports_local,
+            "declared_imports_missing": self.declared_imports_missing,
+            "workers": self.workers.stats() if self.workers is not None else None,
+        }
+
+
+shared_compilers = SharedCompilers(TEMP_DIR, TYPST_FONT_PATHS, TYPST_PACKAGE_DIR)
+
+if COMPILE_ISOLATION == 'process':
+    shared_compilers.workers = CompileWorkerPool(
+        size=COMPILE_WORKERS,
+        compiler_options=shared_compilers.compiler_options(),
+        timeout=COMPILE_TIMEOUT_SECONDS,
+        cpu_seconds=COMPILE_WORKER_CPU_SECONDS,
+        max_rss_bytes=int(COMPILE_WORKER_MEMORY_MB * 1024 * 1024),
+        max_jobs=COMPILE_WORKER_MAX_JOBS,
+        max_sessions=COMPILER_SESSION_MAX,
+        session_idle_seconds=COMPILER_SESSION_IDLE_SECONDS,
+    )
+
+
+# Warm compiler sessions
+class CompilerSession:
+    """A long-lived typst compiler for one editor.
+
+    The compiler keeps its font book and memoized layout between calls, so
+    recompiling an edited document only redoes the parts that changed.
+    """
+
+    def __init__(self):
+        self.compiler = shared_compilers.new_compiler()
+        self.lock = threading.Lock()  # a compiler is not safe to share between threads
+        self.last_used = time.monotonic()
+
+    def compile(self, content: str, format: str):
+        shared_compilers.note_package_imports(content)
+        with self.lock:
+            self.last_used = time.monotonic()
+            return self.compiler.compile(input=content.encode('utf-8'), format=format)
+
+
+class CompilerSessionPool:
+    """LRU-capped map of session id -> CompilerSession with idle expiry"""
+
+    def __init__(self, max_sessions: int, idle_seconds: float):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds
+        self._sessions: "OrderedDict[str, CompilerSession]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session_id: str) -> CompilerSession:
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None:
+                session = CompilerSession()
+                self._sessions[session_id] = session
+                while len(self._sessions) > self.max_sessions:
+                    self._sessions.popitem(last=False)
+            else:
+                self._sessions.move_to_end(session_id)
+            return session
+
+    def discard(self, session_id: str) -> None:
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def reap_idle(self) -> int:
+        """Drop sessions idle for longer than idle_seconds, returning how many"""
+        cutoff = time.monotonic() - self.idle_seconds
+        with self._lock:
+            expired = [sid for sid, s in self._sessions.items() if s.last_used < cutoff]
+            for sid in expired:
+                del self._sessions[sid]
+        return len(expired)
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+
+compiler_sessions = CompilerSessionPool(COMPILER_SESSION_MAX, COMPILER_SESSION_IDLE_SECONDS)
+
+
+async def reap_compiler_sessions():
+    """Periodically drop idle compiler sessions so memory stays bounded"""
+    interval = max(COMPILER_SESSION_IDLE_SECONDS / 4, 5)
+    while True:
+        await asyncio.sleep(interval)
+        reaped = compiler_sessions.reap_idle()
+        if reaped:
+            logger.info("Reaped %d idle compiler sessions (%d active)", reaped, len(compiler_sessions))
+
+
+# Compile worker pool
+class CompileQueueFull(Exception):
+    """Raised when the compile pool already holds as many jobs as it may queue"""
+
+
+class CompileDispatcher:
+    """Runs blocking compiles on a bounded thread pool.
+
+    Jobs that are running or waiting count against workers + queue_limit;
+    beyond that, submissions are rejected instead of queueing unboundedly.
+    A job keeps its slot until its thread actually finishes, even if the
+    caller stopped waiting for it after the timeout.
+    """
+
+    def __init__(self, workers: int, queue_limit: int, timeout: float):
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='typst-compile')
+        self.capacity = workers + queue_limit
+        self.timeout = timeout
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _release(self, _future) -> None:
+        with self._lock:
+            self._pending -= 1
+
+    @staticmethod
+    def _call(func, submitted: float, args: tuple):
+        COMPILE_QUEUE_WAIT_SECONDS.observe(time.perf_counter() - submitted)
+        return func(*args)
+
+    async def run(self, func, *args):
+        with self._lock:
+            if self._pending >= self.capacity:
+                raise CompileQueueFull()
+            self._pending += 1
+        try:
+            future = self.executor.submit(self._call, func, time.perf_counter(), args)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout)
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+compile_dispatcher = CompileDispatcher(COMPILE_WORKERS, COMPILE_QUEUE_LIMIT, COMPILE_TIMEOUT_SECONDS)
+
+
+class SingleFlight:
+    """Lets concurrent callers asking for the same key share one in-flight run.
+
+    The run is a task of its own, so a caller that goes away (e.g. a closed
+    connection) does not cancel it for the others still waiting.
+    """
+
+    def __init__(self):
+        self._inflight: dict = {}
+
+    def _done(self, key, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # retrieved here in case every caller went away
+
+    async def run(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._done(key, done))
+        else:
+            COMPILE_COALESCED.inc()
+        return await asyncio.shield(task)
+
+    def __len__(self) -> int:
+        return len(self._inflight)
+
+
+compile_flights = SingleFlight()
+
+
+async def run_compile_job(func, *args, coalesce_key=None):
+    """Run a blocking compile function on the worker pool.
+
+    Calls with the same func and args while one is in flight wait for that
+    one instead of compiling again; pass coalesce_key when args include
+    something that does not change the result, such as a session id.
+    Raises HTTPException 429 when the pool is saturated and 504 on timeout.
+    """
+    key = (func, coalesce_key if coalesce_key is not None else args)
+    return await compile_flights.run(key, lambda: _dispatch_compile_job(func, *args))
+
+
+async def _dispatch_compile_job(func, *args):
+    try:
+        return await compile_dispatcher.run(func, *args)
+    except CompileQueueFull:
+        COMPILE_REJECTED.labels('queue_full').inc()
+        raise HTTPException(
+            status_code=429,
+            detail="Compile queue is full, try again shortly",
+            headers={'Retry-After': '1'}
+        )
+    except asyncio.TimeoutError:
+        COMPILE_REJECTED.labels('timeout').inc()
+        raise HTTPException(status_code=504, detail="Compilation timed out")
+
+
+# Compile output cache
+class CompileCache:
+    """Content-addressed cache of compile output.
+
+    Entries are keyed by a hash of the output format and the source, so a
+    given revision is compiled once no matter how often it is previewed or
+    exported. A memory LRU tier sits in front of an optional on-disk tier;
+    both are bounded by total bytes and evict least recently used entries.
+    """
+
+    def __init__(self, max_memory_bytes: int, disk_dir: Optional[Path] = None, max_disk_bytes: int = 0):
+        self.max_memory_bytes = max_memory_bytes
+        self.max_disk_bytes = max_disk_bytes
+        self.disk_dir = disk_dir
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_bytes = 0
+        self._disk: "OrderedDict[str, int]" = OrderedDict()
+        self._disk_bytes = 0
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        if disk_dir is not None:
+            disk_dir.mkdir(parents=True, exist_ok=True)
+            # Rebuild the disk index oldest-first so eviction order survives restarts
+            for path in sorted(disk_dir.glob('*/*'), key=lambda f: f.stat().st_mtime):
+                if path.is_file() and not path.name.endswith('.tmp'):
+                    size = path.stat().st_size
+                    self._disk[path.name] = size
+                    self._disk_bytes += size
+
+    @staticmethod
+    def key(content: str, format: str) -> str:
+        return hashlib.sha256(f"{format}\0{content}".encode('utf-8')).hexdigest()
+
+    def _disk_path(self, key: str) -> Path:
+        return self.disk_dir / key[:2] / key
+
+    def get(self, content: str, format: str) -> Optional[bytes]:
+        key = self.key(content, format)
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return data
+            on_disk = key in self._disk
+            if not on_disk:
+                self.misses += 1
+                return None
+            self._disk.move_to_end(key)
+
+        try:
+            path = self._disk_path(key)
+            data = path.read_bytes()
+            os.utime(path)
+        except OSError:
+            with self._lock:
+                self._forget_disk(key)
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+            self._store_memory(key, data)
+        return data
+
+    def put(self, content: str, format: str, data: bytes) -> None:
+        key = self.key(content, format)
+        with self._lock:
+            self._store_memory(key, data)
+            write_disk = self.disk_dir is not None and key not in self._disk and len(data) <= self.max_disk_bytes
+        if write_disk:
+            self._store_disk(key, data)
+
+    def _store_memory(self, key: str, data: bytes) -> None:
+        if len(data) > self.max_memory_bytes:
+            return
+        previous = self._memory.pop(key, None)
+        if previous is not None:
+            self._memory_bytes -= len(previous)
+        self._memory[key] = data
+        self._memory_bytes += len(data)
+        while self._memory_bytes > self.max_memory_bytes:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def _store_disk(self, key: str, data: bytes) -> None:
+        path = self._disk_path(key)
+        try:
+            path.parent.mkdir(exist_ok=True)
+            tmp = path.with_name(f"{key}.{uuid.uuid4().hex}.tmp")
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        except OSError as e:
+            logger.warning("Could not write compile cache entry %s: %s", key, e)
+            return
+
+        with self._lock:
+            if key not in self._disk:
+                self._disk[key] = len(data)
+                self._disk_bytes += len(data)
+            evict = []
+            while self._disk_bytes > self.max_disk_bytes and self._disk:
+                old_key, _ = next(iter(self._disk.items()))
+                self._forget_disk(old_key)
+                evict.append(old_key)
+                self.evictions += 1
+        for old_key in evict:
+            self._disk_path(old_key).unlink(missing_ok=True)
+
+    def _forget_disk(self, key: str) -> None:
+        size = self._disk.pop(key, None)
+        if size is not None:
+            self._disk_bytes -= size
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory_bytes,
+                "memory_limit_bytes": self.max_memory_bytes,
+                "disk_enabled": self.disk_dir is not None,
+                "disk_entries": len(self._disk),
+                "disk_bytes": self._disk_bytes,
+                "disk_limit_bytes": self.max_disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "hit_rate": (self.memory_hits + self.disk_hits) / lookups if lookups else 0.0,
+            }
+
+
+compile_cache = CompileCache(
+    max_memory_bytes=int(COMPILE_CACHE_MEMORY_MB * 1024 * 1024),
+    disk_dir=Path(COMPILE_CACHE_DIR) if COMPILE_CACHE_DIR else None,
+    max_disk_bytes=int(COMPILE_CACHE_DISK_MB * 1024 * 1024),
+)
+
+
+# Temp directory janitor
+class TempDirJanitor:
+    """Keeps TEMP_DIR bounded.
+
+    Each sweep removes entries (files, or scratch directories such as an
+    orphaned svg_* directory) older than max_age, then, if the directory is
+    still over quota, removes the oldest remaining entries until it fits.
+    Entries younger than min_age are never touched, so files belonging to
+    a compile that is still running are safe.
+    """
+
+    def __init__(self, root: Path, max_age: float, quota_bytes: int, min_age: float, exclude: tuple = ()):
+        self.root = root
+        self.max_age = max_age
+        self.quota_bytes = quota_bytes
+        self.min_age = min_age
+        self.exclude = {Path(p).resolve() for p in exclude}
+        self.files_reaped = 0
+        self.bytes_reclaimed = 0
+        self.usage_bytes = 0
+        self.usage_entries = 0
+        self.sweeps = 0
+        self.last_sweep: Optional[datetime] = None
+
+    @staticmethod
+    def _entry_size(path: Path) -> int:
+        if path.is_dir():
+            return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+        return path.stat().st_size
+
+    def _remove(self, path: Path) -> None:
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        else:
+            path.unlink(missing_ok=True)
+
+    def sweep(self) -> int:
+        """Run one reaping pass, returning the number of entries removed"""
+        now = time.time()
+        entries = []
+        for path in self.root.iterdir():
+            if path.resolve() in self.exclude:
+                continue
+            try:
+                entries.append((path.stat().st_mtime, path, self._entry_size(path)))
+            except OSError:
+                continue  # removed while we were looking
+        entries.sort(key=lambda e: e[0])
+
+        usage = sum(size for _, _, size in entries)
+        removed = 0
+        kept = []
+        for mtime, path, size in entries:
+            age = now - mtime
+            over_quota = usage > self.quota_bytes
+            if age >= self.min_age and (age >= self.max_age or over_quota):
+                self._remove(path)
+                usage -= size
+                removed += 1
+                self.files_reaped += 1
+                self.bytes_reclaimed += size
+            else:
+                kept.append(path)
+
+        self.usage_bytes = usage
+        self.usage_entries = len(kept)
+        self.sweeps += 1
+        self.last_sweep = datetime.now(timezone.utc)
+        if usage > self.quota_bytes:
+            logger.warning("Temp directory %s still over quota: %d bytes in use", self.root, usage)
+        return removed
+
+    def stats(self) -> dict:
+        return {
+            "path": str(self.root),
+            "files_reaped": self.files_reaped,
+            "bytes_reclaimed": self.bytes_reclaimed,
+            "usage_bytes": self.usage_bytes,
+            "usage_entries": self.usage_entries,
+            "quota_bytes": self.quota_bytes,
+            "max_age_seconds": self.max_age,
+            "sweeps": self.sweeps,
+            "last_sweep": self.last_sweep.isoformat() if self.last_sweep else None,
+        }
+
+
+temp_janitor = TempDirJanitor(
+    TEMP_DIR,
+    max_age=TEMP_MAX_AGE_SECONDS,
+    quota_bytes=int(TEMP_DIR_QUOTA_MB * 1024 * 1024),
+    min_age=COMPILE_TIMEOUT_SECONDS + 30,
+    exclude=(EXPORT_DIR, compile_cache.disk_dir) if compile_cache.disk_dir else (EXPORT_DIR,),
+)
+
+
+class RuntimeStatsCollector:
+    """Exposes queue depth, sessions, cache and temp usage at scrape time"""
+
+    def collect(self):
+        yield GaugeMetricFamily(
+            'rapidtypst_compile_jobs_pending', 'Compile jobs running or queued', value=compile_dispatcher.pending
+        )
+        yield GaugeMetricFamily(
+            'rapidtypst_compile_jobs_capacity', 'Compile jobs accepted before rejecting',
+            value=compile_dispatcher.capacity
+        )
+        yield GaugeMetricFamily(
+            'rapidtypst_compile_jobs_in_flight', 'Distinct compile jobs in flight after coalescing',
+            value=len(compile_flights)
+        )
+        yield GaugeMetricFamily(
+            'rapidtypst_compiler_sessions', 'Warm per-editor compiler sessions', value=len(compiler_sessions)
+        )
+        if shared_compilers.workers is not None:
+            workers = shared_compilers.workers.stats()
+            yield GaugeMetricFamily(
+                'rapidtypst_compile_workers_running', 'Live compile worker processes', value=workers['running']
+            )
+            recycled = CounterMetricFamily(
+                'rapidtypst_compile_workers_recycled', 'Compile worker processes replaced, by reason', labels=['reason']
+            )
+            for reason, count in workers['recycled'].items():
+                recycled.add_metric([reason], count)
+            yield recycled
+
+        cache = compile_cache.stats()
+        lookups = CounterMetricFamily(
+            'rapidtypst_compile_cache_lookups', 'Compile cache lookups by result', labels=['result']
+        )
+        lookups.add_metric(['memory_hit'], cache['memory_hits'])
+        lookups.add_metric(['disk_hit'], cache['disk_hits'])
+        lookups.add_metric(['miss'], cache['misses'])
+        yield lookups
+        yield CounterMetricFamily(
+            'rapidtypst_compile_cache_evictions', 'Entries evicted from the compile cache', value=cache['evictions']
+        )
+        cache_bytes = GaugeMetricFamily('rapidtypst_compile_cache_bytes', 'Compile cache occupancy', labels=['tier'])
+        cache_bytes.add_metric(['memory'], cache['memory_bytes'])
+        cache_bytes.add_metric(['disk'], cache['disk_bytes'])
+        yield cache_bytes
+
+        yield GaugeMetricFamily(
+            'rapidtypst_batch_exports_running', 'Batch export jobs in progress', value=batch_exports.running
+        )
+        yield GaugeMetricFamily(
+            'rapidtypst_export_jobs_running', 'Background export jobs in progress', value=export_jobs.running
+        )
+        yield GaugeMetricFamily(
+            'rapidtypst_export_artifact_bytes', 'Export artifact store usage at the last sweep',
+            value=export_artifact_janitor.usage_bytes
+        )
+        yield GaugeMetricFamily(
+            'rapidtypst_temp_dir_bytes', 'Temp directory usage at the last sweep', value=temp_janitor.usage_bytes
+        )
+        yield CounterMetricFamily(
+            'rapidtypst_temp_dir_reclaimed_bytes', 'Bytes removed by the temp janitor',
+            value=temp_janitor.bytes_reclaimed
+        )
+
+
+async def run_temp_janitor():
+    """Sweep TEMP_DIR periodically for the lifetime of the app"""
+    while True:
+        try:
+            removed = await asyncio.to_thread(temp_janitor.sweep)
+            if removed:
+                logger.info("Temp janitor removed %d entries (%d bytes in use)", removed, temp_janitor.usage_bytes)
+            expired = batch_exports.expire()
+            if expired:
+                logger.info("Removed %d expired batch exports", expired)
+            removed = await asyncio.to_thread(export_artifact_janitor.sweep)
+            if removed:
+                logger.info("Removed %d export artifacts", removed)
+        except Exception:
+            logger.exception("Temp janitor sweep failed")
+        await asyncio.sleep(TEMP_JANITOR_INTERVAL_SECONDS)
+
+
 # Helper function to compile typst
-def compile_typst_to_pdf(content: str, output_path: Path) -> tuple[bool, Optional[str]]:
-    """Compile typst content to PDF using the typst Python package"""
+def compile_typst_to_pdf(content: str) -> tuple[bool, Optional[bytes], Optional[str]]:
+    """Compile typst content to PDF bytes in memory using the typst Python package"""
+    pdf_bytes = compile_cache.get(content, 'pdf')
+    if pdf_bytes is not None:
+        return True, pdf_bytes, None
+
+    started = time.perf_counter()
     try:
-        # Write content to a temp .typ file
-        typ_file = output_path.with_suffix('.typ')
-        typ_file.write_text(content, encoding='utf-8')
-        
-        # Compile using typst Python package
-        pdf_bytes = typst.compile(str(typ_file))
-        output_path.write_bytes(pdf_bytes)
-        
-        return True, None
+        with observe_stage('compile_pdf'):
+            pdf_bytes = shared_compilers.compile(content, 'pdf')
     except Exception as e:
-        return False, str(e)
+        error = _typst_error_message(e) if isinstance(e, typst.TypstError) else str(e)
+        record_compile('pdf', content, started, error=error)
+        return False, None, error
 
+    record_compile('pdf', content, started, output_bytes=len(pdf_bytes))
+    compile_cache.put(content, 'pdf', pdf_bytes)
+    return True, pdf_bytes, None
 
-def compile_typst_to_svg(content: str) -> tuple[bool, Optional[str], Optional[str]]:
-    """Compile typst content to SVG for preview"""
+
+def _typst_error_message(error: Exception) -> str:
+    """Prefer the rendered diagnostic (with source location) over the bare message"""
+    return getattr(error, 'diagnostic', None) or str(error) or "Compilation failed"
+
+
+def _render_svg_pages_cli(content: str) -> list[str]:
+    """Render SVG pages with the typst CLI (fallback when the binding cannot do SVG)"""
+    typ_file = TEMP_DIR / f"{uuid.uuid4()}.typ"
+    svg_dir = TEMP_DIR / f"svg_{uuid.uuid4()}"
+    svg_dir.mkdir(exist_ok=True)
     try:
-        # Create temp files
-        typ_file = TEMP_DIR / f"{uuid.uuid4()}.typ"
-        svg_dir = TEMP_DIR / f"svg_{uuid.uuid4()}"
-        svg_dir.mkdir(exist_ok=True)
-        
-        typ_file.write_text(content, encoding='utf-8')
-        
-        # Try using typst CLI for SVG output
-        result = subprocess.run(
-            ['typst', 'compile', str(typ_file), str(svg_dir / 'page{n}.svg')],
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
-        
+        with observe_stage('cli_write_source'):
+            typ_file.write_text(content, encoding='utf-8')
+        with observe_stage('cli_compile'):
+            result = subprocess.run(
+                ['typst', 'compile', *shared_compilers.cli_options(), str(typ_file), str(svg_dir / 'page{n}.svg')],
+                capture_output=True,
+                text=True,
+                timeout=30
+            )
         if result.returncode != 0:
-            # Clean up
-            typ_file.unlink(missing_ok=True)
-            shutil.rmtree(svg_dir, ignore_errors=True)
-            return False, None, result.stderr or "Compilation failed"
-        
-        # Read all SVG files and combine them
-        svg_files = sorted(svg_dir.glob('*.svg'))
-        svgs = []
-        for svg_file in svg_files:
-            svg_content = svg_file.read_text(encoding='utf-8')
-            svgs.append(svg_content)
-        
-        # Clean up
+            raise typst.TypstError(result.stderr or "Compilation failed")
+
+        # typst pads {n} to the page count width, so lexical order is page order
+        with observe_stage('cli_read_pages'):
+            return [f.read_text(encoding='utf-8') for f in sorted(svg_dir.glob('*.svg'))]
+    finally:
         typ_file.unlink(missing_ok=True)
         shutil.rmtree(svg_dir, ignore_errors=True)
-        
-        if svgs:
-            # Wrap SVGs in HTML
-            html_content = f"""
+
+
+def render_svg_pages(content: str, session_id: Optional[str] = None) -> list[str]:
+    """Render typst content to one SVG string per page.
+
+    Uses the typst binding, through the warm compiler of session_id when
+    one is given; the CLI is only used if the binding fails for a reason
+    other than a compile error (e.g. no SVG support). Raises
+    typst.TypstError on compile errors and CompileWorkerError when a worker
+    process was stopped.
+    """
+    try:
+        with observe_stage('compile_svg'):
+            if session_id and shared_compilers.workers is None:
+                result = compiler_sessions.get(session_id).compile(content, 'svg')
+            else:
+                result = shared_compilers.compile(content, 'svg', session_id=session_id)
+    except (typst.TypstError, CompileWorkerError):
+        raise
+    except Exception as e:
+        logger.warning("In-process SVG compile unavailable (%s), falling back to typst CLI", e)
+        return _render_svg_pages_cli(content)
+
+    # The binding returns bytes for a single page and a list for several
+    pages = result if isinstance(result, list) else [result]
+    with observe_stage('decode_pages'):
+        return [page.decode('utf-8') for page in pages]
+
+
+def wrap_svg_pages(svgs: list[str]) -> str:
+    """Wrap rendered SVG pages in the preview HTML container"""
+    return f"""
             <div style="display: flex; flex-direction: column; gap: 20px; padding: 20px; background: white;">
                 {''.join(f'<div style="box-shadow: 0 2px 8px rgba(0,0,0,0.1); padding: 10px; background: white;">{svg}</div>' for svg in svgs)}
             </div>
             """
-            return True, html_content, None
-        else:
-            return False, None, "No output generated"
-            
+
+
+def _render_page_index(content: str, session_id: Optional[str]) -> tuple[Optional[list[dict]], Optional[list[str]], Optional[str]]:
+    """Render content and cache every page by hash; returns (index, svgs, error)"""
+    started = time.perf_counter()
+    try:
+        svgs = render_svg_pages(content, session_id)
     except subprocess.TimeoutExpired:
-        return False, None, "Compilation timed out"
+        error = "Compilation timed out"
     except FileNotFoundError:
-        # Typst CLI not installed, fallback to PDF preview message
-        return False, None, "Typst CLI not found. Install it for live preview."
+        # Binding cannot render SVG and the typst CLI is not installed either
+        error = "Typst CLI not found. Install it for live preview."
+    except typst.TypstError as e:
+        error = _typst_error_message(e)
     except Exception as e:
-        return False, None, str(e)
+        error = str(e)
+    else:
+        error = None if svgs else "No output generated"
+
+    if error:
+        record_compile('svg', content, started, error=error)
+        return None, None, error
+    record_compile('svg', content, started, pages=len(svgs), output_bytes=sum(len(svg) for svg in svgs))
+
+    # Pages are stored individually, so unchanged pages are shared between
+    # revisions and a single page can be served without the rest
+    index = []
+    for svg in svgs:
+        info = page_info(svg)
+        compile_cache.put(info['hash'], 'svg-page', svg.encode('utf-8'))
+        index.append(info)
+    compile_cache.put(content, 'svg-index', json.dumps(index).encode('utf-8'))
+    return index, svgs, None
+
+
+def load_page_svg(digest: str) -> Optional[str]:
+    """SVG of a rendered page by its hash, if it is still cached"""
+    data = compile_cache.get(digest, 'svg-page')
+    return data.decode('utf-8') if data is not None else None
+
+
+def compile_page_index(content: str, session_id: Optional[str] = None) -> tuple[bool, Optional[list[dict]], Optional[str]]:
+    """Compile typst content and return the hash and size of each page.
+
+    Page SVGs are left in the cache for load_page_svg, so callers can fetch
+    only the pages they are going to show.
+    """
+    cached = compile_cache.get(content, 'svg-index')
+    if cached is not None:
+        return True, json.loads(cached), None
+    index, _, error = _render_page_index(content, session_id)
+    return error is None, index, error
+
+
+def compile_svg_pages(content: str, session_id: Optional[str] = None) -> tuple[bool, Optional[list[str]], Optional[str]]:
+    """Compile typst content to a list of per-page SVGs, going through the cache"""
+    cached = compile_cache.get(content, 'svg-index')
+    if cached is not None:
+        svgs = [load_page_svg(info['hash']) for info in json.loads(cached)]
+        if None not in svgs:
+            return True, svgs, None
+        # Some pages were evicted before the index; render again
+
+    index, svgs, error = _render_page_index(content, session_id)
+    return error is None, svgs, error
+
+
+def raster_preview_format(preview_format: str) -> str:
+    """Image format used for a raster preview request"""
+    if preview_format == 'png' or not WEBP_AVAILABLE:
+        return 'png'
+    return 'webp'
+
+
+def encode_raster_page(png: bytes, format: str) -> bytes:
+    """Re-encode a page rendered by typst as PNG into the preview image format.
+
+    Pages are flattened onto white first: typst's RGBA output compresses
+    poorly and previews never need transparency.
+    """
+    if not WEBP_AVAILABLE:
+        return png
+    from PIL import Image
+
+    with Image.open(io.BytesIO(png)) as image:
+        page = Image.new('RGB', image.size, 'white')
+        page.paste(image, mask=image.getchannel('A') if image.mode == 'RGBA' else None)
+    output = io.BytesIO()
+    if format == 'webp':
+        page.save(output, 'WEBP', quality=PREVIEW_WEBP_QUALITY)
+    else:
+        page.save(output, 'PNG')
+    return output.getvalue()
+
+
+def render_raster_pages(content: str, index: list[dict], page_indexes: list[int], format: str, ppi: float) -> None:
+    """Make sure the given pages are cached as images, rendering the document if any is missing.
+
+    Images are cached by page hash, so after an edit only the pages that
+    changed are encoded again.
+    """
+    cache_format = f'{format}@{ppi:g}'
+    missing = [i for i in page_indexes if compile_cache.get(index[i]['hash'], cache_format) is None]
+    if not missing:
+        return
+    with observe_stage('compile_png'):
+        result = shared_compilers.compile(content, 'png', ppi=ppi)
+    pngs = result if isinstance(result, list) else [result]
+    if len(pngs) != len(index):
+        raise RuntimeError("Raster and vector renders disagree on the page count")
+    with observe_stage('encode_raster'):
+        for i in missing:
+            compile_cache.put(index[i]['hash'], cache_format, encode_raster_page(pngs[i], format))
+
+
+def compile_preview_pages(content: str, session_id: Optional[str] = None, first_page: Optional[int] = None,
+                          last_page: Optional[int] = None, known: frozenset = frozenset(),
+                          preview_format: str = 'svg', ppi: Optional[float] = None
+                          ) -> tuple[bool, Optional[list[PreviewPage]], Optional[str]]:
+    """Compile typst content to per-page metadata, with SVG only for the pages
+    in [first_page, last_page] whose hash is not in known.
+
+    With a raster preview_format, pages (all of them, or for "auto" those
+    whose SVG exceeds PREVIEW_RASTER_SVG_BYTES) are sent as image URLs
+    instead of SVG. Like SVG, images are only rendered for pages in range
+    that are not in known; raster pages outside the range carry no URL and
+    are requested again when they scroll into view.
+    """
+    success, index, error = compile_page_index(content, session_id)
+    if not success:
+        return False, None, error
+
+    raster_pages, image_format, ppi = [], None, ppi or PREVIEW_RASTER_PPI
+    if preview_format != 'svg':
+        image_format = raster_preview_format(preview_format)
+        raster_pages = [
+            i for i, info in enumerate(index)
+            if preview_format != 'auto' or info.get('bytes', 0) > PREVIEW_RASTER_SVG_BYTES
+        ]
+        wanted = [i for i in raster_pages if in_page_range(i, first_page, last_page) and index[i]['hash'] not in known]
+        try:
+            render_raster_pages(content, index, wanted, image_format, ppi)
+        except typst.TypstError as e:
+            return False, None, _typst_error_message(e)
+        except Exception as e:
+            return False, None, str(e)
+
+    pages, rendered = [], None
+    raster = set(raster_pages)
+    for i, info in enumerate(index):
+        if i in raster:
+            image = None
+            if in_page_range(i, first_page, last_page) or info['hash'] in known:
+                image = f"/api/compile/page/{info['hash']}.{image_format}?ppi={ppi:g}"
+            pages.append(PreviewPage(**info, format=image_format, image=image))
+            continue
+        svg = None
+        if in_page_range(i, first_page, last_page) and info['hash'] not in known:
+            svg = load_page_svg(info['hash'])
+            if svg is None:
+                # Evicted since the index was cached; render again to restore it
+                if rendered is None:
+                    _, rendered, error = _render_page_index(content, session_id)
+                    if error:
+                        return False, None, error
+                svg = rendered[i]
+        pages.append(PreviewPage(**info, svg=svg))
+    return True, pages, None
+
+
+def compile_typst_to_svg(content: str, session_id: Optional[str] = None) -> tuple[bool, Optional[str], Optional[str]]:
+    """Compile typst content to SVG for preview"""
+    success, svgs, error = compile_svg_pages(content, session_id)
+    if not success:
+        return False, None, error
+    with observe_stage('wrap_html'):
+        return True, wrap_svg_pages(svgs), None
+
+
+def apply_text_changes(text: str, changes: List[TextChange]) -> str:
+    """Apply non-overlapping changes expressed as UTF-16 offsets into text.
+
+    Offsets refer to the original text, as produced by the browser editor,
+    so changes are applied from the end backwards. Raises ValueError if a
+    change is out of range or changes overlap.
+    """
+    units = text.encode('utf-16-le')
+    length = len(units) // 2
+    next_start = length  # where the following (already applied) change begins
+    for change in sorted(changes, key=lambda c: c.start, reverse=True):
+        if change.start > change.end or change.end > length:
+            raise ValueError(f"Change {change.start}-{change.end} is outside the text")
+        if change.end > next_start:
+            raise ValueError(f"Change {change.start}-{change.end} overlaps another change")
+        units = units[:change.start * 2] + change.insert.encode('utf-16-le') + units[change.end * 2:]
+        next_start = change.start
+    try:
+        return units.decode('utf-16-le')
+    except UnicodeDecodeError:
+        raise ValueError("Change splits a surrogate pair")
+
+
+def page_hash(svg: str) -> str:
+    """Short content hash identifying a rendered page"""
+    return hashlib.sha256(svg.encode('utf-8')).hexdigest()[:32]
+
+
+SVG_SIZE_RE = re.compile(r'<svg[^>]*?\swidth="([\d.]+)pt"\s+height="([\d.]+)pt"')
+
+
+def page_info(svg: str) -> dict:
+    """Hash and size in points of a rendered page, read from its root element"""
+    match = SVG_SIZE_RE.search(svg, 0, 1024)
+    width, height = (float(match.group(1)), float(match.group(2))) if match else (None, None)
+    return {'hash': page_hash(svg), 'width': width, 'height': height, 'bytes': len(svg)}
+
+
+def in_page_range(index: int, first_page: Optional[int], last_page: Optional[int]) -> bool:
+    """Whether the 0-based page index falls in the 1-based, inclusive range"""
+    return (first_page is None or index + 1 >= first_page) and (last_page is None or index + 1 <= last_page)
+
+
+def compile_error_html(error: str) -> str:
+    """Styled error message shown in the preview pane"""
+    return f'''
+        <div style="padding: 20px; background: #FEF2F2; border: 1px solid #FECACA; border-radius: 4px; margin: 20px;">
+            <div style="color: #DC2626; font-weight: 600; margin-bottom: 8px;">Compilation Error</div>
+            <pre style="color: #991B1B; font-size: 13px; white-space: pre-wrap; margin: 0; font-family: 'JetBrains Mono', monospace;">{escape(error)}</pre>
+        </div>
+        '''
+
+
+EMPTY_PREVIEW_HTML = '<div style="color: #71717A; padding: 40px; text-align: center;">Start typing Typst markup to see preview...</div>'
+
+
+# API Routes
+@api_router.get("/")
+async def root():
+    return {"message": "Rapid Typst API"}
+
+
+# Template catalog
+class TemplateCatalog:
+    """Templates loaded once into memory, indexed by id.
+
+    Response bodies and their ETags are precomputed at load time. The
+    catalog is reloaded when metadata.json or a .typ file changes, checked
+    at most every reload_seconds.
+    """
+
+    def __init__(self, directory: Path, reload_seconds: float):
+        self.directory = directory
+        self.reload_seconds = reload_seconds
+        self.available = False
+        self.list_body = b'[]'
+        self.list_etag = ''
+        self.templates: dict[str, TemplateContent] = {}
+        self.bodies: dict[str, tuple[bytes, str]] = {}
+        self.missing_files: set[str] = set()
+        self._signature = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        self.load()
+
+    def _current_signature(self) -> tuple:
+        try:
+            return tuple(sorted((f.name, f.stat().st_mtime_ns, f.stat().st_size) for f in self.directory.iterdir() if f.is_file()))
+        except OSError:
+            return ()
+
+    @staticmethod
+    def _etag(body: bytes) -> str:
+        return f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+
+    def load(self) -> None:
+        """Read the catalog from disk; if it is unreadable, keep serving the previous one"""
+        signature = self._current_signature()
+        metadata_file = self.directory / "metadata.json"
+        templates: dict[str, TemplateContent] = {}
+        bodies: dict[str, tuple[bytes, str]] = {}
+        missing: set[str] = set()
+        entries = []
+        available = metadata_file.exists()
+        try:
+            if available:
+                with open(metadata_file, 'r', encoding='utf-8') as f:
+                    entries = json.load(f).get("templates", [])
+                for entry in entries:
+                    template_file = self.directory / entry["filename"]
+                    if not template_file.exists():
+                        missing.add(entry["id"])
+                        continue
+                    template = TemplateContent(
+                        id=entry["id"],
+                        name=entry["name"],
+                        description=entry["description"],
+                        icon=entry["icon"],
+                        category=entry["category"],
+                        content=template_file.read_text(encoding='utf-8'),
+                    )
+                    body = template.model_dump_json().encode('utf-8')
+                    templates[template.id] = template
+                    bodies[template.id] = (body, self._etag(body))
+            
+            list_body = json.dumps([TemplateMetadata(**entry).model_dump() for entry in entries]).encode('utf-8')
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            # ValueError covers JSONDecodeError and pydantic's ValidationError
+            logger.error("Could not load templates from %s, keeping the previous catalog: %s", self.directory, e)
+            with self._lock:
+                self._signature = signature  # not retried until the files change again
+                self._checked_at = time.monotonic()
+            return
+        
+        with self._lock:
+            self.available = available
+            self.templates = templates
+            self.bodies = bodies
+            self.missing_files = missing
+            self.list_body = list_body
+            self.list_etag = self._etag(list_body)
+            self._signature = signature
+            self._checked_at = time.monotonic()
+
+    def refresh(self) -> None:
+        """Reload if the template files changed since the last check"""
+        if self.reload_seconds <= 0 or time.monotonic() - self._checked_at < self.reload_seconds:
+            return
+        if self._current_signature() != self._signature:
+            logger.info("Templates changed on disk, reloading catalog")
+            self.load()
+        else:
+            self._checked_at = time.monotonic()
+
+
+template_catalog = TemplateCatalog(TEMPLATES_DIR, TEMPLATE_RELOAD_SECONDS)
+
+
+def cached_response(request: Request, body: bytes, etag: str, media_type: str = 'application/json',
+                    cache_control: Optional[str] = None) -> Response:
+    """Serve a precomputed body with an ETag, answering 304 when the client has it"""
+    headers = {
+        'ETag': etag,
+        'Cache-Control': cache_control or f'public, max-age={TEMPLATE_CACHE_MAX_AGE}, must-revalidate',
+    }
+    if_none_match = request.headers.get('if-none-match', '')
+    # Weak comparison: compressed responses carry the ETag as W/"..."
+    if etag in [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')] or if_none_match.strip() == '*':
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type=media_type, headers=headers)
+
 
+# Template previews
+template_thumbnails: dict[str, tuple[str, bytes, str]] = {}  # id -> (template etag, png, png etag)
+
+
+def render_first_page_png(content: str, ppi: float) -> bytes:
+    """Render the first page of typst content to PNG (cached by content)"""
+    cache_format = f'png-page1@{ppi:g}'
+    cached = compile_cache.get(content, cache_format)
+    if cached is not None:
+        return cached
+    result = shared_compilers.compile(content, 'png', ppi=ppi)
+    png = result[0] if isinstance(result, list) else result
+    compile_cache.put(content, cache_format, png)
+    return png
+
+
+def cached_template_thumbnail(template_id: str) -> Optional[tuple[bytes, str]]:
+    """Thumbnail of a template if it was rendered from the current template text"""
+    cached = template_thumbnails.get(template_id)
+    body = template_catalog.bodies.get(template_id)
+    if cached and body and cached[0] == body[1]:
+        return cached[1], cached[2]
+    return None
 
-# API Routes
-@api_router.get("/")
-async def root():
-    return {"message": "Rapid Typst API"}
+
+def build_template_preview(template_id: str) -> Optional[tuple[bytes, str]]:
+    """Thumbnail for a template, rendering it (and warming its SVG preview) if needed"""
+    template = template_catalog.templates.get(template_id)
+    if template is None:
+        return None
+    _, template_etag = template_catalog.bodies[template_id]
+    cached = cached_template_thumbnail(template_id)
+    if cached:
+        return cached
+
+    # Warm the preview cache so loading the template into the editor is instant
+    compile_page_index(template.content)
+    png = render_first_page_png(template.content, TEMPLATE_THUMBNAIL_PPI)
+    png_etag = f'"{hashlib.sha256(png).hexdigest()[:32]}"'
+    template_thumbnails[template_id] = (template_etag, png, png_etag)
+    return png, png_etag
+
+
+async def prerender_templates():
+    """Render every template's thumbnail and preview in the background at startup"""
+    for template_id in list(template_catalog.templates):
+        try:
+            await run_compile_job(build_template_preview, template_id)
+        except Exception as e:
+            logger.warning("Could not prerender template %s: %s", template_id, getattr(e, 'detail', e))
+    logger.info("Prerendered %d template previews", len(template_thumbnails))
 
 
 # Template endpoints
 @api_router.get("/templates", response_model=List[TemplateMetadata])
-async def list_templates():
+async def list_templates(request: Request):
     """Get list of all available templates"""
-    metadata_file = TEMPLATES_DIR / "metadata.json"
-    if not metadata_file.exists():
+    template_catalog.refresh()
+    if not template_catalog.available:
         raise HTTPException(status_code=404, detail="Templates not found")
     
-    with open(metadata_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
-    
-    return data.get("templates", [])
+    return cached_response(request, template_catalog.list_body, template_catalog.list_etag)
 
 
 @api_router.get("/templates/{template_id}", response_model=TemplateContent)
-async def get_template(template_id: str):
+async def get_template(template_id: str, request: Request):
     """Get a specific template with its content"""
-    metadata_file = TEMPLATES_DIR / "metadata.json"
-    if not metadata_file.exists():
+    template_catalog.refresh()
+    if not template_catalog.available:
         raise HTTPException(status_code=404, detail="Templates not found")
     
-    with open(metadata_file, 'r', encoding='utf-8') as f:
-        data = json.load(f)
+    if template_id in template_catalog.missing_files:
+        raise HTTPException(status_code=404, detail="Template file not found")
     
-    # Find the template
-    template = None
-    for t in data.get("templates", []):
-        if t["id"] == template_id:
-            template = t
-            break
+    cached = template_catalog.bodies.get(template_id)
+    if not cached:
+        raise HTTPException(status_code=404, detail="Template not found")
     
-    if not template:
+    body, etag = cached
+    return cached_response(request, body, etag)
+
+
+@api_router.get("/templates/{template_id}/thumbnail")
+async def get_template_thumbnail(template_id: str, request: Request):
+    """First page of a template as a PNG, for the gallery"""
+    template_catalog.refresh()
+    if template_id not in template_catalog.templates:
         raise HTTPException(status_code=404, detail="Template not found")
     
-    # Read the template content
-    template_file = TEMPLATES_DIR / template["filename"]
-    if not template_file.exists():
-        raise HTTPException(status_code=404, detail="Template file not found")
+    # Only a thumbnail that still has to be rendered takes a compile slot
+    cached = cached_template_thumbnail(template_id)
+    if cached:
+        png, etag = cached
+    else:
+        try:
+            png, etag = await run_compile_job(build_template_preview, template_id)
+        except typst.TypstError as e:
+            raise HTTPException(status_code=500, detail=_typst_error_message(e))
     
-    content = template_file.read_text(encoding='utf-8')
+    return cached_response(request, png, etag, media_type='image/png')
+
+
+@api_router.get("/templates/{template_id}/preview", response_model=PagedCompileResponse)
+async def get_template_preview(template_id: str):
+    """Rendered pages of a template, served from the warmed compile cache"""
+    template_catalog.refresh()
+    template = template_catalog.templates.get(template_id)
+    if template is None:
+        raise HTTPException(status_code=404, detail="Template not found")
     
-    return TemplateContent(
-        id=template["id"],
-        name=template["name"],
-        description=template["description"],
-        icon=template["icon"],
-        category=template["category"],
-        content=content
-    )
+    success, pages, error = await run_compile_job(compile_preview_pages, template.content)
+    if not success:
+        return PagedCompileResponse(success=False, html=compile_error_html(error), error=error)
+    return PagedCompileResponse(success=True, pages=pages)
 
 
 # Document CRUD
@@ -228,25 +1578,64 @@ async def create_document(doc: DocumentCreate):
     doc_dict = document.model_dump()
     doc_dict['created_at'] = doc_dict['created_at'].isoformat()
     doc_dict['updated_at'] = doc_dict['updated_at'].isoformat()
+    doc_dict['size'] = len(doc.content.encode('utf-8'))
     
-    await db.documents.insert_one(doc_dict)
+    with observe_db('insert_one'):
+        await db.documents.insert_one(doc_dict)
     return document
 
 
-@api_router.get("/documents", response_model=List[Document])
-async def list_documents():
-    docs = await db.documents.find({}, {"_id": 0}).to_list(1000)
-    for doc in docs:
-        if isinstance(doc.get('created_at'), str):
-            doc['created_at'] = datetime.fromisoformat(doc['created_at'])
-        if isinstance(doc.get('updated_at'), str):
-            doc['updated_at'] = datetime.fromisoformat(doc['updated_at'])
+def encode_document_cursor(doc: dict) -> str:
+    raw = json.dumps([doc['updated_at'], doc['id']]).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii')
+
+
+def decode_document_cursor(cursor: str) -> tuple[str, str]:
+    try:
+        updated_at, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        return str(updated_at), str(doc_id)
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+@api_router.get("/documents", response_model=List[DocumentSummary])
+async def list_documents(
+    response: Response,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+):
+    """List document summaries, most recently updated first.
+
+    Pages are keyed on (updated_at, id); when more documents exist, the
+    cursor for the next page is returned in the X-Next-Cursor header.
+    """
+    match = {}
+    if cursor:
+        updated_at, doc_id = decode_document_cursor(cursor)
+        match = {"$or": [
+            {"updated_at": {"$lt": updated_at}},
+            {"updated_at": updated_at, "id": {"$lt": doc_id}},
+        ]}
+    
+    projection = {"_id": 0, "id": 1, "title": 1, "created_at": 1, "updated_at": 1, "size": 1, "version": 1}
+    with observe_db('list'):
+        docs = await (
+            db.documents.find(match, projection)
+            .sort([("updated_at", DESCENDING), ("id", DESCENDING)])
+            .limit(limit + 1)
+            .to_list(limit + 1)
+        )
+    
+    if len(docs) > limit:
+        docs = docs[:limit]
+        response.headers['X-Next-Cursor'] = encode_document_cursor(docs[-1])
     return docs
 
 
 @api_router.get("/documents/{doc_id}", response_model=Document)
 async def get_document(doc_id: str):
-    doc = await db.documents.find_one({"id": doc_id}, {"_id": 0})
+    with observe_db('find_one'):
+        doc = await db.documents.find_one({"id": doc_id}, {"_id": 0})
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     if isinstance(doc.get('created_at'), str):
@@ -258,16 +1647,38 @@ async def get_document(doc_id: str):
 
 @api_router.put("/documents/{doc_id}", response_model=Document)
 async def update_document(doc_id: str, update: DocumentUpdate):
-    doc = await db.documents.find_one({"id": doc_id}, {"_id": 0})
-    if not doc:
-        raise HTTPException(status_code=404, detail="Document not found")
-    
-    update_data = {k: v for k, v in update.model_dump().items() if v is not None}
+    update_data = update.model_dump(exclude={'base_version', 'base_updated_at'}, exclude_none=True)
     update_data['updated_at'] = datetime.now(timezone.utc).isoformat()
+    if 'content' in update_data:
+        update_data['size'] = len(update_data['content'].encode('utf-8'))
     
-    await db.documents.update_one({"id": doc_id}, {"$set": update_data})
+    query = {"id": doc_id}
+    if update.base_version is not None:
+        query['version'] = update.base_version
+    if update.base_updated_at is not None:
+        # Stored as UTC isoformat strings, so compare in the same form
+        base = update.base_updated_at
+        if base.tzinfo is None:
+            base = base.replace(tzinfo=timezone.utc)
+        query['updated_at'] = base.astimezone(timezone.utc).isoformat()
     
-    updated_doc = await db.documents.find_one({"id": doc_id}, {"_id": 0})
+    # The new document is built from the pre-image, which is exact for a
+    # $set + $inc and avoids mongomock re-matching the filter (version) on
+    # the post-image
+    with observe_db('find_one_and_update'):
+        previous_doc = await db.documents.find_one_and_update(
+            query,
+            {"$set": update_data, "$inc": {"version": 1}},
+            projection={"_id": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+    if not previous_doc:
+        # Only the failure path pays for a second round trip
+        if len(query) > 1 and await db.documents.find_one({"id": doc_id}, {"_id": 0, "id": 1}):
+            raise HTTPException(status_code=409, detail="Document was modified by another save")
+        raise HTTPException(status_code=404, detail="Document not found")
+    
+    updated_doc = {**previous_doc, **update_data, 'version': previous_doc.get('version', 0) + 1}
     if isinstance(updated_doc.get('created_at'), str):
         updated_doc['created_at'] = datetime.fromisoformat(updated_doc['created_at'])
     if isinstance(updated_doc.get('updated_at'), str):
@@ -275,131 +1686,1043 @@ async def update_document(doc_id: str, update: DocumentUpdate):
     return updated_doc
 
 
+@api_router.patch("/documents/{doc_id}", response_model=DocumentSummary)
+async def patch_document(doc_id: str, patch: DocumentPatch):
+    """Apply text changes to the stored content instead of resending all of it.
+
+    The changes must be based on the current version; otherwise 409 is
+    returned and the client should fall back to a full PUT. The response
+    is the document summary, without content.
+    """
+    with observe_db('find_one'):
+        doc = await db.documents.find_one({"id": doc_id}, {"_id": 0, "content": 1, "version": 1})
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if doc.get('version') != patch.base_version:
+        raise HTTPException(status_code=409, detail="Document was modified by another save")
+    
+    try:
+        content = apply_text_changes(doc.get('content') or '', patch.changes)
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    
+    update_data = {
+        'content': content,
+        'size': len(content.encode('utf-8')),
+        'updated_at': datetime.now(timezone.utc).isoformat(),
+    }
+    with observe_db('find_one_and_update'):
+        previous_doc = await db.documents.find_one_and_update(
+            {"id": doc_id, "version": patch.base_version},
+            {"$set": update_data, "$inc": {"version": 1}},
+            projection={"_id": 0, "content": 0},
+            return_document=ReturnDocument.BEFORE,
+        )
+    if not previous_doc:
+        # Another save landed between our read and the conditional write
+        raise HTTPException(status_code=409, detail="Document was modified by another save")
+    
+    del update_data['content']
+    return {**previous_doc, **update_data, 'version': previous_doc.get('version', 0) + 1}
+
+
 @api_router.delete("/documents/{doc_id}")
 async def delete_document(doc_id: str):
-    result = await db.documents.delete_one({"id": doc_id})
+    with observe_db('delete_one'):
+        result = await db.documents.delete_one({"id": doc_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Document not found")
     return {"message": "Document deleted"}
 
 
 # Compile endpoint for live preview
+# Preview responses as one binary frame instead of JSON, for clients that
+# send "Accept: application/vnd.typst-preview-frames" (or connect to the
+# WebSocket with ?transport=binary). Page SVG is then neither escaped into
+# a JSON string nor parsed back out of one.
+PREVIEW_FRAMES_MEDIA_TYPE = 'application/vnd.typst-preview-frames'
+PREVIEW_FRAME_FIELDS = ('html', 'svg')
+
+
+def encode_preview_frame(message: dict) -> bytes:
+    """A preview message as a 4-byte big-endian header length, a JSON header, then its markup.
+
+    Each "html" / "svg" string of the message and of its "pages" is replaced
+    in the header by its UTF-8 length under "html_bytes" / "svg_bytes"; the
+    bytes follow the header in that order, message first.
+    """
+    bodies = []
+    for part in [message, *message.get('pages', [])]:
+        for field in PREVIEW_FRAME_FIELDS:
+            if isinstance(part.get(field), str):
+                body = part.pop(field).encode('utf-8')
+                part[f'{field}_bytes'] = len(body)
+                bodies.append(body)
+    header = json.dumps(message, separators=(',', ':')).encode('utf-8')
+    return b''.join([len(header).to_bytes(4, 'big'), header, *bodies])
+
+
+def preview_response(response: BaseModel, accept: Optional[str]):
+    """The response model as is, or as a binary frame when the client asked for one"""
+    if accept is None or PREVIEW_FRAMES_MEDIA_TYPE not in accept:
+        return response
+    return Response(
+        content=encode_preview_frame(response.model_dump()),
+        media_type=PREVIEW_FRAMES_MEDIA_TYPE,
+        headers={'Vary': 'Accept'},
+    )
+
+
 @api_router.post("/compile", response_model=CompileResponse)
-async def compile_typst(request: CompileRequest):
+async def compile_typst(request: CompileRequest, accept: Optional[str] = Header(None)):
     if not request.content.strip():
-        return CompileResponse(
-            success=True, 
-            html='<div style="color: #71717A; padding: 40px; text-align: center;">Start typing Typst markup to see preview...</div>'
-        )
+        return preview_response(CompileResponse(success=True, html=EMPTY_PREVIEW_HTML), accept)
     
-    success, html, error = compile_typst_to_svg(request.content)
+    if request.page_range_requested:
+        return preview_response(await compile_typst_page_range(request), accept)
+    
+    try:
+        success, html, error = await run_compile_job(
+            compile_typst_to_svg, request.content, request.session_id, coalesce_key=request.content
+        )
+    except HTTPException as e:
+        if e.status_code != 504:
+            raise
+        success, html, error = False, None, e.detail
     
     if success:
-        return CompileResponse(success=True, html=html)
+        return preview_response(CompileResponse(success=True, html=html), accept)
     else:
         # Return a styled error message
-        error_html = f'''
-        <div style="padding: 20px; background: #FEF2F2; border: 1px solid #FECACA; border-radius: 4px; margin: 20px;">
-            <div style="color: #DC2626; font-weight: 600; margin-bottom: 8px;">Compilation Error</div>
-            <pre style="color: #991B1B; font-size: 13px; white-space: pre-wrap; margin: 0; font-family: 'JetBrains Mono', monospace;">{error}</pre>
-        </div>
-        '''
-        return CompileResponse(success=False, html=error_html, error=error)
+        return preview_response(CompileResponse(success=False, html=compile_error_html(error), error=error), accept)
+
+
+async def compile_typst_page_range(request: CompileRequest) -> CompileResponse:
+    """Page count and sizes for the whole document, SVG only for the requested pages"""
+    try:
+        success, pages, error = await run_compile_job(
+            compile_preview_pages, request.content, request.session_id, request.first_page, request.last_page,
+            frozenset(), request.preview_format, request.ppi,
+            coalesce_key=(request.content, request.first_page, request.last_page, request.preview_format, request.ppi)
+        )
+    except HTTPException as e:
+        if e.status_code != 504:
+            raise
+        success, pages, error = False, None, e.detail
+    
+    if not success:
+        return CompileResponse(success=False, html=compile_error_html(error), error=error)
+    return CompileResponse(success=True, page_count=len(pages), pages=pages)
+
+
+@api_router.post("/compile/pages", response_model=PagedCompileResponse)
+async def compile_typst_pages(request: PagedCompileRequest, accept: Optional[str] = Header(None)):
+    """Per-page preview: SVG is only sent for pages in range the client does not already hold"""
+    if not request.content.strip():
+        return preview_response(PagedCompileResponse(success=True, html=EMPTY_PREVIEW_HTML), accept)
+    
+    known = frozenset(request.known_hashes)
+    try:
+        success, pages, error = await run_compile_job(
+            compile_preview_pages, request.content, request.session_id, request.first_page, request.last_page, known,
+            request.preview_format, request.ppi,
+            coalesce_key=(request.content, request.first_page, request.last_page, known, request.preview_format, request.ppi)
+        )
+    except HTTPException as e:
+        if e.status_code != 504:
+            raise
+        success, pages, error = False, None, e.detail
+    
+    if not success:
+        return preview_response(PagedCompileResponse(success=False, html=compile_error_html(error), error=error), accept)
+    return preview_response(PagedCompileResponse(success=True, pages=pages), accept)
+
+
+RASTER_MEDIA_TYPES = {'png': 'image/png', 'webp': 'image/webp'}
+
+
+@api_router.get("/compile/page/{name}")
+async def get_preview_page(name: str, request: Request, ppi: float = Query(PREVIEW_RASTER_PPI)):
+    """One rendered page by hash, for previews that load pages as they scroll into view.
+
+    "<hash>" or "<hash>.svg" is the SVG; "<hash>.png" / "<hash>.webp" the
+    image of a raster preview at ppi. 404 means the page has left the
+    compile cache and the document needs compiling again.
+    """
+    digest, _, extension = name.partition('.')
+    if extension in ('', 'svg'):
+        svg = load_page_svg(digest)
+        body, etag, media_type = (svg.encode('utf-8') if svg is not None else None), f'"{digest}"', 'image/svg+xml'
+    elif extension in RASTER_MEDIA_TYPES:
+        body = compile_cache.get(digest, f'{extension}@{ppi:g}')
+        etag, media_type = f'"{digest}.{extension}@{ppi:g}"', RASTER_MEDIA_TYPES[extension]
+    else:
+        raise HTTPException(status_code=404, detail="Unknown page format")
+    
+    if body is None:
+        raise HTTPException(status_code=404, detail="Page is not cached, compile the document again")
+    return cached_response(request, body, etag, media_type=media_type, cache_control='private, max-age=31536000, immutable')
+
+
+@api_router.websocket("/compile/ws")
+async def compile_stream(websocket: WebSocket):
+    """Streaming preview over a WebSocket.
+
+    The client sends {"type": "update", "revision", "content"} or
+    {"type": "delta", "revision", "base_revision", "changes"} messages. Only
+    the newest revision is ever compiled: edits that arrive while a compile
+    is running supersede it, and its remaining pages are not sent. The
+    server answers with "page" messages (one per page with its hash and
+    size), then "done", or "error" / "resync". An edit that cannot be
+    applied (stale base_revision, malformed revision, content or changes)
+    gets "resync"; messages that are not JSON objects are ignored.
+
+    A {"type": "viewport", "first_page", "last_page"} message (1-based,
+    inclusive) limits which pages carry SVG; the client fetches the others
+    from /compile/page/{hash} when they scroll into view. A {"type":
+    "preview", "preview_format", "ppi"} message switches to raster pages
+    (see CompileRequest) and recompiles. SVG is also
+    omitted for pages the client already holds: both sides track the pages
+    of the last "done" plus every page sent with SVG since.
+
+    With ?transport=binary, "page" and "error" messages are sent as binary
+    preview frames (see encode_preview_frame) instead of JSON text.
+    """
+    await websocket.accept()
+    session_id = websocket.query_params.get('session_id')
+    binary_frames = websocket.query_params.get('transport') == 'binary'
+    owns_session = not session_id
+    session_id = session_id or str(uuid.uuid4())
+
+    content = ''
+    revision = 0
+    compiled_revision = 0
+    viewport = (None, None)
+    preview = ('svg', None)
+    changed = asyncio.Event()
+
+    async def send_preview(message: dict):
+        if binary_frames:
+            await websocket.send_bytes(encode_preview_frame(message))
+        else:
+            await websocket.send_json(message)
+
+    async def compile_revision(known: set[str]) -> None:
+        """Compile the newest revision and stream its pages, unless it was already compiled"""
+        nonlocal compiled_revision
+        target_revision, source = revision, content
+        if target_revision == compiled_revision:
+            return
+
+        if not source.strip():
+            compiled_revision = target_revision
+            await send_preview({"type": "error", "revision": target_revision, "error": None, "html": EMPTY_PREVIEW_HTML})
+            return
+
+        await websocket.send_json({"type": "compiling", "revision": target_revision})
+        first_page, last_page = viewport
+        preview_format, ppi = preview
+        held = frozenset(known)
+        try:
+            success, pages, error = await run_compile_job(
+                compile_preview_pages, source, session_id, first_page, last_page, held, preview_format, ppi,
+                coalesce_key=(source, first_page, last_page, held, preview_format, ppi)
+            )
+        except HTTPException as e:
+            if e.status_code == 429:
+                # Pool is saturated; retry the newest revision shortly
+                await asyncio.sleep(1)
+                changed.set()
+                return
+            success, pages, error = False, None, e.detail
+
+        if revision != target_revision:
+            # Superseded while compiling; go straight to the newer text
+            return
+        compiled_revision = target_revision
+
+        if not success:
+            await send_preview({"type": "error", "revision": target_revision, "error": error, "html": compile_error_html(error)})
+            return
+
+        for index, page in enumerate(pages):
+            if revision != target_revision:
+                break
+            await send_preview({"type": "page", "revision": target_revision, "index": index, **page.model_dump()})
+            if page.svg is not None:
+                known.add(page.hash)
+            # Let newer edits be received between pages
+            await asyncio.sleep(0)
+        else:
+            await websocket.send_json({"type": "done", "revision": target_revision, "page_count": len(pages)})
+            known &= {page.hash for page in pages}
+
+    async def compile_loop():
+        known: set[str] = set()
+        while True:
+            await changed.wait()
+            changed.clear()
+            try:
+                await compile_revision(known)
+            except Exception as e:
+                # Report it and keep serving; the next edit compiles again
+                logger.exception("Streaming preview compile failed")
+                known.clear()
+                error = f"{type(e).__name__}: {e}"
+                try:
+                    await send_preview({"type": "error", "revision": revision, "error": error, "html": compile_error_html(error)})
+                except Exception:
+                    # The socket is unusable; close it so the client reconnects or falls back to HTTP
+                    try:
+                        await websocket.close(code=1011)
+                    except Exception:
+                        pass
+                    return
+
+    compiler = asyncio.create_task(compile_loop())
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame['type'] == 'websocket.disconnect':
+                raise WebSocketDisconnect(frame.get('code', 1000))
+            try:
+                message = json.loads(frame.get('text') or frame.get('bytes') or b'')
+            except ValueError:
+                continue  # not JSON; ignore it
+            if not isinstance(message, dict):
+                continue
+            kind = message.get('type')
+            if kind == 'viewport':
+                first_page, last_page = message.get('first_page'), message.get('last_page')
+                if all(page is None or (isinstance(page, int) and page >= 1) for page in (first_page, last_page)):
+                    viewport = (first_page, last_page)
+                continue
+            if kind == 'preview':
+                try:
+                    options = CompileRequest(content='', preview_format=message.get('preview_format', 'svg'), ppi=message.get('ppi'))
+                except ValidationError:
+                    continue
+                preview = (options.preview_format, options.ppi)
+                if revision:
+                    compiled_revision = None  # recompile the current text in the new mode
+                    changed.set()
+                continue
+            if kind not in ('update', 'delta'):
+                continue
+
+            next_revision = message.get('revision', revision + 1)
+            if not isinstance(next_revision, int) or isinstance(next_revision, bool):
+                await websocket.send_json({"type": "resync", "revision": revision})
+                continue
+            if kind == 'update':
+                next_content = message.get('content') or ''
+                if not isinstance(next_content, str):
+                    await websocket.send_json({"type": "resync", "revision": revision})
+                    continue
+                content = next_content
+            else:
+                changes = message.get('changes', [])
+                if message.get('base_revision') != revision or not isinstance(changes, list):
+                    await websocket.send_json({"type": "resync", "revision": revision})
+                    continue
+                try:
+                    content = apply_text_changes(content, [TextChange.model_validate(c) for c in changes])
+                except (ValidationError, ValueError):
+                    await websocket.send_json({"type": "resync", "revision": revision})
+                    continue
+            revision = next_revision
+            changed.set()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        compiler.cancel()
+        if owns_session:
+            compiler_sessions.discard(session_id)
+            if shared_compilers.workers is not None:
+                shared_compilers.workers.discard_session(session_id)
+
+
+@api_router.delete("/compile/sessions/{session_id}")
+async def close_compile_session(session_id: str):
+    """Release the warm compiler of an editor that has been closed"""
+    compiler_sessions.discard(session_id)
+    if shared_compilers.workers is not None:
+        shared_compilers.workers.discard_session(session_id)
+    return {"message": "Session closed"}
+
+
+@api_router.get("/compile/resources")
+async def compile_resource_stats():
+    """Font book and package cache statistics"""
+    return shared_compilers.stats()
+
+
+@api_router.get("/temp/stats")
+async def temp_dir_stats():
+    """Temp directory usage and what the janitor has reclaimed so far"""
+    return temp_janitor.stats()
+
+
+@api_router.get("/compile/cache")
+async def compile_cache_stats():
+    """Hit/miss counters and occupancy of the compile output cache"""
+    return compile_cache.stats()
+
+
+@api_router.get("/metrics")
+async def metrics():
+    """Prometheus metrics for compiles, the worker queue, caches and MongoDB"""
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
 
 
 # Export endpoints
 @api_router.post("/export/pdf")
 async def export_pdf(request: ExportRequest):
+    if request.background:
+        return start_export_job('pdf', request.content)
     try:
-        output_path = TEMP_DIR / f"{uuid.uuid4()}.pdf"
-        success, error = compile_typst_to_pdf(request.content, output_path)
+        success, pdf_bytes, error = await run_compile_job(compile_typst_to_pdf, request.content)
         
         if not success:
             raise HTTPException(status_code=400, detail=error)
         
-        return FileResponse(
-            path=str(output_path),
+        return Response(
+            content=pdf_bytes,
             media_type='application/pdf',
-            filename='document.pdf'
+            headers={'Content-Disposition': 'attachment; filename="document.pdf"'}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def compile_typst_to_html(content: str) -> tuple[bool, Optional[bytes], Optional[str]]:
+    """Compile typst content to a standalone, size-optimized HTML document"""
+    html = compile_cache.get(content, 'html-export')
+    if html is not None:
+        return True, html, None
+
+    success, svgs, error = compile_svg_pages(content)
+    if not success:
+        return False, None, error
+    with observe_stage('build_html'):
+        html = build_html_document(svgs).encode('utf-8')
+    compile_cache.put(content, 'html-export', html)
+    return True, html, None
+
+
+COMPRESSED_EXTENSIONS = {'gzip': 'gz', 'br': 'br'}
+COMPRESSED_MEDIA_TYPES = {'gzip': 'application/gzip', 'br': 'application/x-brotli'}
+
+
+def compress_export(data: bytes, compression: str) -> bytes:
+    """Compress at the highest level: the file is compressed once and served many times"""
+    if compression == 'br':
+        import brotli
+        return brotli.compress(data, quality=11)
+    return gzip.compress(data, compresslevel=9, mtime=0)
+
+
+def check_export_compression(compression: Optional[str]) -> None:
+    if compression == 'br' and not BROTLI_AVAILABLE:
+        raise HTTPException(status_code=400, detail="Brotli compression is not available on this server")
+
+
+def typst_string(text: str) -> str:
+    """Quote text as a typst string literal"""
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+def render_svg_frames(svgs: list[str]) -> list[Optional[bytes]]:
+    """Rasterize SVG frames to PNG with one typst compile, one page per distinct frame"""
+    distinct = list(dict.fromkeys(svgs))
+    source = '#set page(width: auto, height: auto, margin: 0pt)\n' + '\n#pagebreak()\n'.join(
+        f'#image(bytes({typst_string(svg)}), format: "svg")' for svg in distinct
+    )
+    try:
+        with observe_stage('docx_frames'):
+            result = shared_compilers.compile(source, 'png', ppi=DOCX_FRAME_PPI)
+    except (typst.TypstError, CompileWorkerError) as e:
+        logger.warning("Could not render %d frames for DOCX export: %s", len(distinct), e)
+        return [None] * len(svgs)
+    pngs = dict(zip(distinct, result if isinstance(result, list) else [result]))
+    return [pngs.get(svg) for svg in svgs]
+
+
+def compile_typst_to_docx(content: str) -> tuple[bool, Optional[bytes], Optional[str]]:
+    """Compile typst content to a structural DOCX via typst's HTML output.
+
+    Content the HTML target would still drop makes the export fall back to
+    one picture per page.
+    """
+    from docx_export import FORMAT_VERSION, HTML_PRELUDE, HTML_SUFFIX, html_to_docx, lost_elements, pages_to_docx
+
+    cache_format = f'docx-v{FORMAT_VERSION}'
+    docx_bytes = compile_cache.get(content, cache_format)
+    if docx_bytes is not None:
+        return True, docx_bytes, None
+
+    started = time.perf_counter()
+    try:
+        with observe_stage('compile_html'):
+            html, warnings = shared_compilers.compile(HTML_PRELUDE + content + HTML_SUFFIX, 'html', with_warnings=True)
+        lost = lost_elements(warnings)
+        if lost:
+            logger.warning("DOCX export falls back to page images; HTML export drops %s", ', '.join(lost))
+            with observe_stage('docx_pages'):
+                pages = shared_compilers.compile(content, 'png', ppi=DOCX_PAGE_PPI)
+    except (typst.TypstError, CompileWorkerError) as e:
+        # Report the paged compile's error where there is one: its line
+        # numbers match the user's source, unlike the prelude-shifted ones
+        success, _, error = compile_typst_to_pdf(content)
+        if success:
+            error = _typst_error_message(e) if isinstance(e, typst.TypstError) else str(e)
+        record_compile('docx', content, started, error=error)
+        return False, None, error
+
+    with observe_stage('build_docx'):
+        if lost:
+            docx_bytes = pages_to_docx(pages if isinstance(pages, list) else [pages], DOCX_PAGE_PPI)
+        else:
+            docx_bytes = html_to_docx(html.decode('utf-8'), render_svg_frames)
+    record_compile('docx', content, started, output_bytes=len(docx_bytes))
+    compile_cache.put(content, cache_format, docx_bytes)
+    return True, docx_bytes, None
+
+
 @api_router.post("/export/html")
 async def export_html(request: ExportRequest):
+    check_export_compression(request.compression)
+    if request.background:
+        return start_export_job('html', request.content, request.compression)
     try:
-        success, html, error = compile_typst_to_svg(request.content)
+        success, html, error = await run_compile_job(compile_typst_to_html, request.content)
         
         if not success:
             raise HTTPException(status_code=400, detail=error)
         
-        # Create a full HTML document
-        full_html = f'''<!DOCTYPE html>
-<html lang="en">
-<head>
-    <meta charset="UTF-8">
-    <meta name="viewport" content="width=device-width, initial-scale=1.0">
-    <title>Typst Document</title>
-    <style>
-        body {{ margin: 0; padding: 20px; background: #f5f5f5; font-family: system-ui, sans-serif; }}
-        .page {{ background: white; box-shadow: 0 2px 8px rgba(0,0,0,0.1); margin: 0 auto 20px; max-width: 800px; }}
-    </style>
-</head>
-<body>
-{html}
-</body>
-</html>'''
-        
+        if request.compression:
+            return Response(
+                content=await asyncio.to_thread(compress_export, html, request.compression),
+                media_type=COMPRESSED_MEDIA_TYPES[request.compression],
+                headers={
+                    'Content-Disposition':
+                        f'attachment; filename="document.html.{COMPRESSED_EXTENSIONS[request.compression]}"'
+                }
+            )
         return Response(
-            content=full_html,
+            content=html,
             media_type='text/html',
             headers={'Content-Disposition': 'attachment; filename="document.html"'}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @api_router.post("/export/docx")
 async def export_docx(request: ExportRequest):
+    if request.background:
+        return start_export_job('docx', request.content)
     try:
-        # First compile to PDF, then try to convert
-        from docx import Document as DocxDocument
-        from docx.shared import Pt
-        
-        # Create a simple docx with the typst content as text
-        # Note: Full typst->docx conversion is complex; this is a basic version
-        doc = DocxDocument()
-        
-        # Add a note about the conversion
-        para = doc.add_paragraph()
-        run = para.add_run("Note: This is a basic export. For best results, use PDF export.")
-        run.italic = True
-        run.font.size = Pt(10)
-        
-        doc.add_paragraph()  # Spacer
-        
-        # Add the typst source
-        para = doc.add_paragraph()
-        run = para.add_run("Typst Source:")
-        run.bold = True
-        
-        para = doc.add_paragraph()
-        para.add_run(request.content)
+        success, docx_bytes, error = await run_compile_job(compile_typst_to_docx, request.content)
         
-        # Save to temp file
-        output_path = TEMP_DIR / f"{uuid.uuid4()}.docx"
-        doc.save(str(output_path))
+        if not success:
+            raise HTTPException(status_code=400, detail=error)
         
-        return FileResponse(
-            path=str(output_path),
+        return Response(
+            content=docx_bytes,
             media_type='application/vnd.openxmlformats-officedocument.wordprocessingml.document',
-            filename='document.docx'
+            headers={'Content-Disposition': 'attachment; filename="document.docx"'}
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+# Batch exports
+EXPORT_EXTENSIONS = {'pdf': 'pdf', 'html': 'html', 'docx': 'docx'}
+EXPORT_MEDIA_TYPES = {
+    'pdf': 'application/pdf',
+    'html': 'text/html; charset=utf-8',
+    'docx': 'application/vnd.openxmlformats-officedocument.wordprocessingml.document',
+}
+# Attempts at a compile while the pool is saturated by other work
+BATCH_EXPORT_QUEUE_RETRIES = 20
+
+
+async def render_export(format: str, content: str) -> bytes:
+    """Render one document for a batch export; raises ValueError on compile errors.
+
+    Waits and retries while the compile queue is full, since a batch
+    should yield to interactive work rather than fail.
+    """
+    func = {'pdf': compile_typst_to_pdf, 'html': compile_typst_to_html, 'docx': compile_typst_to_docx}[format]
+    for attempt in range(BATCH_EXPORT_QUEUE_RETRIES):
+        try:
+            success, output, error = await run_compile_job(func, content)
+            break
+        except HTTPException as e:
+            if e.status_code != 429:
+                raise ValueError(e.detail)
+            await asyncio.sleep(min(5.0, 0.25 * 2 ** attempt))
+    else:
+        raise ValueError("Compile queue stayed full")
+    if not success:
+        raise ValueError(error)
+    return output
+
+
+def export_filename(doc: dict, format: str) -> str:
+    """Archive member name: the title made filesystem-safe, plus the id for uniqueness"""
+    title = re.sub(r'[^\w.-]+', '-', doc.get('title') or '').strip('-.')[:80] or 'document'
+    return f"{title}-{doc['id'][:8]}.{EXPORT_EXTENSIONS[format]}"
+
+
+class BatchExportJob:
+    """One batch export and its progress"""
+
+    def __init__(self, request: BatchExportRequest, match: dict, total: int, export_dir: Path):
+        self.id = uuid.uuid4().hex
+        self.format = request.format
+        self.document_ids = request.document_ids
+        self.match = match
+        self.total = total
+        self.completed = 0
+        self.failed = 0
+        self.errors: list[BatchExportError] = []
+        self.status = 'running'
+        self.created_at = datetime.now(timezone.utc)
+        self.finished_at: Optional[datetime] = None
+        self.path = export_dir / f"batch-{self.id}.zip"
+        self.task: Optional[asyncio.Task] = None
+
+    def record_error(self, doc_id: str, title: Optional[str], error: str) -> dict:
+        self.failed += 1
+        if len(self.errors) < 20:
+            self.errors.append(BatchExportError(id=doc_id, title=title, error=error))
+        BATCH_EXPORT_DOCUMENTS.labels(self.format, 'failed').inc()
+        return {"id": doc_id, "title": title, "error": error}
+
+    def to_status(self) -> BatchExportStatus:
+        return BatchExportStatus(
+            id=self.id,
+            status=self.status,
+            format=self.format,
+            total=self.total,
+            completed=self.completed,
+            failed=self.failed,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            errors=self.errors,
+            download_url=f"/api/export/batch/{self.id}/download" if self.status == 'done' else None,
+        )
+
+
+class BatchExports:
+    """Runs batch exports as background tasks in this process.
+
+    Documents are read with a streaming cursor and at most `concurrency` of
+    them are held or compiling at once; each result is appended to the ZIP
+    on disk as it finishes, so memory stays flat however many documents a
+    job covers. The archive ends with a manifest.json listing every
+    document's file or error.
+    """
+
+    def __init__(self, export_dir: Path, concurrency: int, max_jobs: int, retention: float):
+        self.export_dir = export_dir
+        self.concurrency = concurrency
+        self.max_jobs = max_jobs
+        self.retention = retention
+        self._jobs: dict[str, BatchExportJob] = {}
+
+    @property
+    def running(self) -> int:
+        return sum(1 for job in self._jobs.values() if job.status == 'running')
+
+    def get(self, job_id: str) -> Optional[BatchExportJob]:
+        return self._jobs.get(job_id)
+
+    def start(self, request: BatchExportRequest, match: dict, total: int) -> BatchExportJob:
+        job = BatchExportJob(request, match, total, self.export_dir)
+        self._jobs[job.id] = job
+        job.task = asyncio.create_task(self._run(job))
+        return job
+
+    async def cancel(self, job_id: str) -> bool:
+        job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        if job.task is not None and not job.task.done():
+            job.task.cancel()
+            await asyncio.gather(job.task, return_exceptions=True)
+        job.path.unlink(missing_ok=True)
+        return True
+
+    async def cancel_running(self) -> None:
+        for job in [job for job in self._jobs.values() if job.status == 'running']:
+            await self.cancel(job.id)
+
+    def expire(self) -> int:
+        """Drop finished jobs past retention, and archives no job refers to"""
+        now = datetime.now(timezone.utc)
+        expired = [
+            job for job in self._jobs.values()
+            if job.finished_at is not None and (now - job.finished_at).total_seconds() > self.retention
+        ]
+        for job in expired:
+            del self._jobs[job.id]
+            job.path.unlink(missing_ok=True)
+
+        # Left behind by a previous process
+        known = {job.path.name for job in self._jobs.values()}
+        for path in self.export_dir.glob('batch-*.zip*'):
+            try:
+                if path.name.removesuffix('.partial') not in known and time.time() - path.stat().st_mtime > self.retention:
+                    path.unlink()
+            except OSError:
+                continue
+        return len(expired)
+
+    async def _run(self, job: BatchExportJob) -> None:
+        partial = job.path.with_name(job.path.name + '.partial')
+        # PDF and DOCX are compressed already; deflating them again costs CPU for nothing
+        compression = zipfile.ZIP_DEFLATED if job.format == 'html' else zipfile.ZIP_STORED
+        archive = zipfile.ZipFile(partial, 'w', compression=compression)
+        write_lock = asyncio.Lock()
+        slots = asyncio.Semaphore(self.concurrency)
+        running: set[asyncio.Task] = set()
+        manifest: list[dict] = []
+        seen: set[str] = set()
+
+        async def export_one(doc: dict) -> None:
+            try:
+                try:
+                    data = await render_export(job.format, doc.get('content') or '')
+                except Exception as e:
+                    manifest.append(job.record_error(doc['id'], doc.get('title'), str(e)))
+                    return
+                name = export_filename(doc, job.format)
+                async with write_lock:
+                    await asyncio.to_thread(archive.writestr, name, data)
+                job.completed += 1
+                BATCH_EXPORT_DOCUMENTS.labels(job.format, 'exported').inc()
+                manifest.append({"id": doc['id'], "title": doc.get('title'), "file": name})
+            finally:
+                slots.release()
+
+        try:
+            projection = {"_id": 0, "id": 1, "title": 1, "content": 1}
+            cursor = db.documents.find(job.match, projection).sort("id", ASCENDING).batch_size(self.concurrency * 2)
+            async for doc in cursor:
+                await slots.acquire()
+                seen.add(doc['id'])
+                task = asyncio.create_task(export_one(doc))
+                running.add(task)
+                task.add_done_callback(running.discard)
+            if running:
+                await asyncio.gather(*running)
+
+            for doc_id in job.document_ids or ():
+                if doc_id not in seen:
+                    seen.add(doc_id)
+                    manifest.append(job.record_error(doc_id, None, "Document not found"))
+            manifest.sort(key=lambda entry: entry['id'])
+            await asyncio.to_thread(archive.writestr, 'manifest.json', json.dumps(manifest, indent=2))
+            await asyncio.to_thread(archive.close)
+            partial.rename(job.path)
+            job.status = 'done'
+        except asyncio.CancelledError:
+            job.status = 'cancelled'
+            raise
+        except Exception:
+            logger.exception("Batch export %s failed", job.id)
+            job.status = 'failed'
+        finally:
+            for task in running:
+                task.cancel()
+            if job.status != 'done':
+                archive.close()
+                partial.unlink(missing_ok=True)
+            job.finished_at = datetime.now(timezone.utc)
+            logger.info(
+                "Batch export %s %s: %d exported, %d failed of %d",
+                job.id, job.status, job.completed, job.failed, job.total
+            )
+
+
+batch_exports = BatchExports(
+    EXPORT_DIR,
+    concurrency=BATCH_EXPORT_CONCURRENCY,
+    max_jobs=BATCH_EXPORT_MAX_JOBS,
+    retention=BATCH_EXPORT_RETENTION_SECONDS,
+)
+
+
+def batch_export_match(request: BatchExportRequest) -> dict:
+    """MongoDB filter for the documents a batch export covers"""
+    match = {}
+    if request.document_ids is not None:
+        match['id'] = {"$in": list(dict.fromkeys(request.document_ids))}
+    if request.title_contains:
+        match['title'] = {"$regex": re.escape(request.title_contains), "$options": "i"}
+    updated = {}
+    if request.updated_after is not None:
+        updated['$gt'] = request.updated_after.astimezone(timezone.utc).isoformat()
+    if request.updated_before is not None:
+        updated['$lt'] = request.updated_before.astimezone(timezone.utc).isoformat()
+    if updated:
+        match['updated_at'] = updated
+    return match
+
+
+@api_router.post("/export/batch", response_model=BatchExportStatus, status_code=202)
+async def start_batch_export(request: BatchExportRequest):
+    """Start exporting stored documents into one ZIP; poll the returned job for progress.
+
+    Without document_ids or filters, every document is exported.
+    """
+    if batch_exports.running >= batch_exports.max_jobs:
+        raise HTTPException(
+            status_code=429, detail="Too many batch exports running, try again later", headers={'Retry-After': '30'}
+        )
+    match = batch_export_match(request)
+    with observe_db('count'):
+        total = await db.documents.count_documents(match)
+    if total > BATCH_EXPORT_MAX_DOCUMENTS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Batch matches {total} documents; the limit is {BATCH_EXPORT_MAX_DOCUMENTS}"
+        )
+    if request.document_ids is not None:
+        total = len(set(request.document_ids))  # missing ids are reported as failures
+    return batch_exports.start(request, match, total).to_status()
+
+
+@api_router.get("/export/batch/{job_id}", response_model=BatchExportStatus)
+async def get_batch_export(job_id: str):
+    job = batch_exports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch export not found")
+    return job.to_status()
+
+
+@api_router.get("/export/batch/{job_id}/download")
+async def download_batch_export(job_id: str):
+    job = batch_exports.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Batch export not found")
+    if job.status != 'done':
+        raise HTTPException(status_code=409, detail=f"Batch export is {job.status}")
+    return FileResponse(job.path, media_type='application/zip', filename=f"export-{job.id[:8]}.zip")
+
+
+@api_router.delete("/export/batch/{job_id}")
+async def delete_batch_export(job_id: str):
+    """Cancel a running batch export, or discard a finished one's archive"""
+    if not await batch_exports.cancel(job_id):
+        raise HTTPException(status_code=404, detail="Batch export not found")
+    return {"message": "Batch export removed"}
+
+
+# Background exports
+# Bump when export output changes for the same source, to stop serving old artifacts
+EXPORT_ARTIFACT_VERSION = 4
+EXPORT_JOB_ID_RE = re.compile(r'^(pdf|html|docx)(?:\.(gz|br))?-([0-9a-f]{64})$')
+COMPRESSION_BY_EXTENSION = {ext: name for name, ext in COMPRESSED_EXTENSIONS.items()}
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+class ExportJobs:
+    """Background exports whose output is stored on disk by content hash.
+
+    A job's id is derived from its format and source, so a client that
+    retries an export, or exports an unchanged document again, lands on the
+    same job and the stored artifact instead of compiling again. Running
+    jobs and recent failures are tracked in this process; finished
+    artifacts are found on disk by any process sharing the directory.
+    """
+
+    def __init__(self, artifact_dir: Path, concurrency: int, max_running: int, max_failures: int = 256):
+        self.artifact_dir = artifact_dir
+        self.max_running = max_running
+        self.max_failures = max_failures
+        self._slots = asyncio.Semaphore(concurrency)
+        self._running: dict[str, asyncio.Task] = {}
+        self._failures: "OrderedDict[str, str]" = OrderedDict()
+
+    @staticmethod
+    def job_id(format: str, content: str, compression: Optional[str] = None) -> str:
+        kind = f"{format}.{COMPRESSED_EXTENSIONS[compression]}" if compression else format
+        return f"{kind}-{CompileCache.key(content, f'export-v{EXPORT_ARTIFACT_VERSION}-{kind}')}"
+
+    @staticmethod
+    def filename(job_id: str) -> str:
+        format, compressed, _ = EXPORT_JOB_ID_RE.match(job_id).groups()
+        return f"document.{EXPORT_EXTENSIONS[format]}" + (f".{compressed}" if compressed else '')
+
+    def artifact_path(self, job_id: str) -> Path:
+        digest = EXPORT_JOB_ID_RE.match(job_id).group(3)
+        return self.artifact_dir / (digest + self.filename(job_id).removeprefix('document'))
+
+    def submit(self, format: str, content: str, compression: Optional[str] = None) -> str:
+        job_id = self.job_id(format, content, compression)
+        if job_id in self._running:
+            return job_id
+        try:
+            os.utime(self.artifact_path(job_id))  # exported again: keep it around longer
+            return job_id
+        except FileNotFoundError:
+            pass
+        if len(self._running) >= self.max_running:
+            raise HTTPException(
+                status_code=429, detail="Too many exports running, try again later", headers={'Retry-After': '10'}
+            )
+        self._failures.pop(job_id, None)  # submitting again retries a failed export
+        task = asyncio.create_task(self._run(job_id, format, content, compression))
+        self._running[job_id] = task
+        task.add_done_callback(lambda _: self._running.pop(job_id, None))
+        return job_id
+
+    @property
+    def running(self) -> int:
+        return len(self._running)
+
+    def status(self, job_id: str) -> Optional[ExportJobStatus]:
+        """Current state of a job, or None if it is unknown (or its artifact expired)"""
+        match = EXPORT_JOB_ID_RE.match(job_id)
+        if match is None:
+            return None
+        job = {'id': job_id, 'format': match.group(1), 'compression': COMPRESSION_BY_EXTENSION.get(match.group(2))}
+        if job_id in self._running:
+            return ExportJobStatus(**job, status='running')
+        if job_id in self._failures:
+            return ExportJobStatus(**job, status='failed', error=self._failures[job_id])
+        try:
+            size = self.artifact_path(job_id).stat().st_size
+        except OSError:
+            return None
+        return ExportJobStatus(**job, status='done', size=size, download_url=f"/api/export/jobs/{job_id}/download")
+
+    async def _run(self, job_id: str, format: str, content: str, compression: Optional[str]) -> None:
+        try:
+            async with self._slots:
+                started = time.perf_counter()
+                data = await render_export(format, content)
+            if compression:
+                data = await asyncio.to_thread(compress_export, data, compression)
+            await asyncio.to_thread(self._store, job_id, data)
+        except Exception as e:
+            if not isinstance(e, ValueError):
+                logger.exception("Export job %s failed", job_id)
+            self._failures[job_id] = str(e) or "Export failed"
+            while len(self._failures) > self.max_failures:
+                self._failures.popitem(last=False)
+            return
+        logger.info("Export job %s stored %d bytes in %.2fs", job_id, len(data), time.perf_counter() - started)
+
+    def _store(self, job_id: str, data: bytes) -> None:
+        path = self.artifact_path(job_id)
+        tmp = path.with_name(f"{path.name}.{uuid.uuid4().hex}.tmp")
+        tmp.write_bytes(data)
+        tmp.replace(path)
+
+
+export_jobs = ExportJobs(EXPORT_ARTIFACT_DIR, EXPORT_JOB_CONCURRENCY, EXPORT_JOB_MAX_RUNNING)
+
+export_artifact_janitor = TempDirJanitor(
+    EXPORT_ARTIFACT_DIR,
+    max_age=EXPORT_ARTIFACT_MAX_AGE_SECONDS,
+    quota_bytes=int(EXPORT_ARTIFACT_QUOTA_MB * 1024 * 1024),
+    min_age=60,
+)
+
+
+def start_export_job(format: str, content: str, compression: Optional[str] = None) -> JSONResponse:
+    job_id = export_jobs.submit(format, content, compression)
+    return JSONResponse(
+        status_code=202,
+        content=export_jobs.status(job_id).model_dump(mode='json'),
+        headers={'Location': f"/api/export/jobs/{job_id}"},
+    )
+
+
+def file_range_response(request: Request, path: Path, media_type: str, filename: str, etag: str) -> Response:
+    """Serve a file, honouring a single-range Range header (and If-Range)"""
+    size = path.stat().st_size
+    headers = {
+        'Accept-Ranges': 'bytes',
+        'ETag': etag,
+        'Cache-Control': 'private, max-age=31536000, immutable',
+        'Content-Disposition': f'attachment; filename="{filename}"',
+    }
+    start, end = 0, size - 1
+    status_code = 200
+    range_header = request.headers.get('range')
+    if_range = request.headers.get('if-range')
+    if range_header and (if_range is None or if_range == etag):
+        match = RANGE_RE.match(range_header.strip())
+        if match is None or match.groups() == ('', ''):
+            return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+        first, last = match.groups()
+        if first:
+            start = int(first)
+            end = min(int(last), size - 1) if last else size - 1
+        else:
+            start = max(0, size - int(last))  # suffix range: the last N bytes
+        if start > end or start >= size:
+            return Response(status_code=416, headers={'Content-Range': f'bytes */{size}'})
+        status_code = 206
+        headers['Content-Range'] = f'bytes {start}-{end}/{size}'
+    headers['Content-Length'] = str(end - start + 1)
+
+    def chunks():
+        with open(path, 'rb') as f:
+            f.seek(start)
+            remaining = end - start + 1
+            while remaining > 0:
+                chunk = f.read(min(64 * 1024, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                yield chunk
+
+    return StreamingResponse(chunks(), status_code=status_code, media_type=media_type, headers=headers)
+
+
+@api_router.get("/export/jobs/{job_id}", response_model=ExportJobStatus)
+async def get_export_job(job_id: str):
+    status = export_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    return status
+
+
+@api_router.get("/export/jobs/{job_id}/download")
+async def download_export_job(job_id: str, request: Request):
+    status = export_jobs.status(job_id)
+    if status is None:
+        raise HTTPException(status_code=404, detail="Export job not found")
+    if status.status != 'done':
+        raise HTTPException(status_code=409, detail=status.error or f"Export job is {status.status}")
+    path = export_jobs.artifact_path(job_id)
+    try:
+        os.utime(path)  # recently downloaded artifacts are evicted last
+        media_type = COMPRESSED_MEDIA_TYPES.get(status.compression) or EXPORT_MEDIA_TYPES[status.format]
+        return file_range_response(
+            request, path, media_type, filename=export_jobs.filename(job_id), etag=f'"{job_id}"'
+        )
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Export job not found")
+
+
+# Registered once everything it reports on exists, since registering collects
+REGISTRY.register(RuntimeStatsCollector())
+
+
 # Include the router in the main app
 app.include_router(api_router)
 
@@ -409,16 +2732,76 @@ app.add_middleware(
     allow_origins=os.environ.get('CORS_ORIGINS', '*').split(','),
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor", "Location", "Accept-Ranges", "Content-Range"],
 )
 
-# Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=RESPONSE_COMPRESSION_MIN_BYTES,
+    gzip_level=RESPONSE_GZIP_LEVEL,
+    brotli_quality=RESPONSE_BROTLI_QUALITY,
+    media_types=(PREVIEW_FRAMES_MEDIA_TYPE,),
 )
-logger = logging.getLogger(__name__)
+
+
+# Startup backfills write this many documents per bulk request
+DOCUMENT_BACKFILL_BATCH = 1000
+
+
+@app.on_event("startup")
+async def prepare_document_collection():
+    """Create the indexes behind id lookups and the updated_at listing order"""
+    try:
+        await db.documents.create_index([("id", ASCENDING)], unique=True)
+        await db.documents.create_index([("updated_at", DESCENDING), ("id", DESCENDING)])
+    except Exception as e:
+        logger.warning("Could not create document indexes: %s", e)
+    
+    try:
+        # Documents saved before versions were tracked start at version 1
+        await db.documents.update_many({"version": {"$exists": False}}, {"$set": {"version": 1}})
+        
+        # Documents saved before size was stored: compute it once so listings never read content
+        updates = []
+        async for doc in db.documents.find({"size": {"$exists": False}}, {"_id": 0, "id": 1, "content": 1}):
+            size = len((doc.get('content') or '').encode('utf-8'))
+            updates.append(UpdateOne({"id": doc['id']}, {"$set": {"size": size}}))
+            if len(updates) >= DOCUMENT_BACKFILL_BATCH:
+                await db.documents.bulk_write(updates, ordered=False)
+                updates = []
+        if updates:
+            await db.documents.bulk_write(updates, ordered=False)
+    except Exception as e:
+        logger.warning("Could not backfill document versions and sizes: %s", e)
+
+
+@app.on_event("startup")
+async def start_compiler_session_reaper():
+    app.state.session_reaper = asyncio.create_task(reap_compiler_sessions())
+
+
+@app.on_event("startup")
+async def start_template_prerender():
+    app.state.template_prerender = asyncio.create_task(prerender_templates())
+
+
+@app.on_event("startup")
+async def start_temp_janitor():
+    app.state.temp_janitor = asyncio.create_task(run_temp_janitor())
 
 
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
+
+
+@app.on_event("shutdown")
+async def cancel_batch_exports():
+    await batch_exports.cancel_running()
+
+
+@app.on_event("shutdown")
+async def shutdown_compile_pool():
+    compile_dispatcher.shutdown()
+    if shared_compilers.workers is not None:
+        shared_compilers.workers.shutdown()
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+"""Benchmark the compile, export and document APIs.
+
+Runs the FastAPI app in-process (no server needed) against an in-memory
+MongoDB stand-in, or a real MongoDB with --mongo-url, and fires requests
+at a fixed concurrency. Documents are generated synthetically and scale
+in pages, equations, tables and images. Results are written as JSON so
+runs from different commits can be compared:
+
+    python backend_bench.py --sizes small,medium --requests 30 --concurrency 4
+    python backend_bench.py --output after.json --compare before.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+
+import httpx
+
+ROOT_DIR = Path(__file__).parent
+BACKEND_DIR = ROOT_DIR / "backend"
+
+DOCUMENT_SIZES = {
+    "small": {"pages": 1, "equations": 2, "tables": 1, "images": 1},
+    "medium": {"pages": 10, "equations": 20, "tables": 5, "images": 5},
+    "large": {"pages": 50, "equations": 100, "tables": 20, "images": 20},
+}
+SCENARIOS = ("compile", "pages", "cached", "export", "documents")
+
+IMAGE_SVG = (
+    '<svg xmlns=\\"http://www.w3.org/2000/svg\\" width=\\"120\\" height=\\"60\\">'
+    '<rect width=\\"120\\" height=\\"60\\" fill=\\"#2a7ab0\\"/>'
+    '<circle cx=\\"{x}\\" cy=\\"30\\" r=\\"20\\" fill=\\"#f2c14e\\"/></svg>'
+)
+
+
+def generate_document(pages: int, equations: int, tables: int, images: int, seed: str = "0") -> str:
+    """Build a Typst document with the given amount of each kind of content.
+
+    The seed ends up in a comment, so documents with different seeds render
+    the same but never share a compile cache entry.
+    """
+    lines = [f"// bench document {seed}", '#set page(paper: "a4")', "#set heading(numbering: \"1.\")", ""]
+    for page in range(pages):
+        if page:
+            lines.append("#pagebreak()")
+        lines.append(f"= Section {page + 1}")
+        lines.append("")
+        lines.append("Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 6)
+        lines.append("")
+        for i in range(page, equations, pages):
+            lines.append(f"$ sum_(k=1)^{i + 2} k^2 = (n(n+1)(2n+1)) / 6 + integral_0^{i + 1} x^2 dif x $")
+        for i in range(page, tables, pages):
+            cells = ", ".join(f"[{row * 4 + col + i}]" for row in range(4) for col in range(4))
+            lines.append(f"#table(columns: 4, [A], [B], [C], [D], {cells})")
+        for i in range(page, images, pages):
+            svg = IMAGE_SVG.replace("{x}", str(20 + (i * 17) % 80))
+            lines.append(f'#image(bytes("{svg}"), format: "svg", width: 4cm)')
+        lines.append("")
+    return "\n".join(lines)
+
+
+def percentile(sorted_values: list, fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+
+def summarize(latencies: list, statuses: list, wall_seconds: float, concurrency: int) -> dict:
+    latencies_ms = sorted(latency * 1000 for latency in latencies)
+    status_counts = {}
+    for status in statuses:
+        status_counts[str(status)] = status_counts.get(str(status), 0) + 1
+    return {
+        "requests": len(latencies_ms),
+        "concurrency": concurrency,
+        "errors": sum(1 for status in statuses if status >= 400),
+        "status_counts": status_counts,
+        "p50_ms": round(percentile(latencies_ms, 0.50), 2),
+        "p90_ms": round(percentile(latencies_ms, 0.90), 2),
+        "p99_ms": round(percentile(latencies_ms, 0.99), 2),
+        "mean_ms": round(sum(latencies_ms) / len(latencies_ms), 2) if latencies_ms else 0.0,
+        "max_ms": round(latencies_ms[-1], 2) if latencies_ms else 0.0,
+        "throughput_rps": round(len(latencies_ms) / wall_seconds, 2) if wall_seconds else 0.0,
+    }
+
+
+async def run_scenario(make_request, count: int, concurrency: int) -> dict:
+    """Call make_request(i) for i in range(count), at most `concurrency` at a time"""
+    latencies, statuses = [], []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await make_request(i)
+                status = response.status_code
+            except Exception:
+                status = 599
+            latencies.append(time.perf_counter() - started)
+            statuses.append(status)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(count)))
+    return summarize(latencies, statuses, time.perf_counter() - started, concurrency)
+
+
+def load_app(mongo_url: str = None):
+    """Import the backend with an in-memory MongoDB unless mongo_url is given"""
+    os.environ["MONGO_URL"] = mongo_url or os.environ.get("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "rapidtypst_bench")
+    sys.path.insert(0, str(BACKEND_DIR))
+    import server
+
+    if mongo_url is None:
+        try:
+            from mongomock_motor import AsyncMongoMockClient
+        except ImportError:
+            raise SystemExit("mongomock-motor is not installed; install it or pass --mongo-url")
+        server.client = AsyncMongoMockClient()
+        server.db = server.client[os.environ["DB_NAME"]]
+    return server
+
+
+async def bench_documents(client: httpx.AsyncClient, count: int, concurrency: int) -> dict:
+    content = generate_document(**DOCUMENT_SIZES["medium"])
+    docs = {}
+
+    async def create(i):
+        response = await client.post("/api/documents", json={"title": f"Bench {i}", "content": content})
+        if response.status_code == 200:
+            docs[i] = response.json()
+        return response
+
+    results = {"documents:create": await run_scenario(create, count, concurrency)}
+    ids = [docs[i]["id"] for i in sorted(docs)]
+    if not ids:
+        return results
+
+    async def get(i):
+        return await client.get(f"/api/documents/{ids[i % len(ids)]}")
+
+    async def list_page(i):
+        return await client.get("/api/documents", params={"limit": 50})
+
+    async def put(i):
+        doc = docs[sorted(docs)[i]]
+        response = await client.put(f"/api/documents/{doc['id']}", json={
+            "content": content + f"\n// edit {i}", "base_version": doc["version"]
+        })
+        if response.status_code == 200:
+            doc["version"] = response.json()["version"]
+        return response
+
+    async def patch(i):
+        doc = docs[sorted(docs)[i]]
+        response = await client.patch(f"/api/documents/{doc['id']}", json={
+            "base_version": doc["version"],
+            "changes": [{"from": 0, "to": 0, "insert": f"// patch {i}\n"}],
+        })
+        if response.status_code == 200:
+            doc["version"] = response.json()["version"]
+        return response
+
+    async def delete(i):
+        return await client.delete(f"/api/documents/{ids[i]}")
+
+    results["documents:get"] = await run_scenario(get, count, concurrency)
+    results["documents:list"] = await run_scenario(list_page, count, concurrency)
+    results["documents:put"] = await run_scenario(put, len(ids), concurrency)
+    results["documents:patch"] = await run_scenario(patch, len(ids), concurrency)
+    results["documents:delete"] = await run_scenario(delete, len(ids), concurrency)
+    return results
+
+
+async def run_benchmarks(server, sizes: list, scenarios: list, count: int, concurrency: int) -> dict:
+    results = {}
+    await server.app.router.startup()
+    # Let template prerendering finish so it does not compete with the measurements
+    await server.app.state.template_prerender
+    transport = httpx.ASGITransport(app=server.app)
+    try:
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=300) as client:
+            for size in sizes:
+                spec = DOCUMENT_SIZES[size]
+
+                def fresh(i, spec=spec, size=size):
+                    # A distinct seed per request, so every request is a compile cache miss
+                    return generate_document(**spec, seed=f"{size}-{time.time_ns()}-{i}")
+
+                if "compile" in scenarios:
+                    results[f"compile:{size}"] = await run_scenario(
+                        lambda i: client.post("/api/compile", json={"content": fresh(i)}), count, concurrency
+                    )
+                if "pages" in scenarios:
+                    results[f"compile_pages:{size}"] = await run_scenario(
+                        lambda i: client.post("/api/compile/pages", json={"content": fresh(i)}), count, concurrency
+                    )
+                if "cached" in scenarios:
+                    repeated = fresh(-1)
+                    await client.post("/api/compile", json={"content": repeated})
+                    results[f"compile_cached:{size}"] = await run_scenario(
+                        lambda i: client.post("/api/compile", json={"content": repeated}), count, concurrency
+                    )
+                if "export" in scenarios:
+                    for fmt in ("pdf", "html", "docx"):
+                        results[f"export_{fmt}:{size}"] = await run_scenario(
+                            lambda i, fmt=fmt: client.post(
+                                f"/api/export/{fmt}", json={"content": fresh(i), "format": fmt}
+                            ),
+                            count, concurrency
+                        )
+                print(f"Finished {size} documents", file=sys.stderr)
+
+            if "documents" in scenarios:
+                results.update(await bench_documents(client, count, concurrency))
+    finally:
+        await server.app.router.shutdown()
+    return results
+
+
+def environment_info() -> dict:
+    def git(*args):
+        try:
+            return subprocess.run(["git", *args], cwd=ROOT_DIR, capture_output=True, text=True).stdout.strip()
+        except OSError:
+            return ""
+
+    try:
+        import typst
+        typst_version = typst.__version__
+    except (ImportError, AttributeError):
+        typst_version = None
+    return {
+        "commit": git("rev-parse", "HEAD") or None,
+        "dirty": bool(git("status", "--porcelain", "--untracked-files=no")),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "typst": typst_version,
+    }
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Scenarios whose p50 or p99 grew by more than threshold over the baseline"""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            continue
+        for metric in ("p50_ms", "p99_ms"):
+            if previous[metric] and current[metric] > previous[metric] * (1 + threshold):
+                regressions.append(f"{name} {metric}: {previous[metric]} -> {current[metric]}")
+    return regressions
+
+
+def print_table(results: dict) -> None:
+    print(f"{'scenario':<26}{'reqs':>6}{'err':>5}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}{'req/s':>9}")
+    for name, r in results.items():
+        print(f"{name:<26}{r['requests']:>6}{r['errors']:>5}{r['p50_ms']:>10}{r['p90_ms']:>10}"
+              f"{r['p99_ms']:>10}{r['throughput_rps']:>9}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", default="small,medium", help=f"comma-separated, from {', '.join(DOCUMENT_SIZES)}")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help=f"comma-separated, from {', '.join(SCENARIOS)}")
+    parser.add_argument("--requests", type=int, default=20, help="requests per scenario")
+    parser.add_argument("--concurrency", type=int, default=4, help="requests in flight at once")
+    parser.add_argument("--mongo-url", help="benchmark against this MongoDB instead of an in-memory stand-in")
+    parser.add_argument("--output", type=Path, default=ROOT_DIR / "bench_results.json", help="where to write results")
+    parser.add_argument("--compare", type=Path, metavar="BASELINE", help="results file to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.2, help="allowed p50/p99 slowdown vs the baseline")
+    args = parser.parse_args()
+
+    sizes = [s for s in args.sizes.split(",") if s]
+    scenarios = [s for s in args.scenarios.split(",") if s]
+    unknown = [s for s in sizes if s not in DOCUMENT_SIZES] + [s for s in scenarios if s not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown size or scenario: {', '.join(unknown)}")
+
+    server = load_app(args.mongo_url)
+    results = asyncio.run(run_benchmarks(server, sizes, scenarios, args.requests, args.concurrency))
+
+    report = {
+        **environment_info(),
+        "settings": {
+            "sizes": sizes,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "database": "mongodb" if args.mongo_url else "mongomock",
+            "compile_workers": server.COMPILE_WORKERS,
+            "compile_isolation": server.COMPILE_ISOLATION,
+        },
+        "scenarios": results,
+    }
+    args.output.write_text(json.dumps(report, indent=2))
+    print_table(results)
+    print(f"\nResults written to {args.output}")
+
+    if args.compare:
+        regressions = compare(results, json.loads(args.compare.read_text()), args.threshold)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
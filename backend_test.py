@@ -5,6 +5,10 @@ import sys
 import json
 from datetime import datetime
 import time
+import io
+import re
+import zipfile
+import gzip
 
 class TypstEditorAPITester:
     def __init__(self, base_url="http://localhost:8001"):
@@ -139,6 +143,112 @@ class TypstEditorAPITester:
             self.log_test("Update Document", False, str(e))
             return False
 
+    def test_update_conflict(self, doc_id):
+        """Test that a save against a stale version is rejected with 409"""
+        if not doc_id:
+            self.log_test("Update Conflict", False, "No document ID provided")
+            return False
+            
+        try:
+            current = requests.get(f"{self.api_url}/documents/{doc_id}", timeout=10).json()
+            version = current.get('version')
+            
+            first = requests.put(
+                f"{self.api_url}/documents/{doc_id}",
+                json={"content": "= Conflict Test\n\nFirst save.", "base_version": version},
+                timeout=10
+            )
+            stale = requests.put(
+                f"{self.api_url}/documents/{doc_id}",
+                json={"content": "= Conflict Test\n\nStale save.", "base_version": version},
+                timeout=10
+            )
+            success = first.status_code == 200 and stale.status_code == 409
+            details = f"First save: {first.status_code}, Stale save: {stale.status_code}"
+            
+            self.log_test("Update Conflict", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Update Conflict", False, str(e))
+            return False
+
+    def test_patch_document(self, doc_id):
+        """Test text changes in UTF-16 offsets, and rejection of stale or invalid patches"""
+        if not doc_id:
+            self.log_test("Patch Document", False, "No document ID provided")
+            return False
+            
+        try:
+            current = requests.get(f"{self.api_url}/documents/{doc_id}", timeout=10).json()
+            saved = requests.put(
+                f"{self.api_url}/documents/{doc_id}",
+                json={"content": "A\U0001F600B", "base_version": current.get('version')},
+                timeout=10
+            ).json()
+            version = saved.get('version')
+            
+            def patch(base_version, changes):
+                return requests.patch(
+                    f"{self.api_url}/documents/{doc_id}",
+                    json={"base_version": base_version, "changes": changes},
+                    timeout=10
+                )
+            
+            # The emoji is two UTF-16 code units, so "B" is at offset 3
+            applied = patch(version, [{"from": 3, "to": 4, "insert": "C"}])
+            content = requests.get(f"{self.api_url}/documents/{doc_id}", timeout=10).json().get('content')
+            stale = patch(version, [{"from": 0, "to": 0, "insert": "X"}])
+            out_of_range = patch(version + 1, [{"from": 2, "to": 99, "insert": ""}])
+            overlapping = patch(version + 1, [{"from": 0, "to": 2, "insert": ""}, {"from": 1, "to": 3, "insert": ""}])
+            
+            success = (
+                applied.status_code == 200 and applied.json().get('version') == version + 1
+                and content == "A\U0001F600C"
+                and stale.status_code == 409
+                and out_of_range.status_code == 422
+                and overlapping.status_code == 422 and 'overlap' in overlapping.json().get('detail', '')
+            )
+            details = (
+                f"Applied: {applied.status_code}, Content: {content!r}, Stale: {stale.status_code}, "
+                f"Out of range: {out_of_range.status_code}, Overlapping: {overlapping.status_code}"
+            )
+            
+            self.log_test("Patch Document", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Patch Document", False, str(e))
+            return False
+
+    def test_template_etags(self):
+        """Test that template listings and contents answer 304 for a matching ETag"""
+        try:
+            listing = requests.get(f"{self.api_url}/templates", timeout=10)
+            etag = listing.headers.get('etag')
+            cached_listing = requests.get(f"{self.api_url}/templates", headers={"If-None-Match": etag}, timeout=10)
+            
+            template_id = listing.json()[0]['id']
+            template = requests.get(f"{self.api_url}/templates/{template_id}", timeout=10)
+            cached_template = requests.get(
+                f"{self.api_url}/templates/{template_id}",
+                headers={"If-None-Match": template.headers.get('etag')},
+                timeout=10
+            )
+            
+            success = (
+                listing.status_code == 200 and bool(etag) and cached_listing.status_code == 304
+                and template.status_code == 200 and cached_template.status_code == 304
+            )
+            details = f"Listing: {listing.status_code}/{cached_listing.status_code}, Template: {template.status_code}/{cached_template.status_code}"
+            
+            self.log_test("Template ETags", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Template ETags", False, str(e))
+            return False
+
     def test_compile_typst(self):
         """Test Typst compilation for preview"""
         try:
@@ -163,6 +273,184 @@ class TypstEditorAPITester:
             self.log_test("Compile Typst", False, str(e))
             return False
 
+    def test_compile_session(self):
+        """Test warm compiler session reuse and release"""
+        try:
+            session_id = f"test-session-{datetime.now().strftime('%H%M%S')}"
+            results = []
+            for text in ["= Session\n\nFirst revision.", "= Session\n\nSecond revision."]:
+                response = requests.post(
+                    f"{self.api_url}/compile",
+                    json={"content": text, "session_id": session_id},
+                    timeout=15
+                )
+                results.append(response.status_code == 200 and response.json().get('success'))
+            
+            response = requests.delete(f"{self.api_url}/compile/sessions/{session_id}", timeout=10)
+            success = all(results) and response.status_code == 200
+            details = f"Compiles: {results}, Close status: {response.status_code}"
+            
+            self.log_test("Compile Session", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Compile Session", False, str(e))
+            return False
+
+    def test_compile_page_range(self):
+        """Test that a page range compile only carries SVG for the requested pages"""
+        try:
+            pages = "\n#pagebreak()\n".join(f"= Page {i}" for i in range(1, 6))
+            response = requests.post(
+                f"{self.api_url}/compile",
+                json={"content": pages, "first_page": 2, "last_page": 3},
+                timeout=15
+            )
+            data = response.json()
+            with_svg = [i + 1 for i, page in enumerate(data.get('pages', [])) if page.get('svg')]
+            
+            success = response.status_code == 200 and data.get('page_count') == 5 and with_svg == [2, 3]
+            if success:
+                page = requests.get(f"{self.api_url}/compile/page/{data['pages'][0]['hash']}", timeout=10)
+                success = page.status_code == 200 and page.text.startswith('<svg')
+            details = f"Status: {response.status_code}, Pages: {data.get('page_count')}, With SVG: {with_svg}"
+            
+            self.log_test("Compile Page Range", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Compile Page Range", False, str(e))
+            return False
+
+    def test_compile_raster_preview(self):
+        """Test that raster preview mode returns page image URLs that serve images"""
+        try:
+            response = requests.post(
+                f"{self.api_url}/compile/pages",
+                json={"content": "= Raster\n\nHello", "preview_format": "png", "ppi": 72},
+                timeout=15
+            )
+            data = response.json()
+            page = (data.get('pages') or [{}])[0]
+            
+            success = response.status_code == 200 and page.get('format') == 'png' and not page.get('svg')
+            if success:
+                image = requests.get(f"{self.base_url}{page['image']}", timeout=10)
+                success = image.status_code == 200 and image.content.startswith(b'\x89PNG')
+            details = f"Status: {response.status_code}, Format: {page.get('format')}, Image: {page.get('image')}"
+            
+            self.log_test("Compile Raster Preview", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Compile Raster Preview", False, str(e))
+            return False
+
+    def test_compile_preview_frames(self):
+        """Test that previews come compressed and, when asked for, as binary frames"""
+        try:
+            test_content = {"content": "= Frames\n\n" + "Hello world. " * 200}
+            response = requests.post(
+                f"{self.api_url}/compile/pages",
+                json=test_content,
+                headers={"Accept": "application/vnd.typst-preview-frames"},
+                timeout=15
+            )
+            frame = response.content
+            header_length = int.from_bytes(frame[:4], 'big')
+            header = json.loads(frame[4:4 + header_length])
+            page = (header.get('pages') or [{}])[0]
+            svg = frame[4 + header_length:4 + header_length + page.get('svg_bytes', 0)]
+            
+            encoding = response.headers.get('content-encoding')
+            success = response.status_code == 200 and svg.startswith(b'<svg') and encoding in ('gzip', 'br')
+            details = f"Status: {response.status_code}, SVG bytes: {len(svg)}, Content-Encoding: {encoding}"
+            
+            self.log_test("Compile Preview Frames", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Compile Preview Frames", False, str(e))
+            return False
+
+    def test_compile_stream(self):
+        """Test the streaming preview: a delta on top of an update, and malformed messages"""
+        try:
+            from websockets.sync.client import connect
+            
+            def receive_until(ws, kind):
+                messages = []
+                while not messages or messages[-1]['type'] not in (kind, 'error'):
+                    messages.append(json.loads(ws.recv(timeout=30)))
+                return messages
+            
+            with connect(f"{self.api_url.replace('http', 'ws', 1)}/compile/ws", open_timeout=10) as ws:
+                ws.send(json.dumps({"type": "update", "revision": 1, "content": "= Stream\n\nHello"}))
+                before = receive_until(ws, 'done')
+                
+                ws.send("not json")
+                ws.send(json.dumps(["not", "an", "object"]))
+                ws.send(json.dumps({"type": "update", "revision": "two", "content": "Replaced"}))
+                resync = receive_until(ws, 'resync')[-1]
+                
+                ws.send(json.dumps({
+                    "type": "delta", "revision": 2, "base_revision": 1,
+                    "changes": [{"from": 15, "to": 15, "insert": " world"}]
+                }))
+                after = receive_until(ws, 'done')
+            
+            hashes = [[m['hash'] for m in messages if m['type'] == 'page'] for messages in (before, after)]
+            success = (
+                before[-1]['type'] == 'done' and after[-1]['type'] == 'done'
+                and resync['type'] == 'resync' and resync['revision'] == 1
+                and hashes[0] and hashes[1] and hashes[0] != hashes[1]
+            )
+            details = f"Resync: {resync}, Pages before/after: {hashes}"
+            
+            self.log_test("Compile Stream", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Compile Stream", False, str(e))
+            return False
+
+    def test_compile_cache(self):
+        """Test that recompiling identical content is served from the compile cache"""
+        try:
+            test_content = {"content": f"= Cache Test\n\nRevision {datetime.now().isoformat()}"}
+            
+            before = requests.get(f"{self.api_url}/compile/cache", timeout=10).json()
+            requests.post(f"{self.api_url}/compile", json=test_content, timeout=15)
+            requests.post(f"{self.api_url}/compile", json=test_content, timeout=15)
+            after = requests.get(f"{self.api_url}/compile/cache", timeout=10).json()
+            
+            hits = (after['memory_hits'] + after['disk_hits']) - (before['memory_hits'] + before['disk_hits'])
+            success = hits >= 1
+            details = f"New cache hits: {hits}, Entries: {after['memory_entries']}"
+            
+            self.log_test("Compile Cache", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Compile Cache", False, str(e))
+            return False
+
+    def test_metrics(self):
+        """Test that the Prometheus endpoint reports compile latency"""
+        try:
+            requests.post(f"{self.api_url}/compile", json={"content": "= Metrics Test"}, timeout=15)
+            response = requests.get(f"{self.api_url}/metrics", timeout=10)
+            
+            success = response.status_code == 200 and "rapidtypst_compile_stage_seconds" in response.text
+            details = f"Status: {response.status_code}, Size: {len(response.text)} bytes"
+            
+            self.log_test("Metrics", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Metrics", False, str(e))
+            return False
+
     def test_export_pdf(self):
         """Test PDF export"""
         try:
@@ -205,6 +493,12 @@ class TypstEditorAPITester:
                 details = f"Content-Type: {content_type}, Is HTML: {is_html}"
             else:
                 details = f"Status: {response.status_code}"
+
+            if success:
+                test_content["compression"] = "gzip"
+                response = requests.post(f"{self.api_url}/export/html", json=test_content, timeout=15)
+                success = response.status_code == 200 and gzip.decompress(response.content).startswith(b'<!DOCTYPE html>')
+                details += f", gzip: {success}"
             
             self.log_test("Export HTML", success, details)
             return success
@@ -214,7 +508,7 @@ class TypstEditorAPITester:
             return False
 
     def test_export_docx(self):
-        """Test DOCX export"""
+        """Test DOCX export, including text inside layout elements (align, grid) of templates"""
         try:
             test_content = {
                 "content": "= DOCX Export Test\n\nThis document will be exported as DOCX.",
@@ -227,7 +521,27 @@ class TypstEditorAPITester:
             if success:
                 content_type = response.headers.get('content-type', '')
                 is_docx = 'wordprocessingml' in content_type.lower() or 'docx' in content_type.lower()
-                details = f"Content-Type: {content_type}, Is DOCX: {is_docx}"
+                with zipfile.ZipFile(io.BytesIO(response.content)) as docx:
+                    has_heading = b'Heading1' in docx.read('word/document.xml')
+
+                expected = {
+                    "resume": ["Your Name", "your.email@example.com", "Senior Software Engineer", "Jan 2022 - Present",
+                               "Tech Company Inc."],
+                    "academic": ["Your Paper Title: A Comprehensive Study", "Published: January 2025"],
+                }
+                missing = []
+                for template_id, texts in expected.items():
+                    template = requests.get(f"{self.api_url}/templates/{template_id}", timeout=10).json()
+                    exported = requests.post(
+                        f"{self.api_url}/export/docx", json={"content": template["content"], "format": "docx"}, timeout=30
+                    )
+                    with zipfile.ZipFile(io.BytesIO(exported.content)) as docx:
+                        xml = docx.read('word/document.xml').decode('utf-8')
+                    text = ''.join(re.findall(r'<w:t(?:\s[^>]*)?>([^<]*)</w:t>', xml))
+                    missing += [f"{template_id}: {t}" for t in texts if t not in text]
+                success = is_docx and has_heading and not missing
+                details = (f"Content-Type: {content_type}, Is DOCX: {is_docx}, Has heading: {has_heading}, "
+                           f"Missing template text: {missing or 'none'}")
             else:
                 details = f"Status: {response.status_code}"
             
@@ -238,6 +552,66 @@ class TypstEditorAPITester:
             self.log_test("Export DOCX", False, str(e))
             return False
 
+    def test_export_job(self):
+        """Test a background export job and a ranged download of its artifact"""
+        try:
+            test_content = {
+                "content": f"= Export Job Test\n\nRevision {datetime.now().isoformat()}",
+                "format": "pdf",
+                "background": True
+            }
+            
+            response = requests.post(f"{self.api_url}/export/pdf", json=test_content, timeout=10)
+            job = response.json()
+            deadline = time.time() + 30
+            while response.status_code == 202 and job.get('status') == 'running' and time.time() < deadline:
+                time.sleep(0.5)
+                job = requests.get(f"{self.api_url}/export/jobs/{job['id']}", timeout=10).json()
+            
+            success = job.get('status') == 'done'
+            if success:
+                part = requests.get(f"{self.base_url}{job['download_url']}", headers={'Range': 'bytes=0-3'}, timeout=20)
+                success = part.status_code == 206 and part.content == b'%PDF'
+            details = f"Status: {job.get('status')}, Size: {job.get('size')}"
+            
+            self.log_test("Export Job", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Export Job", False, str(e))
+            return False
+
+    def test_batch_export(self, doc_id):
+        """Test that a batch export job zips the requested documents"""
+        if not doc_id:
+            self.log_test("Batch Export", False, "No document ID provided")
+            return False
+            
+        try:
+            response = requests.post(
+                f"{self.api_url}/export/batch",
+                json={"document_ids": [doc_id], "format": "pdf"},
+                timeout=10
+            )
+            job = response.json()
+            deadline = time.time() + 30
+            while response.status_code == 202 and job.get('status') == 'running' and time.time() < deadline:
+                time.sleep(0.5)
+                job = requests.get(f"{self.api_url}/export/batch/{job['id']}", timeout=10).json()
+            
+            success = job.get('status') == 'done' and job.get('completed') == 1
+            if success:
+                download = requests.get(f"{self.base_url}{job['download_url']}", timeout=20)
+                success = download.status_code == 200 and download.content.startswith(b'PK')
+            details = f"Status: {job.get('status')}, Completed: {job.get('completed')}, Failed: {job.get('failed')}"
+            
+            self.log_test("Batch Export", success, details)
+            return success
+            
+        except Exception as e:
+            self.log_test("Batch Export", False, str(e))
+            return False
+
     def test_delete_document(self, doc_id):
         """Test document deletion"""
         if not doc_id:
@@ -277,14 +651,27 @@ class TypstEditorAPITester:
         if success:
             self.test_get_document(doc_id)
             self.test_update_document(doc_id)
+            self.test_update_conflict(doc_id)
+            self.test_patch_document(doc_id)
         
         self.test_list_documents()
+        self.test_template_etags()
         
         # Test compilation and export
         self.test_compile_typst()
+        self.test_compile_session()
+        self.test_compile_page_range()
+        self.test_compile_raster_preview()
+        self.test_compile_preview_frames()
+        self.test_compile_stream()
+        self.test_compile_cache()
+        self.test_metrics()
         self.test_export_pdf()
         self.test_export_html()
         self.test_export_docx()
+        self.test_export_job()
+        if success:
+            self.test_batch_export(doc_id)
         
         # Clean up - delete test document
         if success and doc_id:
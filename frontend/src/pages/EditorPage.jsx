@@ -1,4 +1,4 @@
-import React, { useState, useEffect, useCallback, useRef } from 'react';
+import React, { useState, useEffect, useCallback, useRef, memo } from 'react';
 import { Link } from 'react-router-dom';
 import { ResizablePanelGroup, ResizablePanel, ResizableHandle } from '@/components/ui/resizable';
 import { Button } from '@/components/ui/button';
@@ -80,6 +80,7 @@ import axios from 'axios';
 
 const BACKEND_URL = process.env.REACT_APP_BACKEND_URL || "http://localhost:8001";
 const API = `${BACKEND_URL}/api`;
+const WS_API = `${BACKEND_URL.replace(/^http/, 'ws')}/api`;
 
 // Simple Typst-like syntax highlighting
 const typstLanguage = StreamLanguage.define({
@@ -103,6 +104,140 @@ const typstLanguage = StreamLanguage.define({
   },
 });
 
+// One preview page. Memoized so pages whose SVG did not change keep their
+// existing DOM nodes across recompiles. Only pages near the visible part of
+// the preview are in the DOM; the others are placeholders of the page's
+// size, and a page without SVG (or image, for raster pages) asks for it
+// once it comes near.
+const PreviewPage = memo(function PreviewPage({
+  index, hash, svg, image, format, width, height, onVisibilityChange, onNeedPage, onImageError,
+}) {
+  const ref = useRef(null);
+  const [near, setNear] = useState(typeof IntersectionObserver === 'undefined');
+
+  useEffect(() => {
+    const node = ref.current;
+    if (!node || typeof IntersectionObserver === 'undefined') return undefined;
+    const observer = new IntersectionObserver(([entry]) => {
+      setNear(entry.isIntersecting);
+      onVisibilityChange(index, entry.isIntersecting);
+    }, { root: node.closest('[data-radix-scroll-area-viewport]'), rootMargin: '1200px 0px' });
+    observer.observe(node);
+    return () => {
+      observer.disconnect();
+      onVisibilityChange(index, false);
+    };
+  }, [index, onVisibilityChange]);
+
+  useEffect(() => {
+    if (near && svg == null && !image) onNeedPage(hash, index, format);
+  }, [near, svg, image, format, hash, index, onNeedPage]);
+
+  const size = width && height ? { width: `${width}pt`, height: `${height}pt` } : undefined;
+  let body = <div className="preview-page-placeholder" style={size} />;
+  if (near && image) {
+    body = (
+      <img
+        className="preview-page-image"
+        src={`${BACKEND_URL}${image}`}
+        alt={`Page ${index + 1}`}
+        style={size}
+        onError={() => onImageError(hash, index)}
+      />
+    );
+  } else if (near && svg != null) {
+    body = <div dangerouslySetInnerHTML={{ __html: svg }} />;
+  }
+  return <div ref={ref} className="preview-page">{body}</div>;
+});
+
+// Give each page a stable React key; identical pages get an occurrence suffix
+const withPageKeys = (pages) => {
+  const seen = {};
+  return pages.map((page) => {
+    seen[page.hash] = (seen[page.hash] || 0) + 1;
+    return { ...page, key: `${page.hash}:${seen[page.hash]}` };
+  });
+};
+
+// Pages beyond the visible ones whose SVG comes with each compile; the rest
+// are fetched when scrolled to
+const PREVIEW_PAGE_MARGIN = 1;
+
+// How preview pages are sent: vector, images, or images only for heavy pages
+const PREVIEW_FORMATS = [
+  { id: 'auto', name: 'Auto' },
+  { id: 'svg', name: 'Vector (SVG)' },
+  { id: 'webp', name: 'Image (WebP)' },
+  { id: 'png', name: 'Image (PNG)' },
+];
+const PREVIEW_PPI_OPTIONS = [72, 96, 144];
+
+// Previews come as binary frames: a 4-byte big-endian header length, a JSON
+// header, then the html/svg markup it gives byte lengths for, so page SVG is
+// never escaped into JSON
+const PREVIEW_FRAMES_TYPE = 'application/vnd.typst-preview-frames';
+const PREVIEW_FRAME_FIELDS = ['html', 'svg'];
+const frameDecoder = new TextDecoder();
+
+const decodePreviewFrame = (buffer) => {
+  const bytes = new Uint8Array(buffer);
+  const headerLength = new DataView(buffer).getUint32(0);
+  const message = JSON.parse(frameDecoder.decode(bytes.subarray(4, 4 + headerLength)));
+  let offset = 4 + headerLength;
+  [message, ...(message.pages || [])].forEach((part) => {
+    PREVIEW_FRAME_FIELDS.forEach((field) => {
+      const length = part[`${field}_bytes`];
+      if (length == null) return;
+      part[field] = frameDecoder.decode(bytes.subarray(offset, offset + length));
+      offset += length;
+    });
+  });
+  return message;
+};
+
+const postPreview = async (body) => {
+  const response = await axios.post(`${API}/compile/pages`, body, {
+    headers: { Accept: `${PREVIEW_FRAMES_TYPE}, application/json;q=0.5` },
+    responseType: 'arraybuffer',
+  });
+  return decodePreviewFrame(response.data);
+};
+
+// How often a running export job is polled
+const EXPORT_POLL_MS = 500;
+
+// Saves are sent as patches; every Nth save (or a large rewrite) is a full PUT
+const FULL_SAVE_EVERY = 20;
+
+const isHighSurrogate = (code) => code >= 0xd800 && code <= 0xdbff;
+const isLowSurrogate = (code) => code >= 0xdc00 && code <= 0xdfff;
+
+// Smallest single replacement turning `before` into `after`, in UTF-16
+// offsets, never splitting a surrogate pair
+const diffText = (before, after) => {
+  let start = 0;
+  const max = Math.min(before.length, after.length);
+  while (start < max && before.charCodeAt(start) === after.charCodeAt(start)) start += 1;
+  if (start > 0 && isHighSurrogate(after.charCodeAt(start - 1))) start -= 1;
+
+  let endBefore = before.length;
+  let endAfter = after.length;
+  while (
+    endBefore > start &&
+    endAfter > start &&
+    before.charCodeAt(endBefore - 1) === after.charCodeAt(endAfter - 1)
+  ) {
+    endBefore -= 1;
+    endAfter -= 1;
+  }
+  if (endAfter < after.length && isLowSurrogate(after.charCodeAt(endAfter))) {
+    endBefore += 1;
+    endAfter += 1;
+  }
+  return { from: start, to: endBefore, insert: after.slice(start, endAfter) };
+};
+
 // Icon mapping for templates loaded from API
 const iconMap = {
   FileText,
@@ -162,8 +297,10 @@ You can use math: $x^2 + y^2 = z^2$
 export default function EditorPage() {
   const [content, setContent] = useState(defaultTypstContent);
   const [preview, setPreview] = useState('');
+  const [previewPages, setPreviewPages] = useState([]);
   const [isLoading, setIsLoading] = useState(false);
   const [documents, setDocuments] = useState([]);
+  const [documentsCursor, setDocumentsCursor] = useState(null);
   const [currentDoc, setCurrentDoc] = useState(null);
   const [showSidebar, setShowSidebar] = useState(true);
   const [showFindReplace, setShowFindReplace] = useState(false);
@@ -179,16 +316,51 @@ export default function EditorPage() {
   const [currentTheme, setCurrentTheme] = useState(editorThemes[0]);
   const editorRef = useRef(null);
   const debounceRef = useRef(null);
+  // SVG of the pages currently shown, by page hash (only pages we have SVG for)
+  const pageCacheRef = useRef(new Map());
+  const pendingPagesRef = useRef(new Set());
+  // 1-based page range sent with each compile, following what is on screen
+  const visiblePagesRef = useRef(new Set());
+  const viewportRef = useRef({ first_page: 1, last_page: 1 + 2 * PREVIEW_PAGE_MARGIN });
+  const viewportTimerRef = useRef(null);
+  const [previewOptions, setPreviewOptions] = useState({ preview_format: 'auto', ppi: 96 });
+  const previewOptionsRef = useRef(previewOptions);
+  previewOptionsRef.current = previewOptions;
+  // Identifies this editor's warm compiler on the backend
+  const compileSessionRef = useRef(
+    window.crypto?.randomUUID?.() || `${Date.now()}-${Math.random().toString(36).slice(2)}`
+  );
+  // Streaming preview socket; the debounced POST is only used while it is down
+  const [streamReady, setStreamReady] = useState(false);
+  const wsRef = useRef(null);
+  const revisionRef = useRef(0);
+  const sentContentRef = useRef(null);
+  const streamPagesRef = useRef([]);
+  const contentRef = useRef(content);
+  const patchSavesRef = useRef(0);
+  contentRef.current = content;
 
   const loadDocuments = useCallback(async () => {
     try {
       const response = await axios.get(`${API}/documents`);
       setDocuments(response.data);
+      setDocumentsCursor(response.headers['x-next-cursor'] || null);
     } catch (error) {
       console.error('Failed to load documents:', error);
     }
   }, []);
 
+  const loadMoreDocuments = async () => {
+    if (!documentsCursor) return;
+    try {
+      const response = await axios.get(`${API}/documents`, { params: { cursor: documentsCursor } });
+      setDocuments((prev) => [...prev, ...response.data]);
+      setDocumentsCursor(response.headers['x-next-cursor'] || null);
+    } catch (error) {
+      toast.error('Failed to load more documents');
+    }
+  };
+
   // Load documents on mount
   useEffect(() => {
     loadDocuments();
@@ -218,17 +390,49 @@ export default function EditorPage() {
   const compilePreview = useCallback(async () => {
     try {
       setIsLoading(true);
-      const response = await axios.post(`${API}/compile`, { content });
-      setPreview(response.data.html || '');
+      const { pages = [], html } = await postPreview({
+        content,
+        session_id: compileSessionRef.current,
+        known_hashes: [...pageCacheRef.current.keys()],
+        ...viewportRef.current,
+        ...previewOptions,
+      });
+      if (pages.length === 0) {
+        pageCacheRef.current = new Map();
+        setPreviewPages([]);
+        setPreview(html || '');
+        return;
+      }
+
+      // The server only sends SVG for pages in view that we don't already hold
+      const nextCache = new Map();
+      const nextPages = pages.map(({ hash, width, height, svg, image, format }) => {
+        const raster = format && format !== 'svg';
+        const pageSvg = raster ? null : svg ?? pageCacheRef.current.get(hash) ?? null;
+        if (pageSvg != null) nextCache.set(hash, pageSvg);
+        return { hash, width, height, image, format, svg: pageSvg };
+      });
+      pageCacheRef.current = nextCache;
+      setPreviewPages(withPageKeys(nextPages));
+      setPreview('');
     } catch (error) {
+      if (error.response?.status === 429) {
+        // Server is saturated; keep the last preview, the next edit retries
+        return;
+      }
       console.error('Compile error:', error);
+      pageCacheRef.current = new Map();
+      setPreviewPages([]);
       setPreview(`<div style="color: #DC2626; padding: 20px;">Failed to compile: ${error.message}</div>`);
     } finally {
       setIsLoading(false);
     }
-  }, [content]);
+  }, [content, previewOptions]);
 
   useEffect(() => {
+    if (streamReady) {
+      return undefined;
+    }
     if (debounceRef.current) {
       clearTimeout(debounceRef.current);
     }
@@ -241,10 +445,227 @@ export default function EditorPage() {
         clearTimeout(debounceRef.current);
       }
     };
-  }, [content, compilePreview]);
+  }, [content, compilePreview, streamReady]);
+
+  const sendFullContent = useCallback(() => {
+    const ws = wsRef.current;
+    if (!ws || ws.readyState !== WebSocket.OPEN) return;
+    revisionRef.current += 1;
+    sentContentRef.current = contentRef.current;
+    ws.send(JSON.stringify({ type: 'update', revision: revisionRef.current, content: contentRef.current }));
+  }, []);
+
+  // Streaming preview: edits go up as deltas, pages come back one by one.
+  // The page cache mirrors the server's: pages of the last "done" plus
+  // every page received since.
+  useEffect(() => {
+    let closed = false;
+    let reconnectTimer = null;
+
+    const handleMessage = (event) => {
+      const message = typeof event.data === 'string' ? JSON.parse(event.data) : decodePreviewFrame(event.data);
+      switch (message.type) {
+        case 'compiling':
+          setIsLoading(true);
+          break;
+        case 'page': {
+          const { hash, width, height, image, format } = message;
+          const raster = format && format !== 'svg';
+          const svg = raster ? null : message.svg ?? pageCacheRef.current.get(hash) ?? null;
+          if (svg != null) pageCacheRef.current.set(hash, svg);
+          const pages = [...streamPagesRef.current];
+          pages[message.index] = { hash, width, height, image, format, svg };
+          streamPagesRef.current = pages;
+          setPreviewPages(withPageKeys(pages.filter(Boolean)));
+          setPreview('');
+          break;
+        }
+        case 'done': {
+          // Pages fetched while the stream was running are only in the cache
+          const pages = streamPagesRef.current.slice(0, message.page_count).map((page) => ({
+            ...page,
+            svg: page.format && page.format !== 'svg' ? null : page.svg ?? pageCacheRef.current.get(page.hash) ?? null,
+          }));
+          streamPagesRef.current = pages;
+          pageCacheRef.current = new Map(
+            pages.filter((page) => page.svg != null).map((page) => [page.hash, page.svg])
+          );
+          setPreviewPages(withPageKeys(pages));
+          setIsLoading(false);
+          break;
+        }
+        case 'error':
+          streamPagesRef.current = [];
+          setPreviewPages([]);
+          setPreview(message.html || '');
+          setIsLoading(false);
+          break;
+        case 'resync':
+          sendFullContent();
+          break;
+        default:
+          break;
+      }
+    };
+
+    const connect = () => {
+      const ws = new WebSocket(`${WS_API}/compile/ws?session_id=${compileSessionRef.current}&transport=binary`);
+      ws.binaryType = 'arraybuffer';
+      wsRef.current = ws;
+      ws.onopen = () => {
+        setStreamReady(true);
+        ws.send(JSON.stringify({ type: 'viewport', ...viewportRef.current }));
+        ws.send(JSON.stringify({ type: 'preview', ...previewOptionsRef.current }));
+        sendFullContent();
+      };
+      ws.onmessage = handleMessage;
+      ws.onclose = () => {
+        wsRef.current = null;
+        sentContentRef.current = null;
+        setStreamReady(false);
+        setIsLoading(false);
+        if (!closed) {
+          reconnectTimer = setTimeout(connect, 3000);
+        }
+      };
+    };
+
+    connect();
+    return () => {
+      closed = true;
+      clearTimeout(reconnectTimer);
+      wsRef.current?.close();
+    };
+  }, [sendFullContent]);
+
+  // Content replaced outside the editor (template, opened document, replace-all)
+  useEffect(() => {
+    if (streamReady && content !== sentContentRef.current) {
+      sendFullContent();
+    }
+  }, [content, streamReady, sendFullContent]);
+
+  const updatePage = useCallback((hash, changes) => {
+    const fill = (pages) => pages.map((page) => (page.hash === hash ? { ...page, ...changes } : page));
+    streamPagesRef.current = fill(streamPagesRef.current);
+    setPreviewPages((pages) => fill(pages));
+  }, []);
+
+  // Pages are cached on the server by hash; when one has been evicted,
+  // recompile the document for just that page
+  const rerenderPage = useCallback(async (hash, index) => {
+    const response = await postPreview({
+      content: contentRef.current,
+      session_id: compileSessionRef.current,
+      first_page: index + 1,
+      last_page: index + 1,
+      ...previewOptionsRef.current,
+    }).catch(() => null);
+    const page = response?.pages?.[index];
+    if (page?.hash !== hash) return;
+    if (page.image) {
+      updatePage(hash, { image: `${page.image}&retry=${Date.now()}` });
+    } else if (page.svg != null) {
+      pageCacheRef.current.set(hash, page.svg);
+      updatePage(hash, { svg: page.svg });
+    }
+  }, [updatePage]);
+
+  const handlePageImageError = useCallback((hash, index) => {
+    if (pendingPagesRef.current.has(hash)) return;
+    pendingPagesRef.current.add(hash);
+    rerenderPage(hash, index).finally(() => pendingPagesRef.current.delete(hash));
+  }, [rerenderPage]);
+
+  // Fill in a page's SVG, or render its image, once it is near the viewport
+  const requestPage = useCallback(async (hash, index, format) => {
+    if (format && format !== 'svg') {
+      // Raster pages are only rendered once they are near the viewport
+      if (pendingPagesRef.current.has(hash)) return;
+      pendingPagesRef.current.add(hash);
+      rerenderPage(hash, index).finally(() => pendingPagesRef.current.delete(hash));
+      return;
+    }
+    const showSvg = (svg) => {
+      pageCacheRef.current.set(hash, svg);
+      updatePage(hash, { svg });
+    };
+    const cached = pageCacheRef.current.get(hash);
+    if (cached != null) {
+      showSvg(cached);
+      return;
+    }
+    if (pendingPagesRef.current.has(hash)) return;
+    pendingPagesRef.current.add(hash);
+    try {
+      const response = await axios.get(`${API}/compile/page/${hash}`, { responseType: 'text' });
+      showSvg(response.data);
+    } catch (error) {
+      if (error.response?.status === 404) await rerenderPage(hash, index);
+    } finally {
+      pendingPagesRef.current.delete(hash);
+    }
+  }, [updatePage, rerenderPage]);
+
+  const changePreviewOptions = (changes) => {
+    const options = { ...previewOptionsRef.current, ...changes };
+    setPreviewOptions(options);
+    if (wsRef.current?.readyState === WebSocket.OPEN) {
+      wsRef.current.send(JSON.stringify({ type: 'preview', ...options }));
+    }
+  };
+
+  // Track which pages are on screen and tell the server, so compiles only
+  // carry SVG for those
+  const handlePageVisibility = useCallback((index, visible) => {
+    if (visible) visiblePagesRef.current.add(index);
+    else visiblePagesRef.current.delete(index);
+    clearTimeout(viewportTimerRef.current);
+    viewportTimerRef.current = setTimeout(() => {
+      const visiblePages = [...visiblePagesRef.current];
+      if (visiblePages.length === 0) return;
+      const viewport = {
+        first_page: Math.max(1, Math.min(...visiblePages) + 1 - PREVIEW_PAGE_MARGIN),
+        last_page: Math.max(...visiblePages) + 1 + PREVIEW_PAGE_MARGIN,
+      };
+      const current = viewportRef.current;
+      if (viewport.first_page === current.first_page && viewport.last_page === current.last_page) return;
+      viewportRef.current = viewport;
+      if (wsRef.current?.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({ type: 'viewport', ...viewport }));
+      }
+    }, 150);
+  }, []);
+
+  useEffect(() => () => clearTimeout(viewportTimerRef.current), []);
+
+  // Release the warm compiler session when the editor goes away
+  useEffect(() => {
+    const sessionId = compileSessionRef.current;
+    return () => {
+      axios.delete(`${API}/compile/sessions/${sessionId}`).catch(() => {});
+    };
+  }, []);
 
-  const handleContentChange = useCallback((value) => {
+  const handleContentChange = useCallback((value, viewUpdate) => {
     setContent(value);
+
+    const ws = wsRef.current;
+    if (!ws || ws.readyState !== WebSocket.OPEN || sentContentRef.current === null || !viewUpdate) {
+      return;
+    }
+    const changes = [];
+    viewUpdate.changes.iterChanges((fromA, toA, _fromB, _toB, inserted) => {
+      changes.push({ from: fromA, to: toA, insert: inserted.toString() });
+    });
+    revisionRef.current += 1;
+    sentContentRef.current = value;
+    ws.send(JSON.stringify({
+      type: 'delta',
+      revision: revisionRef.current,
+      base_revision: revisionRef.current - 1,
+      changes,
+    }));
   }, []);
 
   const handleUndo = () => {
@@ -304,7 +725,7 @@ export default function EditorPage() {
         title: newDocTitle,
         content: defaultTypstContent,
       });
-      setDocuments([...documents, response.data]);
+      setDocuments([response.data, ...documents]);
       setCurrentDoc(response.data);
       setContent(response.data.content);
       setShowNewDocDialog(false);
@@ -317,11 +738,36 @@ export default function EditorPage() {
   const handleSaveDocument = useCallback(async () => {
     if (currentDoc) {
       try {
-        await axios.put(`${API}/documents/${currentDoc.id}`, { content });
+        // currentDoc.content is what the server has stored at currentDoc.version
+        const change = diffText(currentDoc.content ?? '', content);
+        const sendPatch =
+          typeof currentDoc.content === 'string' &&
+          patchSavesRef.current < FULL_SAVE_EVERY &&
+          change.insert.length + (change.to - change.from) < content.length / 2;
+
+        if (sendPatch) {
+          const response = await axios.patch(`${API}/documents/${currentDoc.id}`, {
+            base_version: currentDoc.version,
+            changes: [change],
+          });
+          patchSavesRef.current += 1;
+          setCurrentDoc({ ...currentDoc, ...response.data, content });
+        } else {
+          const response = await axios.put(`${API}/documents/${currentDoc.id}`, {
+            content,
+            base_version: currentDoc.version,
+          });
+          patchSavesRef.current = 0;
+          setCurrentDoc(response.data);
+        }
         toast.success('Document saved');
         loadDocuments();
       } catch (error) {
-        toast.error('Failed to save document');
+        if (error.response?.status === 409) {
+          toast.error('This document was changed elsewhere. Reopen it before saving.');
+        } else {
+          toast.error('Failed to save document');
+        }
       }
     } else {
       setShowSaveDialog(true);
@@ -339,7 +785,7 @@ export default function EditorPage() {
         title: newDocTitle,
         content,
       });
-      setDocuments([...documents, response.data]);
+      setDocuments([response.data, ...documents]);
       setCurrentDoc(response.data);
       setShowSaveDialog(false);
       toast.success('Document saved');
@@ -348,10 +794,16 @@ export default function EditorPage() {
     }
   };
 
-  const handleOpenDocument = (doc) => {
-    setCurrentDoc(doc);
-    setContent(doc.content);
-    toast.success(`Opened "${doc.title}"`);
+  const handleOpenDocument = async (doc) => {
+    // The listing only carries summaries; fetch the content on open
+    try {
+      const response = await axios.get(`${API}/documents/${doc.id}`);
+      setCurrentDoc(response.data);
+      setContent(response.data.content);
+      toast.success(`Opened "${doc.title}"`);
+    } catch (error) {
+      toast.error('Failed to open document');
+    }
   };
 
   const handleDeleteDocument = async (doc, e) => {
@@ -369,27 +821,30 @@ export default function EditorPage() {
     }
   };
 
+  // Exports run as server-side jobs: no HTTP timeout on long compiles, and
+  // exporting an unchanged document again is served from the stored file
   const handleExport = async (format) => {
     try {
       setIsLoading(true);
-      const response = await axios.post(
-        `${API}/export/${format}`,
-        { content, format },
-        { responseType: 'blob' }
-      );
+      let { data: job } = await axios.post(`${API}/export/${format}`, { content, format, background: true });
+      while (job.status === 'running') {
+        await new Promise((resolve) => setTimeout(resolve, EXPORT_POLL_MS));
+        ({ data: job } = await axios.get(`${API}/export/jobs/${job.id}`));
+      }
+      if (job.status !== 'done') {
+        throw new Error(job.error || 'Export failed');
+      }
 
-      const blob = new Blob([response.data]);
-      const url = window.URL.createObjectURL(blob);
+      // Download straight from the server so the browser can resume it
       const a = document.createElement('a');
-      a.href = url;
+      a.href = `${BACKEND_URL}${job.download_url}`;
       a.download = `document.${format}`;
       document.body.appendChild(a);
       a.click();
-      window.URL.revokeObjectURL(url);
       document.body.removeChild(a);
       toast.success(`Exported as ${format.toUpperCase()}`);
     } catch (error) {
-      toast.error(`Export failed: ${error.message}`);
+      toast.error(`Export failed: ${error.response?.data?.detail || error.message}`);
     } finally {
       setIsLoading(false);
     }
@@ -801,6 +1256,13 @@ export default function EditorPage() {
                   </div>
                 ))
               )}
+              {documentsCursor && (
+                <div className="p-2 text-center">
+                  <Button variant="ghost" size="sm" onClick={loadMoreDocuments} data-testid="load-more-docs-btn" className="text-xs">
+                    Load more
+                  </Button>
+                </div>
+              )}
             </ScrollArea>
           </div>
         )}
@@ -851,9 +1313,65 @@ export default function EditorPage() {
                 <Eye className="h-4 w-4 text-muted-foreground" />
                 <span className="text-xs font-medium text-muted-foreground uppercase tracking-wider">Preview</span>
                 {isLoading && <span className="text-xs text-accent ml-2">Compiling...</span>}
+                <DropdownMenu>
+                  <DropdownMenuTrigger asChild>
+                    <Button variant="ghost" size="sm" data-testid="preview-mode-btn" className="h-6 gap-1 ml-auto text-xs">
+                      {PREVIEW_FORMATS.find((f) => f.id === previewOptions.preview_format)?.name}
+                      {previewOptions.preview_format !== 'svg' && ` · ${previewOptions.ppi} ppi`}
+                      <ChevronDown className="h-3 w-3" />
+                    </Button>
+                  </DropdownMenuTrigger>
+                  <DropdownMenuContent align="end">
+                    <div className="px-2 py-1.5 text-xs font-semibold text-muted-foreground">Page rendering</div>
+                    {PREVIEW_FORMATS.map((format) => (
+                      <DropdownMenuItem
+                        key={format.id}
+                        onClick={() => changePreviewOptions({ preview_format: format.id })}
+                        className={previewOptions.preview_format === format.id ? 'bg-accent' : ''}
+                        data-testid={`preview-format-${format.id}`}
+                      >
+                        {format.name}
+                      </DropdownMenuItem>
+                    ))}
+                    <DropdownMenuSeparator />
+                    <div className="px-2 py-1.5 text-xs font-semibold text-muted-foreground">Image resolution</div>
+                    {PREVIEW_PPI_OPTIONS.map((ppi) => (
+                      <DropdownMenuItem
+                        key={ppi}
+                        onClick={() => changePreviewOptions({ ppi })}
+                        className={previewOptions.ppi === ppi ? 'bg-accent' : ''}
+                        data-testid={`preview-ppi-${ppi}`}
+                      >
+                        {ppi} ppi
+                      </DropdownMenuItem>
+                    ))}
+                  </DropdownMenuContent>
+                </DropdownMenu>
               </div>
               <ScrollArea className="flex-1 preview-container" data-testid="preview-panel">
-                <div className="preview-content p-4" dangerouslySetInnerHTML={{ __html: preview }} />
+                {previewPages.length > 0 ? (
+                  <div className="preview-content p-4">
+                    <div className="preview-pages">
+                      {previewPages.map((page, index) => (
+                        <PreviewPage
+                          key={page.key}
+                          index={index}
+                          hash={page.hash}
+                          svg={page.svg}
+                          image={page.image}
+                          format={page.format}
+                          width={page.width}
+                          height={page.height}
+                          onVisibilityChange={handlePageVisibility}
+                          onNeedPage={requestPage}
+                          onImageError={handlePageImageError}
+                        />
+                      ))}
+                    </div>
+                  </div>
+                ) : (
+                  <div className="preview-content p-4" dangerouslySetInnerHTML={{ __html: preview }} />
+                )}
               </ScrollArea>
             </div>
           </ResizablePanel>
@@ -962,6 +1480,17 @@ export default function EditorPage() {
                       className="group cursor-pointer border border-border rounded-sm p-4 hover:border-accent hover:bg-accent/5 transition-all duration-200"
                       data-testid={`template-${template.id}`}
                     >
+                      <div className="mb-3 aspect-[210/297] bg-white border border-border rounded-sm overflow-hidden">
+                        <img
+                          src={`${API}/templates/${template.id}/thumbnail`}
+                          alt={`${template.name} preview`}
+                          loading="lazy"
+                          className="w-full h-full object-contain object-top"
+                          onError={(e) => {
+                            e.currentTarget.style.visibility = 'hidden';
+                          }}
+                        />
+                      </div>
                       <div className="flex items-start gap-3">
                         <div className="p-2 bg-secondary rounded-sm group-hover:bg-accent/10 transition-colors">
                           <IconComponent className="h-5 w-5 text-muted-foreground group-hover:text-accent" />